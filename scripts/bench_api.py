@@ -0,0 +1,95 @@
+"""
+Пропускная способность сериализации /api/products/: сколько товаров в секунду.
+
+Оба варианта сериализуют одну и ту же страницу в процессе, без HTTP:
+- old: ProductSerializer по экземплярам Product — как было раньше (N+1 по категориям);
+- new: ProductRowSerializer по строкам .values() — как сейчас в ProductViewSet.list.
+Сравнение делается для полного ответа и для ?lang=ru&fields=... .
+
+Запуск:  python scripts/bench_api.py [--products 5000] [--page-size 100] [--repeat 5]
+Данные создаются во временной тестовой базе, рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.models import Category, Product
+from store.serializers import ProductRowSerializer, ProductSerializer, product_read_options
+
+
+def populate(count):
+    categories = Category.objects.bulk_create([Category(name=f'Категория {i}', slug=f'cat-{i}') for i in range(20)])
+    Product.objects.bulk_create([
+        Product(
+            category=categories[i % len(categories)],
+            name=f'Товар {i}', name_ru=f'Товар {i}', name_kg=f'Буюм {i}', name_en=f'Item {i}',
+            slug=f'item-{i}',
+            description='Описание товара ' * 10, description_ru='Описание товара ' * 10,
+            description_kg='Буюмдун сүрөттөмөсү ' * 10, description_en='Item description ' * 10,
+            price=100 + i, stock=5, is_published=True,
+        )
+        for i in range(count)
+    ], batch_size=2000)
+
+
+def _rate(fn, items, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return items / statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    populate(args.products)
+    size = args.page_size
+    ordering = ('-created_at', '-id')  # порядок страниц /api/products/
+
+    def variants(query):
+        context = {'request': Request(APIRequestFactory().get('/api/products/', query))}
+        fields, lang = product_read_options(context['request'])
+
+        def old():
+            ProductSerializer(Product.objects.order_by(*ordering)[:size], many=True, context=context).data
+
+        def new():
+            rows = Product.objects.order_by(*ordering).values(*ProductRowSerializer.value_columns(fields, lang))
+            ProductRowSerializer(rows[:size], many=True, context=context).data
+
+        return old, new
+
+    print(f'{"variant":<34} {"old/s":>10} {"new/s":>10} {"speedup":>8}')
+    for label, query in (('full', {}), ('?lang=ru&fields=...', {'lang': 'ru', 'fields': 'id,name,price,category'})):
+        old, new = variants(query)
+        base = _rate(old, size, args.repeat)
+        rate = _rate(new, size, args.repeat)
+        print(f'{label:<34} {base:>10.0f} {rate:>10.0f} {rate / base:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
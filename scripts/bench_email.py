@@ -0,0 +1,101 @@
+"""
+Отправка писем: send_mail на каждое письмо против очереди store/outbox.py.
+
+Вместо SMTP используется locmem-бэкенд с искусственной задержкой открытия
+соединения (--connect-ms) и отправки письма (--send-ms) — так видно, сколько
+стоит новая SMTP-сессия на каждое письмо.
+
+Запуск:  python scripts/bench_email.py [--emails 500] [--batch-size 100] [--connect-ms 50] [--send-ms 1]
+Данные создаются во временной тестовой базе, рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from store import outbox
+
+CONNECT_DELAY = 0.0
+SEND_DELAY = 0.0
+opened = 0
+
+
+class SlowBackend(locmem.EmailBackend):
+    """locmem-бэкенд, который «подключается» и «отправляет» с задержкой, как SMTP."""
+
+    def open(self):
+        global opened
+        if getattr(self, '_opened', False):
+            return False
+        self._opened = True
+        opened += 1
+        time.sleep(CONNECT_DELAY)
+        return True
+
+    def close(self):
+        self._opened = False
+
+    def send_messages(self, messages):
+        created = self.open()
+        time.sleep(SEND_DELAY * len(messages))
+        try:
+            return super().send_messages(messages)
+        finally:
+            if created:
+                self.close()
+
+
+def main():
+    global CONNECT_DELAY, SEND_DELAY, opened
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--emails', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--connect-ms', type=float, default=50)
+    parser.add_argument('--send-ms', type=float, default=1)
+    args = parser.parse_args()
+    CONNECT_DELAY, SEND_DELAY = args.connect_ms / 1000, args.send_ms / 1000
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    settings.EMAIL_BACKEND = f'{__name__}.SlowBackend'
+
+    opened = 0
+    mail.outbox = []
+    start = time.perf_counter()
+    for i in range(args.emails):
+        mail.send_mail(f'Заказ #{i}', 'Текст письма', settings.DEFAULT_FROM_EMAIL, ['buyer@example.com'])
+    old = time.perf_counter() - start
+    old_connections = opened
+
+    opened = 0
+    mail.outbox = []
+    start = time.perf_counter()
+    outbox.enqueue_many([
+        (f'bench:{i}', f'Заказ #{i}', 'Текст письма', ['buyer@example.com']) for i in range(args.emails)
+    ])
+    stats = outbox.drain(batch_size=args.batch_size, rate=0)
+    new = time.perf_counter() - start
+    assert stats['sent'] == len(mail.outbox) == args.emails
+
+    print(f'{"variant":<28} {"seconds":>8} {"emails/s":>9} {"connections":>12}')
+    print(f'{"send_mail per message":<28} {old:>8.2f} {args.emails / old:>9.0f} {old_connections:>12}')
+    print(f'{"outbox (enqueue + drain)":<28} {new:>8.2f} {args.emails / new:>9.0f} {opened:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Поиск запрещённых терминов: цикл `term in text`, одно регулярное выражение
+и автомат Ахо — Корасик (store/term_matcher.py) на длинных описаниях и
+больших списках терминов.
+
+Запуск:  python scripts/bench_forbidden_terms.py [--terms 10 1000 10000] [--sizes 1000 100000] [--repeat 5]
+База данных не нужна: термины и тексты генерируются.
+"""
+from pathlib import Path
+import argparse
+import random
+import re
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from store.term_matcher import TermMatcher, normalize
+
+ALPHABET = 'абвгдежзиклмнопрстуфхцчшэюяңөүabcdefghijklmnopqrstuvwxyz'
+
+
+def make_words(rng, count, min_len=3, max_len=10):
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(min_len, max_len))) for _ in range(count)]
+
+
+def make_text(rng, vocabulary, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(vocabulary)
+        words.append(word.upper() if rng.random() < 0.1 else word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--terms', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    vocabulary = make_words(rng, 5000)
+
+    print(f'{"terms":>6} {"text":>8} {"build ms":>9} {"loop ms":>9} {"regex ms":>9} {"automaton ms":>13}')
+    for term_count in args.terms:
+        terms = make_words(rng, term_count, min_len=5)
+        build, matcher = timed(lambda: TermMatcher(terms), 1)
+        regex = re.compile(r'\b(?:' + '|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)) + r')\b')
+        for size in args.sizes:
+            # чистый текст — худший случай: искать приходится до конца
+            text = make_text(rng, vocabulary, size)
+            lowered = text.lower()
+            loop, _ = timed(lambda: next((t for t in terms if t in lowered), None), args.repeat)
+            rx, _ = timed(lambda: regex.search(normalize(text)), args.repeat)
+            ac, found = timed(lambda: matcher.search(text), args.repeat)
+            assert found is None or found.term in terms
+            print(f'{term_count:>6} {size:>8} {build:>9.1f} {loop:>9.2f} {rx:>9.2f} {ac:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Вывод названий каталога на языке пользователя: цепочка {% if language == ... %}
+в шаблоне по полным строкам товаров против Product.objects.localized(lang),
+где выбор перевода делает SQL (COALESCE/NULLIF), а столбцы переводов не читаются.
+
+Запуск:  python scripts/bench_localized_render.py [--products 20000] [--page 100] [--repeat 20]
+
+Данные создаются во временной тестовой базе (для SQLite — в памяти),
+рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.db import connection
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from store.models import Category, Product
+
+OLD_TEMPLATE = Template("""{% for p in products %}<h3>{% if language == 'kg' and p.name_kg %}{{ p.name_kg }}{% elif language == 'ru' and p.name_ru %}{{ p.name_ru }}{% elif language == 'en' and p.name_en %}{{ p.name_en }}{% else %}{{ p.name }}{% endif %}</h3>{{ p.price }}{% endfor %}""")
+NEW_TEMPLATE = Template("""{% for p in products %}<h3>{{ p.display_name }}</h3>{{ p.price }}{% endfor %}""")
+
+
+def populate(count, batch_size=5000):
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench', slug='bench')
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(count, start + batch_size)):
+            text = ' '.join(f'слово{rng.randint(0, 5000)}' for _ in range(80))
+            batch.append(Product(
+                category=category, name=f'Товар {i}', slug=f'bench-{i}', price=rng.randint(100, 10000), stock=1,
+                is_published=True, description=text,
+                # треть переводов пустые — шаблон должен показать исходный текст
+                name_kg=f'Буюм {i}' if i % 3 else '', name_en=f'Item {i}' if i % 3 else None,
+                description_ru=text, description_kg=text, description_en=text,
+            ))
+        Product.objects.bulk_create(batch)
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--page', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--language', default='kg')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    populate(args.products)
+    print(f'backend: {connection.vendor}, products: {args.products}, page: {args.page}, language: {args.language}')
+
+    def old_rows():
+        return list(Product.objects.filter(is_published=True).order_by('-created_at', '-id')[:args.page])
+
+    def new_rows():
+        return list(Product.objects.localized(args.language, description=False)
+                    .filter(is_published=True).order_by('-created_at', '-id')[:args.page])
+
+    for label, rows, template in (('if/elif chain', old_rows, OLD_TEMPLATE), ('localized()', new_rows, NEW_TEMPLATE)):
+        with CaptureQueriesContext(connection) as queries:
+            products = rows()
+        width = sum(len(str(value or '')) for p in products for value in p.__dict__.values()) / len(products)
+        query_ms = _timed(rows, args.repeat)
+        render_ms = _timed(lambda: template.render(Context({'products': products, 'language': args.language})),
+                           args.repeat)
+        print(f'{label:<14} queries {len(queries):>2}  query {query_ms:>7.2f} ms  render {render_ms:>6.2f} ms  '
+              f'row ~{width:>6.0f} chars')
+
+
+if __name__ == '__main__':
+    main()
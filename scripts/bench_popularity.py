@@ -0,0 +1,103 @@
+"""
+Популярность товаров (store/popularity.py): стоимость периодического обновления
+для изменившихся товаров против полного пересчёта и цена одного просмотра.
+
+Запуск:  python scripts/bench_popularity.py [--products 20000] [--favorites 100000] [--changed 200]
+
+Данные создаются во временной тестовой базе (для SQLite — в памяти),
+рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from store import popularity
+from store.models import Category, Favorite, Product
+
+
+def populate(products, favorites, batch_size=5000):
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench', slug='bench')
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create([
+            Product(category=category, name=f'Товар {i}', slug=f'bench-{i}', price=100, stock=1, is_published=True)
+            for i in range(start, min(products, start + batch_size))
+        ])
+    pks = list(Product.objects.values_list('pk', flat=True))
+    users = get_user_model().objects.bulk_create([
+        get_user_model()(username=f'user{i}') for i in range(max(1, favorites // products * 4))
+    ])
+    now = timezone.now()
+    seen = set()
+    batch = []
+    while len(seen) < favorites:
+        pair = (rng.choice(users).pk, rng.choice(pks))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        batch.append(Favorite(user_id=pair[0], product_id=pair[1]))
+        if len(batch) == batch_size or len(seen) == favorites:
+            Favorite.objects.bulk_create(batch)
+            batch = []
+    # события за последние 8 недель
+    for pk in rng.sample(pks, min(len(pks), 2000)):
+        Favorite.objects.filter(product_id=pk).update(created_at=now - timedelta(days=rng.randint(0, 56)))
+    return pks
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--favorites', type=int, default=100000)
+    parser.add_argument('--changed', type=int, default=200)
+    parser.add_argument('--views', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    cache.clear()
+    settings.POPULARITY_VIEWS_ENABLED = True  # один процесс: кэша в памяти достаточно
+    pks = populate(args.products, args.favorites)
+    print(f'backend: {connection.vendor}, products: {args.products}, favorites: {args.favorites}')
+
+    stats, ms = timed(lambda: popularity.update(full=True))
+    print(f'full recompute:        {stats["products"]:>6} products {ms:>8.0f} ms')
+
+    rng = random.Random(7)
+    _, ms = timed(lambda: [popularity.record_view(rng.choice(pks)) for _ in range(args.views)])
+    print(f'record_view:           {ms * 1000 / args.views:>8.2f} us per view')
+    popularity.update()
+
+    popularity.touch(rng.sample(pks, args.changed))
+    stats, ms = timed(popularity.update)
+    print(f'incremental update:    {stats["products"]:>6} products {ms:>8.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Каталог по рейтингу: агрегат по отзывам при каждом запросе против готовых
+столбцов Product.rating_avg/rating_count (store/ratings.py).
+
+Запуск:  python scripts/bench_ratings.py [--products 20000] [--reviews 200000] [--repeat 10]
+
+Данные создаются во временной тестовой базе (для SQLite — в памяти),
+рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.db import connection
+from django.db.models import Avg, Count, Q
+from django.test.utils import setup_test_environment
+
+from store.models import Category, Product, Review
+from store.ratings import rebuild
+
+PAGE = 15
+
+
+def populate(products, reviews, batch_size=5000):
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench', slug='bench')
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create([
+            Product(category=category, name=f'Товар {i}', slug=f'bench-{i}', price=100, stock=1, is_published=True)
+            for i in range(start, min(products, start + batch_size))
+        ])
+    pks = list(Product.objects.values_list('pk', flat=True))
+    for start in range(0, reviews, batch_size):
+        # bulk_create сигналов не вызывает — рейтинги потом пересчитывает rebuild()
+        Review.objects.bulk_create([
+            Review(product_id=rng.choice(pks), rating=rng.randint(1, 5), approved=rng.random() < 0.8)
+            for _ in range(start, min(reviews, start + batch_size))
+        ])
+    rebuild()
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def aggregated():
+    approved = Q(reviews__approved=True)
+    return list(
+        Product.objects.filter(is_published=True, is_deleted=False)
+        .annotate(avg=Avg('reviews__rating', filter=approved), n=Count('reviews', filter=approved))
+        .order_by('-avg', '-n', '-id')[:PAGE]
+    )
+
+
+def stored():
+    return list(
+        Product.objects.filter(is_published=True, is_deleted=False)
+        .order_by('-rating_avg', '-rating_count', '-id')[:PAGE]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--reviews', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    populate(args.products, args.reviews)
+    start = time.perf_counter()
+    rebuild()
+    rebuild_ms = (time.perf_counter() - start) * 1000
+    print(f'backend: {connection.vendor}, products: {args.products}, reviews: {args.reviews}')
+    print(f'first page sorted by rating: aggregate {_timed(aggregated, args.repeat):.1f} ms, '
+          f'stored columns {_timed(stored, args.repeat):.1f} ms')
+    print(f'full rebuild (one UPDATE): {rebuild_ms:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Подбор товаров для промпта чата (store/retrieval.py): время сборки индекса и
+задержка запроса top-k на синтетическом каталоге.
+
+Запуск:  python scripts/bench_retrieval.py [--products 1000 10000 50000] [--queries 500] [-k 5]
+Индекс строится в памяти из сгенерированных товаров, база данных не нужна.
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from store.retrieval import RetrievalIndex
+
+ALPHABET = 'абвгдежзиклмнопрстуфхцчшэюя'
+
+
+def make_words(rng, count):
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(4, 10))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    vocabulary = make_words(rng, 20000)
+    # частота слов по закону Ципфа, как в настоящих текстах
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    print(f'{"products":>9} {"build s":>8} {"terms":>8} {"p50 ms":>7} {"p95 ms":>7} {"max ms":>7}')
+    for count in args.products:
+        docs = [
+            (' '.join(rng.choices(vocabulary, weights, k=3)), ' '.join(rng.choices(vocabulary, weights, k=60)))
+            for _ in range(count)
+        ]
+        start = time.perf_counter()
+        index = RetrievalIndex()
+        for pk, (names, descriptions) in enumerate(docs, 1):
+            index.add(pk, names, descriptions, (names, 100, descriptions[:200]))
+        build = time.perf_counter() - start
+
+        queries = [' '.join(rng.choices(vocabulary, weights, k=rng.randint(2, 8))) for _ in range(args.queries)]
+        for query in queries:
+            index.search(query, args.k)  # прогрев: списки лучших пар частых термов
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.k)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f'{count:>9} {build:>8.2f} {len(index.postings):>8} {statistics.median(timings):>7.2f} '
+              f'{p95:>7.2f} {timings[-1]:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Сравнение поиска: старый name__icontains против полнотекстового индекса (store.search).
+
+Запуск:  python scripts/bench_search.py [--sizes 10000,100000,1000000] [--repeat 5]
+
+Данные создаются во временной тестовой базе (для SQLite — в памяти),
+рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from store.models import Category, Product
+from store.search import rebuild_index, search_products
+
+WORDS_RU = ['телефон', 'куртка', 'зимняя', 'кожаная', 'ноутбук', 'чехол', 'детский', 'велосипед',
+            'красный', 'новый', 'шкаф', 'стол', 'кресло', 'лампа', 'чайник', 'пылесос', 'платье']
+WORDS_RU += [f'товар{i}' for i in range(200)]
+WORDS_EN = ['phone', 'jacket', 'winter', 'leather', 'laptop', 'case', 'kids', 'bicycle',
+            'red', 'new', 'wardrobe', 'table', 'chair', 'lamp', 'kettle', 'vacuum', 'dress']
+WORDS_EN += [f'item{i}' for i in range(200)]
+QUERIES = ['куртка', 'куртка w1234', 'laptop', 'red', 'пылес']
+
+
+def _filler(rng, n):
+    # «шумовые» слова, чтобы запросы были избирательными, как в реальном каталоге
+    return ' '.join(f'w{rng.randint(0, 20000)}' for _ in range(n))
+
+
+def _phrase(rng, words, n):
+    return ' '.join([rng.choice(words), _filler(rng, n - 1)])
+
+
+def populate(count, batch_size=5000):
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench', slug='bench')
+    created = Product.objects.count()
+    while created < count:
+        batch = []
+        for i in range(created, min(count, created + batch_size)):
+            name = _phrase(rng, WORDS_RU, 3)
+            batch.append(Product(
+                category=category,
+                name=name,
+                name_ru=name,
+                name_en=_phrase(rng, WORDS_EN, 3),
+                slug=f'bench-{i}',
+                description=_phrase(rng, WORDS_RU, 30),
+                description_en=_phrase(rng, WORDS_EN, 30),
+                price=rng.randint(100, 10000),
+                stock=1,
+                is_published=True,
+            ))
+        Product.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def old_search(q):
+    # как было в search_view: весь результат уходит в шаблон
+    qs = Product.objects.all().filter(name__icontains=q)
+    qs.count()
+    list(qs)
+
+
+def new_search(q):
+    page = Paginator(search_products(q), 15).get_page(1)
+    page.paginator.count
+    list(page.object_list)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    print(f'backend: {connection.vendor}')
+    print(f'{"products":>10} {"query":<16} {"icontains ms":>13} {"index ms":>10} {"speedup":>8}')
+    for size in sizes:
+        populate(size)
+        rebuild_index(batch_size=5000)
+        for q in QUERIES:
+            old_ms = _timed(lambda: old_search(q), args.repeat)
+            new_ms = _timed(lambda: new_search(q), args.repeat)
+            print(f'{size:>10} {q:<16} {old_ms:>13.1f} {new_ms:>10.1f} {old_ms / max(new_ms, 0.001):>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
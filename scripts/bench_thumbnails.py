@@ -0,0 +1,81 @@
+"""
+Копии фото товаров (store/thumbnails.py): время генерации и вес страницы каталога.
+
+Сравнивается, сколько байт картинок уходит на страницу из --page товаров:
+исходные фото против копии, которую браузер выберет по srcset для карточки
+каталога (ширина --card px при плотности экрана --dpr).
+
+Запуск:  python scripts/bench_thumbnails.py [--images 20] [--size 3000x2000] [--page 20] [--card 250] [--dpr 2]
+Файлы пишутся во временный MEDIA_ROOT, база данных не нужна.
+"""
+from pathlib import Path
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from PIL import Image
+
+from store.thumbnails import render, thumbnail_name
+
+
+def make_photo(seed, size):
+    # шум поверх градиента сжимается примерно как фотография, а не как заливка
+    noise = Image.effect_noise(size, 40 + seed % 20).convert('RGB')
+    gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+    buffer = BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--size', default='3000x2000')
+    parser.add_argument('--page', type=int, default=20)
+    parser.add_argument('--card', type=int, default=250)
+    parser.add_argument('--dpr', type=float, default=2)
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split('x'))
+
+    with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+        photos = [make_photo(i, size) for i in range(args.images)]
+        seconds, results = [], []
+        for data in photos:
+            start = time.perf_counter()
+            results.append(render(data))
+            seconds.append(time.perf_counter() - start)
+        print(f'widths: {settings.THUMBNAIL_WIDTHS}, quality: {settings.THUMBNAIL_QUALITY}, photo {args.size}')
+        print(f'generation per photo: median {statistics.median(seconds) * 1000:.0f} ms, '
+              f'max {max(seconds) * 1000:.0f} ms')
+
+        wanted = args.card * args.dpr
+        original = webp = jpg = 0
+        for i in range(args.page):
+            data = photos[i % len(photos)]
+            key, widths = results[i % len(results)]
+            # как браузер: наименьшая копия не уже нужной ширины, иначе самая широкая
+            width = next((w for w in widths if w >= wanted), widths[-1])
+            original += len(data)
+            webp += default_storage.size(thumbnail_name(key, width, 'webp'))
+            jpg += default_storage.size(thumbnail_name(key, width, 'jpg'))
+        print(f'page of {args.page} cards at {wanted:.0f}px: original {original / 1024:.0f} KiB, '
+              f'webp {webp / 1024:.0f} KiB ({original / webp:.0f}x less), jpeg {jpg / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
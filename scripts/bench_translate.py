@@ -0,0 +1,96 @@
+"""
+Перевод каталога: translate_text на каждое поле каждого товара (как раньше)
+против store/translation.py (пачки, пул потоков, память переводов).
+
+Перевод идёт через локальный поддельный LibreTranslate
+(scripts/fake_translate_server.py) с задержкой --request-ms на запрос.
+Треть описаний одинаковые — как шаблонные описания в настоящем каталоге.
+
+Запуск:  python scripts/bench_translate.py [--products 100] [--workers 8] [--batch-size 50] [--request-ms 150]
+Данные создаются во временной тестовой базе, рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from scripts import fake_translate_server
+from store.models import Category, Product
+from store.translation import LANGS, Translator, translate_products
+from store.utils.translate import translate_text
+
+PORT = 5011
+
+
+def create_products(count):
+    category, _ = Category.objects.get_or_create(name='Bench', slug='bench')
+    Product.objects.bulk_create([
+        Product(category=category, name=f'Товар {i}', slug=f'bench-{i}', price=100,
+                description='Новый, с гарантией' if i % 3 == 0 else f'Описание товара {i}')
+        for i in range(count)
+    ])
+
+
+def sequential(url):
+    for product in Product.objects.order_by('pk'):
+        for lang in LANGS:
+            setattr(product, f'name_{lang}', translate_text(product.name, lang, api_url=url))
+            setattr(product, f'description_{lang}', translate_text(product.description, lang, api_url=url))
+        product.save()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--request-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    fake_translate_server.serve(PORT, request_ms=args.request_ms, text_ms=1)
+    url = f'http://127.0.0.1:{PORT}/translate'
+    create_products(args.products)
+
+    served = fake_translate_server.requests_served
+    start = time.perf_counter()
+    sequential(url)
+    old = time.perf_counter() - start
+    old_requests = fake_translate_server.requests_served - served
+
+    Product.objects.update(**{f'{f}_{lang}': None for f in ('name', 'description') for lang in LANGS})
+    served = fake_translate_server.requests_served
+    start = time.perf_counter()
+    stats = translate_products(Product.objects.all(), Translator(workers=args.workers, batch_size=args.batch_size,
+                                                                 api_url=url))
+    new = time.perf_counter() - start
+    new_requests = fake_translate_server.requests_served - served
+    assert not Product.objects.filter(name_en__isnull=True).exists()
+
+    Product.objects.update(**{f'{f}_{lang}': None for f in ('name', 'description') for lang in LANGS})
+    start = time.perf_counter()
+    again = translate_products(Product.objects.all(), Translator(workers=args.workers, api_url=url))
+    rerun = time.perf_counter() - start
+
+    print(f'{"variant":<34} {"seconds":>8} {"requests":>9}')
+    print(f'{"translate_text per field":<34} {old:>8.2f} {old_requests:>9}')
+    print(f'{"pipeline":<34} {new:>8.2f} {new_requests:>9}   ({stats["translated"]} texts)')
+    print(f'{"pipeline, warm translation memory":<34} {rerun:>8.2f} {again["requests"]:>9}   '
+          f'({again["memory_hits"]} from memory)')
+
+
+if __name__ == '__main__':
+    main()
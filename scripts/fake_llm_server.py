@@ -0,0 +1,108 @@
+"""
+Локальный поддельный сервер OpenAI API для проверки чата и модерации без сети.
+
+Понимает POST /v1/chat/completions (обычный ответ и stream=True в формате SSE,
+как у OpenAI) и POST /v1/moderations. Задержки имитируют реальную модель:
+--latency-ms до первого токена и --token-ms между токенами.
+
+Запуск:  python scripts/fake_llm_server.py [--port 8765] [--latency-ms 300] [--token-ms 30]
+Затем:   OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python manage.py runserver
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import time
+import uuid
+
+LATENCY = 0.3
+TOKEN_DELAY = 0.03
+
+
+def make_answer(messages):
+    question = messages[-1]['content'] if messages else ''
+    if 'Вопрос пользователя:' in question:
+        question = question.split('Вопрос пользователя:', 1)[1].split('\n', 1)[0]
+    question = ' '.join(question.split())[:80]
+    return (f'Это тестовый ответ на вопрос «{question}». Товары можно добавить в корзину, '
+            f'оформить заказ и оплатить его картой. Если остались вопросы, напишите в поддержку.')
+
+
+def tokens(text):
+    words = text.split(' ')
+    return [word + (' ' if i < len(words) - 1 else '') for i, word in enumerate(words)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive: клиент переиспользует соединение
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        payload = data.encode()
+        self.wfile.write(f'{len(payload):x}\r\n'.encode() + payload + b'\r\n')
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.path.endswith('/moderations'):
+            return self._json({'id': 'modr-fake', 'model': 'fake', 'results': [
+                {'flagged': False, 'categories': {}, 'category_scores': {}},
+            ]})
+        if not self.path.endswith('/chat/completions'):
+            return self._json({'error': {'message': 'not found'}}, status=404)
+
+        answer = make_answer(request.get('messages', []))
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:12]}'
+        base = {'id': completion_id, 'created': int(time.time()), 'model': request.get('model', 'fake')}
+        time.sleep(LATENCY)
+        if not request.get('stream'):
+            return self._json({**base, 'object': 'chat.completion', 'choices': [{
+                'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': answer},
+            }], 'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for token in tokens(answer):
+                chunk = {**base, 'object': 'chat.completion.chunk', 'choices': [
+                    {'index': 0, 'delta': {'content': token}, 'finish_reason': None},
+                ]}
+                self._chunk(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n')
+                time.sleep(TOKEN_DELAY)
+            self._chunk('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # клиент прервал поток
+
+
+def main():
+    global LATENCY, TOKEN_DELAY
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--token-ms', type=float, default=30)
+    args = parser.parse_args()
+    LATENCY, TOKEN_DELAY = args.latency_ms / 1000, args.token_ms / 1000
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    print(f'Fake OpenAI API on http://127.0.0.1:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Локальный поддельный LibreTranslate для проверки и замеров перевода без сети.
+
+POST /translate принимает q строкой или списком (форма или JSON) и
+возвращает «[цель] текст». Задержки имитируют настоящий сервис:
+--request-ms на каждый запрос и --text-ms на каждый текст в нём.
+
+Запуск:  python scripts/fake_translate_server.py [--port 5005] [--request-ms 150] [--text-ms 5]
+Затем:   LIBRETRANSLATE_URL=http://127.0.0.1:5005/translate python manage.py translate_products
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import argparse
+import json
+import threading
+import time
+
+REQUEST_DELAY = 0.15
+TEXT_DELAY = 0.005
+requests_served = 0
+_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive: клиент переиспользует соединение
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        global requests_served
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            data = json.loads(raw or b'{}')
+        else:
+            data = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+        texts = data.get('q', '')
+        target = data.get('target', 'en')
+        with _lock:
+            requests_served += 1
+        time.sleep(REQUEST_DELAY + TEXT_DELAY * (len(texts) if isinstance(texts, list) else 1))
+        if isinstance(texts, list):
+            translated = [f'[{target}] {text}' for text in texts]
+        else:
+            translated = f'[{target}] {texts}'
+        body = json.dumps({'translatedText': translated}, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port, request_ms=150, text_ms=5):
+    """Запустить сервер в фоновом потоке (для скриптов замеров). Возвращает сервер."""
+    global REQUEST_DELAY, TEXT_DELAY
+    REQUEST_DELAY, TEXT_DELAY = request_ms / 1000, text_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--request-ms', type=float, default=150)
+    parser.add_argument('--text-ms', type=float, default=5)
+    args = parser.parse_args()
+    serve(args.port, args.request_ms, args.text_ms)
+    print(f'Fake LibreTranslate on http://127.0.0.1:{args.port}/translate')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Нагрузка на вебхук Stripe подписанными поддельными событиями.
+
+Для --payments платежей шлются события checkout.session.completed, каждое
+--retries раз (как при шторме повторных доставок Stripe), в перемешанном
+порядке. Измеряются задержка ответа вебхука, число записей в базу при приёме
+и время асинхронной обработки журнала.
+
+Запуск:  python scripts/load_stripe_webhook.py [--payments 500] [--retries 5]
+Данные создаются во временной тестовой базе, рабочая база не затрагивается.
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# add project root to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shops.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from shops.celery import app
+from store import tasks
+from store.models import Order, Payment, StripeEvent
+from store.stripe_events import process_pending
+
+SECRET = 'whsec_load_test'
+
+
+def signed(event):
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return payload, f't={timestamp},v1={signature}'
+
+
+def fake_event(i, payment):
+    return {
+        'id': f'evt_load_{i}', 'object': 'event', 'type': 'checkout.session.completed',
+        'created': int(time.time()) + i,
+        'data': {'object': {
+            'id': payment.stripe_id, 'object': 'checkout.session',
+            'payment_intent': f'pi_load_{i}', 'payment_status': 'paid',
+        }},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--payments', type=int, default=500)
+    parser.add_argument('--retries', type=int, default=5, help='Deliveries of every event')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    settings.STRIPE_WEBHOOK_SECRET = SECRET
+
+    orders = Order.objects.bulk_create([Order(total_amount=100) for _ in range(args.payments)])
+    payments = Payment.objects.bulk_create([
+        Payment(order=order, stripe_id=f'cs_load_{i}', amount=100) for i, order in enumerate(orders)
+    ])
+    deliveries = [signed(fake_event(i, p)) for i, p in enumerate(payments)] * args.retries
+    random.shuffle(deliveries)
+
+    queued = []
+    tasks.process_stripe_events.delay = queued.append  # обработку запускаем отдельно, ниже
+    client = Client()
+    latencies = []
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for payload, signature in deliveries:
+            t = time.perf_counter()
+            response = client.post('/stripe/webhook/', payload, content_type='application/json',
+                                   HTTP_STRIPE_SIGNATURE=signature)
+            latencies.append(time.perf_counter() - t)
+            assert response.status_code == 200, response.content
+        ingest_time = time.perf_counter() - started
+    writes = sum(1 for q in queries.captured_queries if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE')))
+
+    app.conf.task_always_eager = True  # письма и уведомления — синхронно, в locmem
+    started = time.perf_counter()
+    processed = sum(process_pending(ref) for ref in queued)
+    process_time = time.perf_counter() - started
+
+    latencies.sort()
+    print(f'deliveries            {len(deliveries)} ({args.payments} events x {args.retries})')
+    print(f'ingest                {len(deliveries) / ingest_time:.0f} req/s, '
+          f'p50 {statistics.median(latencies) * 1000:.2f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms')
+    print(f'db writes on ingest   {writes} (logged events: {StripeEvent.objects.count()})')
+    print(f'processing            {processed} events in {process_time:.2f} s, '
+          f'paid orders: {Order.objects.filter(status="paid").count()}')
+
+
+if __name__ == '__main__':
+    main()
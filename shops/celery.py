@@ -17,6 +17,22 @@ app.conf.beat_schedule = {
         'task': 'store.tasks.send_pending_emails',
         'schedule': crontab(minute='*/15'),  # Каждые 15 минут
     },
+    'drain-email-outbox': {
+        'task': 'store.tasks.drain_email_outbox',
+        'schedule': crontab(minute='*'),  # Каждую минуту: повторы и всё, что не отправили сразу
+    },
+    'flush-seller-digests': {
+        'task': 'store.tasks.flush_seller_digests',
+        'schedule': crontab(minute='*/5'),
+    },
+    'process-pending-stripe-events': {
+        'task': 'store.tasks.process_pending_stripe_events',
+        'schedule': crontab(minute='*'),
+    },
+    'update-product-popularity': {
+        'task': 'store.tasks.update_product_popularity',
+        'schedule': crontab(minute='*/5'),  # только товары с новыми событиями
+    },
     'cleanup-old-carts': {
         'task': 'store.tasks.cleanup_old_carts',
         'schedule': crontab(hour=3, minute=0),  # 3:00 AM
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 
 from openai import OpenAI
 
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store.middleware.GuestCartMiddleware',
 ]
 
 ROOT_URLCONF = 'shops.urls'
@@ -128,10 +130,118 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Уменьшенные копии фото товаров (store/thumbnails.py): ширины в пикселях, качество
+# WebP/JPEG и генерация задачей Celery (False — сразу после сохранения товара)
+THUMBNAIL_WIDTHS = [int(w) for w in os.environ.get('THUMBNAIL_WIDTHS', '160,320,640,1000').split(',')]
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))
+THUMBNAILS_ASYNC = os.environ.get('THUMBNAILS_ASYNC', 'True') == 'True'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SECURE_SSL_REDIRECT = False
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
 
-OpenAI_API_KEY = os.environ.get('OPENAI_API_KEY', 'sk-xxxxxxxxxxxxxxxx')
\ No newline at end of file
+OpenAI_API_KEY = os.environ.get('OPENAI_API_KEY', 'sk-xxxxxxxxxxxxxxxx')
+# Другой адрес API, например локальный scripts/fake_llm_server.py: http://127.0.0.1:8765/v1
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+
+# Чат с помощником (store/chat.py)
+CHAT_MODEL = os.environ.get('CHAT_MODEL', 'gpt-3.5-turbo')
+CHAT_MAX_TOKENS = int(os.environ.get('CHAT_MAX_TOKENS', 200))
+CHAT_TIMEOUT = int(os.environ.get('CHAT_TIMEOUT', 60))
+# Лимит одновременных запросов на пользователя; общий для всех воркеров только с REDIS_URL
+CHAT_MAX_CONCURRENT_PER_USER = int(os.environ.get('CHAT_MAX_CONCURRENT_PER_USER', 2))
+# Сколько подходящих товаров (store/retrieval.py) попадает в промпт
+CHAT_CONTEXT_PRODUCTS = int(os.environ.get('CHAT_CONTEXT_PRODUCTS', 5))
+# Кэш ответов на типовые вопросы: не длиннее CHAT_CACHE_MAX_QUESTION символов
+CHAT_CACHE_SIZE = int(os.environ.get('CHAT_CACHE_SIZE', 1000))
+CHAT_CACHE_TTL = int(os.environ.get('CHAT_CACHE_TTL', 3600))
+CHAT_CACHE_MAX_QUESTION = int(os.environ.get('CHAT_CACHE_MAX_QUESTION', 200))
+
+# Кэш: Redis в production (общий для всех воркеров), иначе память процесса
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Кэш страниц каталога (store/catalog_cache.py): включается только с общим кэшем (REDIS_URL) —
+# в памяти процесса сброс версии после изменения товара видит лишь один воркер.
+# Время жизни страниц (секунды)
+CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'True' if REDIS_URL else 'False') == 'True'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Популярность товаров (store/popularity.py): вклад события уменьшается вдвое за
+# POPULARITY_HALF_LIFE_DAYS; веса сигналов. Счётчики просмотров живут в кэше и
+# должны быть общими для веб-воркеров и Celery, поэтому учёт просмотров требует REDIS_URL
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', 7))
+POPULARITY_WEIGHTS = {'view': 1, 'favorite': 5, 'review': 5, 'sale': 10}
+POPULARITY_VIEWS_ENABLED = os.environ.get('POPULARITY_VIEWS_ENABLED', 'True' if REDIS_URL else 'False') == 'True'
+if POPULARITY_VIEWS_ENABLED and not REDIS_URL:
+    raise ImproperlyConfigured("POPULARITY_VIEWS_ENABLED requires REDIS_URL (a cache shared by all workers)")
+
+# Celery (см. CELERY_SETUP.md)
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL or 'redis://127.0.0.1:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+
+# Объединять гостевую корзину с корзиной пользователя в фоне (Celery), чтобы вход не ждал
+CART_MERGE_ASYNC = os.environ.get('CART_MERGE_ASYNC', 'False') == 'True'
+
+# Ночная очистка корзин (store.tasks.cleanup_old_carts): возраст в днях, размер порции
+# и пауза между порциями в секундах. Корзины с резервными копиями удалённых товаров
+# хранятся дольше — CART_CLEANUP_BACKUP_DAYS
+CART_CLEANUP_DAYS = int(os.environ.get('CART_CLEANUP_DAYS', 30))
+CART_CLEANUP_BACKUP_DAYS = int(os.environ.get('CART_CLEANUP_BACKUP_DAYS', 90))
+CART_CLEANUP_BATCH_SIZE = int(os.environ.get('CART_CLEANUP_BATCH_SIZE', 500))
+CART_CLEANUP_SLEEP = float(os.environ.get('CART_CLEANUP_SLEEP', 0.1))
+
+# Почта: письма уходят через очередь store/outbox.py (задача drain_email_outbox).
+# Для разработки и бенчмарков: EMAIL_BACKEND=django.core.mail.backends.locmem.EmailBackend
+# или django.core.mail.backends.filebased.EmailBackend (+ EMAIL_FILE_PATH)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@storehub.kg')
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 100))  # писем на одно соединение
+EMAIL_OUTBOX_RATE = float(os.environ.get('EMAIL_OUTBOX_RATE', 10))  # писем/с на воркер, 0 — без ограничения
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_BACKOFF = int(os.environ.get('EMAIL_OUTBOX_BACKOFF', 60))  # сек, удваивается с каждой попыткой
+EMAIL_OUTBOX_KICK_DELAY = int(os.environ.get('EMAIL_OUTBOX_KICK_DELAY', 5))  # сек
+# Окно, за которое заказы одному продавцу собираются в одно письмо, сек
+SELLER_DIGEST_WINDOW = int(os.environ.get('SELLER_DIGEST_WINDOW', 60))
+
+# Модерация товаров (store/moderation.py): срок жизни вердикта в БД и в кэше памяти, сек
+MODERATION_VERDICT_TTL = int(os.environ.get('MODERATION_VERDICT_TTL', 30 * 24 * 3600))
+MODERATION_CACHE_TIMEOUT = int(os.environ.get('MODERATION_CACHE_TIMEOUT', 24 * 3600))
+# через сколько секунд повторить AI-модерацию, если OpenAI не ответил (товар остаётся pending)
+MODERATION_RETRY_DELAY = int(os.environ.get('MODERATION_RETRY_DELAY', 300))
+
+# Память переводов (store/translation_memory.py): записей в LRU процесса перед таблицей в БД
+TRANSLATION_MEMORY_LRU_SIZE = int(os.environ.get('TRANSLATION_MEMORY_LRU_SIZE', 10000))
+
+# Stripe (store/payment_views.py, store/stripe_views.py)
+STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+
+# Комиссия площадки с продаж продавца, % (журнал проводок store/ledger.py)
+SELLER_COMMISSION_PERCENTAGE = os.environ.get('SELLER_COMMISSION_PERCENTAGE', '10')
+
+# Где хранить корзины гостей: 'cache' — в CACHES с TTL (Redis), в БД пишутся только при входе;
+# 'db' — как раньше, строка Cart на каждую сессию. 'cache' требует общего кэша (REDIS_URL):
+# в памяти процесса у каждого воркера gunicorn была бы своя корзина гостя
+GUEST_CART_STORE = os.environ.get('GUEST_CART_STORE', 'cache' if REDIS_URL else 'db')
+if GUEST_CART_STORE == 'cache' and not REDIS_URL:
+    raise ImproperlyConfigured("GUEST_CART_STORE='cache' requires REDIS_URL (a cache shared by all workers)")
+GUEST_CART_TTL = int(os.environ.get('GUEST_CART_TTL', 14 * 24 * 3600))
@@ -1,7 +1,11 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import Category, Product
 from .models import Cart, CartItem
 from .models import Order, OrderItem
+from .models import DailySales, DailySalesRollup, SellerLedgerEntry
+from .models import OutgoingEmail, Payment, StripeEvent
+from .models import ForbiddenTerm, ModerationVerdict, TranslationMemory
 from .models import Favorite, Review, Reservation
 
 
@@ -13,58 +17,58 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'name_ru', 'name_kg', 'price', 'stock']
+    list_display = ['id', 'name', 'name_ru', 'name_kg', 'price', 'stock', 'rating_avg', 'rating_count', 'moderation_status']
     list_editable = ['name', 'name_ru', 'price', 'stock']
     list_display_links = ['id']
+    list_filter = ['moderation_status']
     fieldsets = (
         (None, {'fields': ('category', 'name', 'name_ru', 'name_kg', 'name_en', 'slug', 'image', 'price', 'stock', 'is_published')}),
+        ('Модерация', {'fields': ('moderation_status', 'moderation_reason')}),
         ('Описание', {'fields': ('description', 'description_ru', 'description_kg', 'description_en')}),
+        ('Отзывы', {'fields': ('rating_avg', 'rating_count')}),
     )
+    readonly_fields = ['rating_avg', 'rating_count']
 
-    actions = ['autotranslate_selected']
+    actions = ['autotranslate_selected', 'rescreen_selected', 'rebuild_ratings_selected']
 
     def autotranslate_selected(self, request, queryset):
         """Admin action: autotranslate selected products using default provider"""
         from django.contrib import messages
-        translated = 0
-        for p in queryset:
-            changed = False
-            for lang in ('ru', 'kg', 'en'):
-                name_field = f'name_{lang}'
-                desc_field = f'description_{lang}'
-                cur_name = getattr(p, name_field, None)
-                if not cur_name:
-                    tr = None
-                    try:
-                        from store.utils.translate import translate_text
-                        tr = translate_text(p.name, target_lang=lang)
-                    except Exception:
-                        tr = ''
-                    if tr:
-                        setattr(p, name_field, tr)
-                        changed = True
-                cur_desc = getattr(p, desc_field, None)
-                if not cur_desc:
-                    trd = None
-                    try:
-                        from store.utils.translate import translate_text
-                        trd = translate_text(p.description or '', target_lang=lang)
-                    except Exception:
-                        trd = ''
-                    if trd:
-                        setattr(p, desc_field, trd)
-                        changed = True
-            if changed:
-                p.save()
-                translated += 1
-        messages.add_message(request, messages.INFO, f'Автопереведено: {translated} товаров')
+        from store.translation import Translator, translate_products
+        stats = translate_products(queryset, Translator())
+        messages.add_message(request, messages.INFO, f"Автопереведено: {stats['updated']} товаров "
+                                                     f"(из памяти переводов: {stats['memory_hits']}, "
+                                                     f"у провайдера: {stats['translated']})")
     autotranslate_selected.short_description = 'Автоперевести выбранные продукты'
 
+    def rescreen_selected(self, request, queryset):
+        """Admin action: re-check selected products against the forbidden-term list and reject matches"""
+        from django.contrib import messages
+        from .moderation import rescreen
+        stats = rescreen(queryset, apply=True)
+        messages.add_message(request, messages.INFO, f"Проверено {stats['checked']}, отклонено {stats['rejected']} товаров")
+    rescreen_selected.short_description = 'Перепроверить по запрещённым словам'
+
+    def rebuild_ratings_selected(self, request, queryset):
+        """Admin action: recount rating_avg/rating_count of selected products from approved reviews"""
+        from django.contrib import messages
+        from .ratings import rebuild
+        messages.add_message(request, messages.INFO, f'Рейтинг пересчитан у {rebuild(queryset)} товаров')
+    rebuild_ratings_selected.short_description = 'Пересчитать рейтинг по отзывам'
+
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'session_key', 'created_at']
+    list_display = ['id', 'user', 'session_key', 'item_count', 'total_amount', 'created_at']
     search_fields = ['session_key', 'user__username']
+    actions = ['recalculate_totals']
+
+    def recalculate_totals(self, request, queryset):
+        """Admin action: verify stored cart totals against the items and fix mismatches"""
+        from django.contrib import messages
+        fixed = sum(1 for cart in queryset if cart.recalculate_totals())
+        messages.add_message(request, messages.INFO, f'Исправлено итогов: {fixed} из {queryset.count()} корзин')
+    recalculate_totals.short_description = 'Пересчитать итоги корзин'
 
 
 @admin.register(CartItem)
@@ -85,6 +89,93 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['id', 'order', 'product', 'name', 'price', 'quantity']
 
 
+class ReadOnlyAdmin(admin.ModelAdmin):
+    # свёртки и журналы ведутся кодом (сигналы, задачи, backfill-команды), руками их не правят
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(ReadOnlyAdmin):
+    list_display = ['date', 'orders_count', 'items_sold', 'revenue']
+    date_hierarchy = 'date'
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(ReadOnlyAdmin):
+    list_display = ['date', 'category', 'seller', 'orders_count', 'items_sold', 'revenue']
+    list_filter = ['category']
+    date_hierarchy = 'date'
+
+
+@admin.register(SellerLedgerEntry)
+class SellerLedgerEntryAdmin(ReadOnlyAdmin):
+    list_display = ['id', 'seller', 'order', 'kind', 'gross', 'commission', 'net', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['seller__username']
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'idempotency_key', 'to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['idempotency_key', 'to']
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+    retry_now.short_description = 'Отправить повторно'
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'stripe_id', 'payment_intent', 'amount', 'status', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['stripe_id', 'payment_intent']
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(ReadOnlyAdmin):
+    list_display = ['event_id', 'type', 'object_ref', 'received_at', 'processed_at', 'attempts']
+    list_filter = ['type']
+    search_fields = ['event_id', 'object_ref']
+
+
+@admin.register(ForbiddenTerm)
+class ForbiddenTermAdmin(admin.ModelAdmin):
+    list_display = ['id', 'term', 'language', 'is_active', 'created_at']
+    list_editable = ['is_active']
+    list_filter = ['language', 'is_active']
+    search_fields = ['term']
+
+
+@admin.register(TranslationMemory)
+class TranslationMemoryAdmin(admin.ModelAdmin):
+    # исправить неудачный перевод можно здесь: следующие запуски возьмут исправленный текст
+    list_display = ['id', 'source_text', 'target_lang', 'text', 'provider', 'created_at']
+    list_filter = ['target_lang', 'provider']
+    search_fields = ['source_text', 'text']
+    readonly_fields = ['source_hash', 'source_lang', 'target_lang', 'provider', 'source_text', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        from .translation_memory import clear_lru
+        clear_lru()
+
+
+@admin.register(ModerationVerdict)
+class ModerationVerdictAdmin(ReadOnlyAdmin):
+    # удалить вердикт = проверить такой текст заново
+    list_display = ['content_hash', 'ruleset', 'allowed', 'reason', 'source', 'created_at', 'expires_at']
+    list_filter = ['allowed', 'source', 'ruleset']
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'product', 'created_at']
@@ -96,6 +187,21 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ['id', 'product', 'user', 'rating', 'approved', 'created_at']
     list_filter = ['approved', 'rating']
     search_fields = ['product__name', 'user__username', 'text']
+    actions = ['approve_selected', 'unapprove_selected']
+
+    def approve_selected(self, request, queryset):
+        """Admin action: approve selected reviews and add them to product ratings in bulk"""
+        from django.contrib import messages
+        from .ratings import set_approved
+        messages.add_message(request, messages.INFO, f'Одобрено отзывов: {set_approved(queryset, True)}')
+    approve_selected.short_description = 'Одобрить выбранные отзывы'
+
+    def unapprove_selected(self, request, queryset):
+        """Admin action: hide selected reviews and remove them from product ratings in bulk"""
+        from django.contrib import messages
+        from .ratings import set_approved
+        messages.add_message(request, messages.INFO, f'Снято с публикации отзывов: {set_approved(queryset, False)}')
+    unapprove_selected.short_description = 'Снять одобрение с выбранных отзывов'
 
 
 @admin.register(Reservation)
@@ -1,9 +1,25 @@
-from openai import OpenAI
+import os
+
 from django.conf import settings
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from . import retrieval
+
+_client = None
+
+
+def _ai_client():
+    # один клиент на процесс; создаётся при первом вопросе, а не при импорте модуля
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'), base_url=settings.OPENAI_BASE_URL)
+    return _client
+
 
-def ai_chat_answer(user_message, products_context):
+def ai_chat_answer(user_message, products_context=None):
+    if products_context is None:
+        # только несколько подходящих товаров, а не весь каталог (store/retrieval.py)
+        products_context = retrieval.product_context(user_message) or 'Нет подходящих товаров.'
     prompt = f"""
 Ты помощник сайта.
 Отвечай ТОЛЬКО по информации ниже.
@@ -16,14 +32,14 @@ def ai_chat_answer(user_message, products_context):
 {user_message}
 """
 
-    response = client.chat.completions.create(
+    response = _ai_client().chat.completions.create(
         model="gpt-4o-mini",
         messages=[
-            {"role": "system", "context": "Ты помощник интернет-магазина."},
+            {"role": "system", "content": "Ты помощник интернет-магазина."},
             {"role": "user", "content": prompt},
         ],
         temperature=0.3,
         max_tokens=300,
     )
 
-    return response.choices[0].message.content
\ No newline at end of file
+    return response.choices[0].message.content
@@ -1,6 +1,7 @@
 from rest_framework import routers
 from django.urls import path, include
 from .views import CategoryViewSet, ProductViewSet, AIChatView
+from .payment_views import seller_earnings
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
@@ -26,4 +27,5 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('chat/', AIChatView.as_view(), name='ai_chat'),
+    path('seller/earnings/', seller_earnings, name='seller_earnings'),
 ]
@@ -0,0 +1,93 @@
+"""
+Операции над корзинами, которые затрагивают сразу много позиций.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+
+from .models import Cart, CartItem
+
+
+def merge_carts(source, target):
+    """
+    Перенести позиции корзины source в target одним набором запросов,
+    число которых не зависит от размера корзины:
+    - совпадающие товары — одним UPDATE количества в target;
+    - их копии в source — одним DELETE;
+    - остальные позиции — одним UPDATE cart_id;
+    итоги target пересчитываются одним агрегатом, source удаляется.
+    """
+    with transaction.atomic():
+        source_items = CartItem.objects.filter(cart=source)
+        overlapping = CartItem.objects.filter(cart=target, product_id__in=source_items.values('product_id'))
+        overlapping.update(quantity=F('quantity') + Subquery(
+            source_items.filter(product_id=OuterRef('product_id')).values('quantity')[:1]
+        ))
+        source_items.filter(product_id__in=CartItem.objects.filter(cart=target).values('product_id')).delete()
+        source_items.update(cart=target)
+        # цены совпавших позиций могли отличаться — пересчитываем итоги по факту
+        target.recalculate_totals()
+        Cart.objects.filter(pk=source.pk).delete()
+
+
+def merge_session_cart(session_key, user):
+    """Слить гостевую корзину сессии session_key в корзину пользователя (после входа)."""
+    if not session_key:
+        return
+    session_cart = Cart.objects.filter(session_key=session_key, user__isnull=True).first()
+    if not session_cart:
+        return
+    user_cart, _ = Cart.objects.get_or_create(user=user)
+    merge_carts(session_cart, user_cart)
+
+
+def purgeable_carts(cutoff, backup_cutoff):
+    """
+    Корзины, которые можно удалить: созданные до cutoff. Корзины с резервными
+    копиями удалённых товаров (is_deleted_backup) — единственный способ вернуть
+    товар в каталог, поэтому они живут дольше, до backup_cutoff. Условие —
+    один EXISTS в том же запросе, без обхода корзин в Python.
+    """
+    has_backup = Exists(CartItem.objects.filter(cart=OuterRef('pk'), is_deleted_backup=True))
+    return Cart.objects.filter(created_at__lt=cutoff).filter(~has_backup | Q(created_at__lt=backup_cutoff))
+
+
+def purge_old_carts(cutoff, backup_cutoff, batch_size=500, sleep=0.0, progress=None):
+    """
+    Удалить старые корзины порциями по batch_size первичных ключей: каждая порция —
+    отдельная короткая транзакция (DELETE позиций, DELETE корзин), между порциями
+    пауза sleep секунд, чтобы не держать блокировки и дать дорогу живому трафику.
+
+    Отметка продолжения выводится из самих данных и нигде не хранится: внутри запуска
+    порции идут по pk > последнего удалённого, а удалённых порций после прерванного
+    запуска (падение, перезапуск воркера) в базе уже нет — следующий запуск начинает
+    с первой оставшейся корзины-кандидата и ничего не пропускает.
+    progress(stats) вызывается после каждой порции. Возвращает stats:
+    {'carts', 'items', 'batches', 'last_pk', 'seconds'}.
+    """
+    started = time.monotonic()
+    last_pk = 0
+    stats = {'carts': 0, 'items': 0, 'batches': 0, 'last_pk': last_pk, 'seconds': 0.0}
+    candidates = purgeable_carts(cutoff, backup_cutoff).order_by('pk').values_list('pk', flat=True)
+    while True:
+        ids = list(candidates.filter(pk__gt=last_pk)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            items, _ = CartItem.objects.filter(cart_id__in=ids).delete()
+            _, deleted = Cart.objects.filter(pk__in=ids).delete()
+        last_pk = ids[-1]
+        stats['carts'] += deleted.get(Cart._meta.label, 0)
+        stats['items'] += items
+        stats['batches'] += 1
+        stats['last_pk'] = last_pk
+        stats['seconds'] = time.monotonic() - started
+        if progress:
+            progress(stats)
+        if len(ids) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    stats['seconds'] = time.monotonic() - started
+    return stats
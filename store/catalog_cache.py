@@ -0,0 +1,121 @@
+"""
+Кэш отрендеренных фрагментов каталога (главная и список товаров).
+
+Фрагмент сетки товаров общий для всех посетителей и хранится по языку и странице.
+Персональные части — кнопка избранного и CSRF-токен — оставлены в нём метками
+и подставляются уже после чтения из кэша (apply_user_markers).
+
+Инвалидация — через номер версии: любое изменение видимых в каталоге полей
+товара (см. store/signals.py) увеличивает версию, и старые ключи больше не читаются.
+Версия должна быть общей для всех воркеров, поэтому кэш работает только с общим
+бэкендом (CATALOG_CACHE_ENABLED, по умолчанию — при заданном REDIS_URL); без него
+фрагменты строятся на каждый запрос.
+
+Страница в ключе приходит из запроса, поэтому в кэш попадают только страницы,
+которые не размножаются произвольными параметрами: первая и курсоры, указывающие
+на существующий товар (см. views.product_list). Остальные страницы строятся без кэша.
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+VERSION_KEY = 'catalog:version'
+
+# Поля товара, изменение которых должно сбрасывать кэш каталога
+CATALOG_FIELDS = (
+    'name', 'name_ru', 'name_kg', 'name_en', 'slug', 'price', 'stock',
+    'image', 'is_published', 'is_deleted', 'category_id',
+)
+
+CSRF_PLACEHOLDER = '__catalog_csrf_token__'
+_NOT_LOADED = object()
+FAV_MARKER_RE = re.compile(r'<!--fav:(\d+)-->')
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def enabled():
+    return getattr(settings, 'CATALOG_CACHE_ENABLED', False)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate():
+    """Сбросить все закэшированные страницы каталога."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def snapshot(product):
+    """Значения полей каталога, уже загруженные в объект (отложенные поля не трогаем)."""
+    return tuple(product.__dict__.get(field, _NOT_LOADED) for field in CATALOG_FIELDS)
+
+
+def product_changed(product, previous):
+    if previous is None:
+        return True
+    current = snapshot(product)
+    return any(old is not _NOT_LOADED and old != new for old, new in zip(previous, current))
+
+
+def _key(name, language, page):
+    return f'catalog:{_version()}:{name}:{language}:{page}'
+
+
+def get_fragment(name, language, page, build):
+    """
+    Вернуть фрагмент из кэша или построить его через build() -> (html, cacheable)
+    и сохранить. build вызывается только при промахе. page=None — страница не кэшируется.
+    """
+    if page is None or not enabled():
+        return build()[0]
+    key = _key(name, language, page)
+    html = cache.get(key)
+    if html is None:
+        html, cacheable = build()
+        if cacheable:
+            cache.set(key, html, _timeout())
+    return html
+
+
+def render_fragment(template_name, context):
+    """Отрендерить фрагмент с меткой вместо CSRF-токена."""
+    context = dict(context, csrf_token=CSRF_PLACEHOLDER)
+    return render_to_string(template_name, context)
+
+
+def apply_user_markers(html, request, favorites_set):
+    """Подставить во фрагмент CSRF-токен и состояние избранного текущего пользователя."""
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    button = get_template('store/_fav_button.html')
+    is_authenticated = request.user.is_authenticated
+    anonymous_html = None
+    if not is_authenticated:
+        anonymous_html = button.render({'is_authenticated': False})
+
+    def replace(match):
+        if anonymous_html is not None:
+            return anonymous_html
+        product_id = int(match.group(1))
+        return button.render({
+            'is_authenticated': True,
+            'product_id': product_id,
+            'is_fav': product_id in favorites_set,
+        }, request)
+
+    return mark_safe(FAV_MARKER_RE.sub(replace, html))
@@ -0,0 +1,233 @@
+"""
+Чат с помощником сайта: асинхронный поток ответа (SSE), общий клиент OpenAI,
+кэш ответов и ограничение одновременных запросов пользователя.
+
+- Клиент AsyncOpenAI один на процесс (точнее, на цикл событий), поэтому
+  соединения с API переиспользуются из пула httpx. OPENAI_BASE_URL позволяет
+  направить чат на локальный сервер scripts/fake_llm_server.py.
+- В промпт попадают только несколько подходящих к вопросу товаров
+  (store/retrieval.py), так что размер промпта не растёт вместе с каталогом.
+- Ответ приходит браузеру по токенам (text/event-stream); воркер ASGI не
+  блокируется, пока модель генерирует ответ.
+- Короткие «частые» вопросы кэшируются в памяти процесса (LRU + TTL) по
+  нормализованному тексту: «Как вернуть товар?» и «как  вернуть товар» — один ключ.
+  В ключ входит версия журнала изменений товаров (retrieval.VERSION_KEY): после
+  изменения каталога ответы, собранные по старым товарам, больше не отдаются.
+- Одновременных запросов одного пользователя (или сессии/IP для гостя) не
+  больше CHAT_MAX_CONCURRENT_PER_USER. Счётчик лежит в CACHES: с REDIS_URL лимит
+  общий для всех воркеров, без него (LocMemCache) — у каждого процесса свой,
+  и пользователь может занять по CHAT_MAX_CONCURRENT_PER_USER мест в каждом
+  воркере. Место держит поток ответа (SSEStream) и отдаёт
+  его, когда поток дочитан, прерван или закрыт Django при разрыве соединения.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import retrieval
+
+logger = logging.getLogger(__name__)
+
+PROMPT = """
+        Ты - помощник сайта маркетплейса. Отвечай только на вопросы, связанные с сайтом, покупками, продажами, правилами и советами по использованию сайта.
+        Не отвечай на посторонние вопросы. Если вопрос не про сайт, скажи "Я могу помочь только с вопросами о сайте."
+
+        Вопрос пользователя: {message}
+
+        Контекст сайта: Это маркетплейс для продажи товаров. Пользователи могут добавлять товары, покупать, использовать корзину, избранное. Правила: не размещать запрещенные товары, быть честным.
+
+        Товары сайта по теме вопроса (других сведений о товарах нет):
+        {products}
+
+        Дай полезный совет или ответ.
+        """
+
+UNAVAILABLE = "Чат временно недоступен. API ключ не настроен."
+ERROR = "Извините, произошла ошибка. Попробуйте позже."
+BUSY = "Дождитесь ответа на предыдущий вопрос."
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+')
+
+
+class AnswerCache:
+    """LRU-кэш ответов с временем жизни записи; живёт в памяти процесса."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        answer, expires = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return answer
+
+    def set(self, key, answer):
+        self._items[key] = (answer, time.monotonic() + self.ttl)
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+answers = AnswerCache(settings.CHAT_CACHE_SIZE, settings.CHAT_CACHE_TTL)
+_client = {'loop': None, 'client': None}
+
+
+def normalize_question(message):
+    """Ключ кэша для вопроса или None, если вопрос не похож на типовой (слишком длинный)."""
+    text = ' '.join(_PUNCTUATION_RE.sub(' ', message.casefold().replace('ё', 'е')).split())
+    if not text or len(text) > settings.CHAT_CACHE_MAX_QUESTION:
+        return None
+    return text
+
+
+def ai_enabled():
+    api_key = os.environ.get('OPENAI_API_KEY')
+    return bool(api_key and api_key != 'your-openai-api-key-here')
+
+
+def _ai_client():
+    # httpx-пул привязан к циклу событий: под ASGI цикл один на воркер, клиент создаётся один раз
+    loop = asyncio.get_running_loop()
+    if _client['loop'] is not loop:
+        import httpx
+        import openai
+        _client['client'] = openai.AsyncOpenAI(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=1,
+            http_client=httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.CHAT_TIMEOUT, connect=5),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            ),
+        )
+        _client['loop'] = loop
+    return _client['client']
+
+
+async def stream_completion(prompt):
+    """Токены ответа модели по мере генерации."""
+    stream = await _ai_client().chat.completions.create(
+        model=settings.CHAT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=settings.CHAT_MAX_TOKENS,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.response.aclose()  # клиент ушёл — не дочитываем ответ модели
+
+
+async def acquire_slot(identity):
+    """Занять место в лимите одновременных запросов; False, если лимит исчерпан."""
+    key = f'chat-active:{identity}'
+    # таймаут подчищает счётчик, если воркер упал, не освободив место
+    await cache.aadd(key, 0, settings.CHAT_TIMEOUT * 2)
+    try:
+        active = await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, settings.CHAT_TIMEOUT * 2)
+        active = 1
+    if active > settings.CHAT_MAX_CONCURRENT_PER_USER:
+        await release_slot(identity)
+        return False
+    return True
+
+
+async def release_slot(identity):
+    try:
+        await cache.adecr(f'chat-active:{identity}')
+    except ValueError:
+        pass
+
+
+def release_slot_sync(identity):
+    try:
+        cache.decr(f'chat-active:{identity}')
+    except ValueError:
+        pass
+
+
+async def answer_tokens(message):
+    """
+    Ответ на вопрос частями: из кэша — одной частью, иначе по токенам модели.
+    Полный ответ на типовой вопрос кладётся в кэш.
+    """
+    text = normalize_question(message)
+    # ответ зависит от товаров в промпте — устаревает с каждым изменением каталога
+    key = (await cache.aget(retrieval.VERSION_KEY, 0), text) if text else None
+    cached = answers.get(key) if key else None
+    if cached is not None:
+        yield cached
+        return
+    if not ai_enabled():
+        yield UNAVAILABLE
+        return
+    products = await sync_to_async(retrieval.product_context)(message)
+    parts = []
+    async for token in stream_completion(PROMPT.format(message=message, products=products or 'нет подходящих')):
+        parts.append(token)
+        yield token
+    if key and parts:
+        answers.set(key, ''.join(parts).strip())
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class SSEStream:
+    """
+    Поток SSE: события token, затем done (или error). Держит место в лимите
+    identity всё время жизни ответа и освобождает его ровно один раз: в конце
+    потока или в close(), которую Django вызывает у ответа и тогда, когда клиент
+    ушёл до начала или посреди передачи (асинхронный генератор в этом случае
+    не доходит до своего finally).
+    """
+
+    def __init__(self, message, identity):
+        self.message = message
+        self.identity = identity
+        self._released = False
+        self._events = self._generate()
+
+    def __aiter__(self):
+        return self._events
+
+    async def _generate(self):
+        try:
+            async for token in answer_tokens(self.message):
+                yield sse('token', {'text': token})
+            yield sse('done', {})
+        except Exception as e:
+            logger.warning(f"Чат: ошибка ответа модели: {e}")
+            yield sse('error', {'text': ERROR})
+        finally:
+            if not self._released:
+                self._released = True
+                await release_slot(self.identity)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            release_slot_sync(self.identity)
@@ -0,0 +1,211 @@
+"""
+Корзина гостя в кэше (Redis; без общего кэша GUEST_CART_STORE = 'db', см. settings).
+
+Пока посетитель не вошёл, его корзина — это словарь в кэше с TTL, а не строки
+Cart/CartItem: боты и «просто смотрящие» не создают мусор в БД и не форсируют
+запись сессии. Корзина узнаётся по подписанной cookie и превращается в Cart
+только при входе (materialize + обычное слияние корзин). Оформление заказа
+из гостевой корзины пишет сразу Order/OrderItem.
+
+Строки CartItem не видят гостевых корзин, поэтому на каждый товар в кэше
+ведётся счётчик гостевых корзин, в которых он лежит (held): по нему вместе
+с CartItem решается, можно ли снова показать товар в каталоге. Счётчик живёт
+столько же, сколько корзина (GUEST_CART_TTL с последнего добавления).
+
+Интерфейс совпадает с моделью Cart (lines, find_item, add_product, remove_item,
+set_quantity, add_deleted_backup, item_count, total_amount), поэтому
+представления работают с обоими видами корзин одинаково.
+"""
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Cart, CartItem, Product
+
+COOKIE_NAME = 'guest_cart'
+COOKIE_SALT = 'store.guest_cart'
+KEY_PREFIX = 'guest-cart:'
+HOLD_PREFIX = 'guest-cart-hold:'
+MATERIALIZED_PREFIX = 'guest:'
+
+
+def enabled():
+    return getattr(settings, 'GUEST_CART_STORE', 'db') == 'cache'
+
+
+def _ttl():
+    return getattr(settings, 'GUEST_CART_TTL', 14 * 24 * 3600)
+
+
+def _hold(product_id, delta):
+    key = HOLD_PREFIX + str(product_id)
+    if delta > 0:
+        if not cache.add(key, delta, _ttl()):
+            try:
+                cache.incr(key, delta)
+                cache.touch(key, _ttl())
+            except ValueError:
+                cache.add(key, delta, _ttl())
+    else:
+        try:
+            cache.decr(key, -delta)
+        except ValueError:
+            pass
+
+
+def held(product_id):
+    """Лежит ли товар в какой-нибудь гостевой корзине."""
+    return (cache.get(HOLD_PREFIX + str(product_id)) or 0) > 0
+
+
+class GuestCartItem:
+    """Позиция гостевой корзины; id совпадает с id товара."""
+
+    def __init__(self, product, quantity, price, is_deleted_backup=False):
+        self.id = self.pk = product.pk
+        self.product = product
+        self.product_id = product.pk
+        self.quantity = quantity
+        self.price = price
+        self.is_deleted_backup = is_deleted_backup
+
+    def subtotal(self):
+        return self.quantity * self.price
+
+
+class GuestCart:
+    is_guest = True
+
+    def __init__(self, request, token=None, data=None):
+        self.request = request
+        self.token = token
+        # {product_id (str): [quantity, price (str), is_deleted_backup]}
+        self.data = data or {}
+
+    @classmethod
+    def for_request(cls, request):
+        token = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT)
+        data = cache.get(KEY_PREFIX + token) if token else None
+        return cls(request, token, data)
+
+    # --- итоги: считаются по словарю в памяти, без запросов к БД ---
+
+    @property
+    def item_count(self):
+        return sum(entry[0] for entry in self.data.values())
+
+    @property
+    def total_amount(self):
+        return sum((entry[0] * Decimal(entry[1]) for entry in self.data.values()), Decimal('0'))
+
+    def total(self):
+        return self.total_amount
+
+    # --- чтение ---
+
+    def lines(self):
+        products = Product.objects.in_bulk([int(pk) for pk in self.data])
+        return [
+            GuestCartItem(products[int(pk)], quantity, Decimal(price), backup)
+            for pk, (quantity, price, backup) in self.data.items()
+            if int(pk) in products
+        ]
+
+    def find_item(self, item_id, backup_only=False):
+        entry = self.data.get(str(item_id))
+        if entry is None or (backup_only and not entry[2]):
+            return None
+        product = Product.objects.filter(pk=item_id).first()
+        if product is None:
+            return None
+        quantity, price, backup = entry
+        return GuestCartItem(product, quantity, Decimal(price), backup)
+
+    # --- изменение ---
+
+    def _save(self):
+        if self.token is None:
+            self.token = secrets.token_urlsafe(16)
+            self.request._guest_cart_token = self.token
+        cache.set(KEY_PREFIX + self.token, self.data, _ttl())
+
+    def add_product(self, product, quantity):
+        entry = self.data.get(str(product.pk))
+        if entry:
+            entry[0] += quantity
+        else:
+            self.data[str(product.pk)] = [quantity, str(product.price), False]
+            _hold(product.pk, 1)
+        self._save()
+
+    def remove_item(self, item):
+        if self.data.pop(str(item.id), None) is not None:
+            _hold(item.id, -1)
+        self._save()
+
+    def set_quantity(self, item, quantity):
+        self.data[str(item.id)][0] = quantity
+        self._save()
+
+    def add_deleted_backup(self, product):
+        entry = self.data.get(str(product.pk))
+        quantity = max(1, entry[0]) if entry else 1
+        self.data[str(product.pk)] = [quantity, str(product.price), True]
+        if not entry:
+            _hold(product.pk, 1)
+        self._save()
+
+    def remove_products(self, product_ids):
+        """Убрать оформленные товары после заказа."""
+        for pk in product_ids:
+            if self.data.pop(str(pk), None) is not None:
+                _hold(pk, -1)
+        self._save()
+
+    def clear(self):
+        if self.token:
+            cache.delete(KEY_PREFIX + self.token)
+            self.request._guest_cart_clear = True
+        for pk in self.data:
+            _hold(pk, -1)  # после materialize товары держат строки CartItem
+        self.data = {}
+
+    # --- переход в БД ---
+
+    def materialize(self):
+        """
+        Записать корзину в Cart/CartItem (одна вставка корзины и один bulk_create)
+        и очистить кэш. Возвращает Cart или None, если корзина пуста.
+        """
+        lines = self.lines()
+        if not lines:
+            self.clear()
+            return None
+        with transaction.atomic():
+            cart = Cart.objects.create(
+                session_key=f'{MATERIALIZED_PREFIX}{self.token}'[:40],
+                item_count=sum(it.quantity for it in lines),
+                total_amount=sum(it.subtotal() for it in lines),
+            )
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=it.product, quantity=it.quantity, price=it.price,
+                         is_deleted_backup=it.is_deleted_backup)
+                for it in lines
+            ])
+        self.clear()
+        return cart
+
+
+def update_cookie(request, response):
+    """Выставить или удалить cookie гостевой корзины (вызывается из GuestCartMiddleware)."""
+    if getattr(request, '_guest_cart_clear', False):
+        response.delete_cookie(COOKIE_NAME)
+    elif getattr(request, '_guest_cart_token', None):
+        response.set_signed_cookie(
+            COOKIE_NAME, request._guest_cart_token, salt=COOKIE_SALT,
+            max_age=_ttl(), httponly=True, samesite='Lax',
+        )
+    return response
@@ -0,0 +1,103 @@
+"""
+Списание остатков при оформлении заказа.
+
+Весь заказ оформляется в одной транзакции: по каждой строке выполняется условный
+UPDATE stock = stock - qty WHERE stock >= qty (строки блокируются в порядке id,
+чтобы параллельные заказы не взаимоблокировались), позиции заказа создаются
+одним bulk_create. Строки, которые не удалось списать, возвращаются как отказы —
+параллельные оформления не могут продать больше, чем есть на складе.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import F
+
+from . import catalog_cache, retrieval
+from .moderation import APPROVED
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+# product — Product (или None, если товар уже удалён), cart_item — CartItem или None
+OrderLine = namedtuple('OrderLine', 'product quantity price cart_item')
+LineFailure = namedtuple('LineFailure', 'line reason')
+
+REASON_DELETED = 'Товар больше не продаётся'
+REASON_OUT_OF_STOCK = 'Недостаточно товара на складе'
+
+
+def _line_name(line):
+    return line.product.name if line.product else ''
+
+
+def _failure_reason(line):
+    # line.product мог устареть (загружен до оформления) — причину берём из текущей строки
+    row = Product.objects.filter(pk=line.product.pk).values('stock', 'is_deleted', 'moderation_status').first()
+    if row is None or row['is_deleted'] or row['moderation_status'] != APPROVED:
+        return REASON_DELETED
+    return f"{REASON_OUT_OF_STOCK} (осталось {row['stock']} шт.)"
+
+
+def lines_from_cart(items):
+    """
+    Строки заказа из позиций корзины (ожидается select_related('product')).
+    Резервные копии удалённых товаров (is_deleted_backup) не покупаются.
+    Позиции гостевой корзины из кэша (GuestCartItem) в БД не хранятся — cart_item для них None.
+    """
+    return [
+        OrderLine(it.product, it.quantity, it.price, it if isinstance(it, CartItem) else None)
+        for it in items if not it.is_deleted_backup
+    ]
+
+
+def place_order(lines, user=None):
+    """
+    Оформить заказ из строк lines. Возвращает (order, failures):
+    order — созданный заказ или None, если не удалось списать ни одной строки;
+    failures — список LineFailure с причиной для каждой не прошедшей строки.
+    """
+    failures = []
+    reserved = []
+    with transaction.atomic():
+        for line in sorted(lines, key=lambda l: l.product.pk if l.product else 0):
+            if line.product is None or line.quantity < 1:
+                failures.append(LineFailure(line, REASON_DELETED))
+                continue
+            # товары на модерации и отклонённые не продаются
+            updated = Product.objects.filter(
+                pk=line.product.pk, is_deleted=False, moderation_status=APPROVED, stock__gte=line.quantity,
+            ).update(stock=F('stock') - line.quantity)
+            if updated:
+                reserved.append(line)
+            else:
+                failures.append(LineFailure(line, _failure_reason(line)))
+        if not reserved:
+            return None, failures
+
+        order = Order.objects.create(
+            user=user,
+            total_amount=sum(line.price * line.quantity for line in reserved),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=line.product, name=_line_name(line), price=line.price, quantity=line.quantity)
+            for line in reserved
+        ])
+        # оформленные позиции уходят из корзины вместе с заказом
+        cart_items = [line.cart_item for line in reserved if line.cart_item is not None]
+        if cart_items:
+            CartItem.objects.filter(pk__in=[it.pk for it in cart_items]).delete()
+            for cart_id in {it.cart_id for it in cart_items}:
+                removed = [it for it in cart_items if it.cart_id == cart_id]
+                Cart(pk=cart_id).add_to_totals(
+                    -sum(it.quantity for it in removed), -sum(it.subtotal() for it in removed),
+                )
+        # закончившиеся товары скрываем из каталога, остальные одобренные снова показываем
+        product_ids = [line.product.pk for line in reserved]
+        sold_out = Product.objects.filter(pk__in=product_ids, stock=0, is_published=True)
+        back = Product.objects.filter(pk__in=product_ids, stock__gt=0, moderation_status=APPROVED, is_published=False)
+        changed = [*sold_out.values_list('pk', flat=True), *back.values_list('pk', flat=True)]
+        sold_out.update(is_published=False)
+        back.update(is_published=True)
+        # update() не вызывает сигналы — сбрасываем кэш каталога и индекс чата сами
+        transaction.on_commit(catalog_cache.invalidate)
+        for pk in changed:
+            retrieval.product_changed(pk)
+    return order, failures
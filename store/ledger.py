@@ -0,0 +1,104 @@
+"""
+Журнал проводок продавцов (SellerLedgerEntry).
+
+Когда заказ становится оплаченным (rollups.SOLD_STATUSES), по каждому продавцу
+заказа пишется одна проводка «продажа»: выручка его позиций, комиссия площадки
+(SELLER_COMMISSION_PERCENTAGE) и сумма к выплате. Отмена или удаление заказа
+пишет сторно — точное отрицание уже проведённых сумм, поэтому смена ставки
+комиссии не ломает баланс. Доход продавца за период — один агрегат по индексу
+(seller, created_at).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import DecimalField, F, Sum
+
+from .models import Order, OrderItem, SellerLedgerEntry
+from .rollups import SOLD_STATUSES
+
+_MONEY = DecimalField(max_digits=12, decimal_places=2)
+_CENT = Decimal('0.01')
+
+
+def _commission(gross):
+    rate = Decimal(str(settings.SELLER_COMMISSION_PERCENTAGE))
+    return (gross * rate / 100).quantize(_CENT)
+
+
+def _sale_entries(items):
+    """Проводки «продажа» по позициям items: одна на пару (заказ, продавец)."""
+    rows = (
+        items.filter(product__owner__isnull=False).order_by()
+        .values('order_id', 'product__owner_id')
+        .annotate(items_sold=Sum('quantity'), gross=Sum(F('price') * F('quantity'), output_field=_MONEY))
+    )
+    entries = []
+    for row in rows:
+        commission = _commission(row['gross'])
+        entries.append(SellerLedgerEntry(
+            seller_id=row['product__owner_id'], order_id=row['order_id'], kind='sale',
+            items_sold=row['items_sold'], gross=row['gross'], commission=commission,
+            net=row['gross'] - commission,
+        ))
+    return entries
+
+
+def record_order(order):
+    """Провести оплаченный заказ: один агрегирующий SELECT и один INSERT."""
+    SellerLedgerEntry.objects.bulk_create(_sale_entries(OrderItem.objects.filter(order=order)))
+
+
+def reverse_order(order):
+    """Сторнировать всё, что проведено по заказу и ещё не сторнировано."""
+    balances = (
+        SellerLedgerEntry.objects.filter(order=order).order_by().values('seller_id')
+        .annotate(orders=Sum('orders'), items_sold=Sum('items_sold'),
+                  gross=Sum('gross'), commission=Sum('commission'), net=Sum('net'))
+        .filter(orders__gt=0)
+    )
+    SellerLedgerEntry.objects.bulk_create([
+        SellerLedgerEntry(
+            seller_id=row['seller_id'], order=order, kind='reversal', orders=-row['orders'],
+            items_sold=-row['items_sold'], gross=-row['gross'], commission=-row['commission'], net=-row['net'],
+        )
+        for row in balances
+    ])
+
+
+def earnings(seller, start=None, end=None):
+    """Доход продавца за [start, end) (datetime, любая граница может быть None)."""
+    entries = SellerLedgerEntry.objects.filter(seller=seller)
+    if start is not None:
+        entries = entries.filter(created_at__gte=start)
+    if end is not None:
+        entries = entries.filter(created_at__lt=end)
+    totals = entries.aggregate(
+        gross=Sum('gross'), commission=Sum('commission'), net=Sum('net'), orders=Sum('orders'),
+    )
+    return {
+        'gross_earnings': totals['gross'] or Decimal('0'),
+        'commission': totals['commission'] or Decimal('0'),
+        'net_earnings': totals['net'] or Decimal('0'),
+        'orders_count': totals['orders'] or 0,
+    }
+
+
+def backfill(batch_size=1000):
+    """
+    Провести оплаченные заказы, по которым ещё нет проводок (история до появления
+    журнала). Заказы берутся порциями по id. Возвращает число созданных проводок.
+    """
+    orders = (
+        Order.objects.filter(status__in=SOLD_STATUSES, ledger_entries__isnull=True)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    created = 0
+    last_pk = 0
+    while True:
+        ids = list(orders.filter(pk__gt=last_pk)[:batch_size])
+        if not ids:
+            return created
+        created += len(SellerLedgerEntry.objects.bulk_create(
+            _sale_entries(OrderItem.objects.filter(order_id__in=ids))
+        ))
+        last_pk = ids[-1]
@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from store.models import Order
+from store.rollups import SOLD_STATUSES, date_batches, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollup (DailySales / DailySalesRollup) from orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First date (YYYY-MM-DD), default: first sold order')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date (YYYY-MM-DD), default: today')
+        parser.add_argument('--batch-days', type=int, default=31, help='Days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            first = Order.objects.filter(status__in=SOLD_STATUSES).aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write(self.style.WARNING('No sold orders, nothing to backfill'))
+                return
+            start = timezone.localtime(first).date()
+        if start > end:
+            raise CommandError('--start is after --end')
+        total = 0
+        for batch_start, batch_end in date_batches(start, end, options['batch_days']):
+            days = rebuild(batch_start, batch_end)
+            total += days
+            self.stdout.write(f'{batch_start} .. {batch_end}: {days} days with sales')
+        self.stdout.write(self.style.SUCCESS(f'Rollup rebuilt for {start} .. {end}: {total} days with sales'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.ledger import backfill
+
+
+class Command(BaseCommand):
+    help = 'Write seller ledger entries for paid orders that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders processed per batch')
+
+    def handle(self, *args, **options):
+        created = backfill(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Created {created} ledger entries'))
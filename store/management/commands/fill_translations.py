@@ -1,33 +1,25 @@
 from django.core.management.base import BaseCommand
+from store import translation_memory
 from store.models import Product
+from store.translation import Translator, fill_from_source, translate_products
 
 class Command(BaseCommand):
     help = 'Fill empty translation fields for products using original text (name, description)'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--use-memory', action='store_true',
+                            help='Fill from the translation memory first; copy the original text only where it has none')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows each field would fill')
+        parser.add_argument('--chunk-size', type=int, default=0,
+                            help='Update in primary-key ranges of this size (0 = one UPDATE per field)')
+
     def handle(self, *args, **options):
-        products = Product.objects.all()
-        updated = 0
-        for p in products:
-            changed = False
-            if not p.name_ru:
-                p.name_ru = p.name
-                changed = True
-            if not p.name_kg:
-                p.name_kg = p.name
-                changed = True
-            if not getattr(p, 'name_en', None):
-                p.name_en = p.name
-                changed = True
-            if not getattr(p, 'description_ru', None):
-                p.description_ru = p.description
-                changed = True
-            if not getattr(p, 'description_kg', None):
-                p.description_kg = p.description
-                changed = True
-            if not getattr(p, 'description_en', None):
-                p.description_en = p.description
-                changed = True
-            if changed:
-                p.save()
-                updated += 1
-        self.stdout.write(self.style.SUCCESS(f'Updated translations for {updated} products'))
\ No newline at end of file
+        if options['use_memory'] and not options['dry_run']:
+            stats = translate_products(Product.objects.all(), Translator(offline=True))
+            self.stdout.write(f"Filled {stats['updated']} products from translation memory "
+                              f"({stats['memory_hits']} texts, hit rate {translation_memory.hit_rate():.0%})")
+        counts = fill_from_source(dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+        for field, count in counts.items():
+            self.stdout.write(f'{field}: {count}')
+        verb = 'Would fill' if options['dry_run'] else 'Filled'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(counts.values())} empty translation fields'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from store import thumbnails
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive WebP/JPEG thumbnails for product images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Process every product with an image, including ones that failed before '
+                                 '(existing files are reused, not re-encoded)')
+        parser.add_argument('--async', action='store_true', dest='use_async',
+                            help='Queue a Celery task per product instead of generating in this process')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many products')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            products = products.filter(thumbnail_key='')
+        pks = products.order_by('pk').values_list('pk', flat=True)
+        if options['limit']:
+            pks = pks[:options['limit']]
+
+        done = failed = 0
+        for pk in pks.iterator(chunk_size=1000):
+            if options['use_async']:
+                from store.tasks import generate_thumbnails
+                generate_thumbnails.delay(pk)
+                done += 1
+            elif thumbnails.generate(pk):
+                done += 1
+            else:
+                failed += 1
+            if (done + failed) % 100 == 0:
+                self.stdout.write(f'{done + failed} products processed')
+        action = 'queued' if options['use_async'] else 'processed'
+        self.stdout.write(self.style.SUCCESS(f'{done} products {action}, {failed} failed'))
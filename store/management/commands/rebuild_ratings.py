@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.ratings import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recount Product.rating_avg/rating_count from approved reviews (after bulk updates that bypass signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=0,
+                            help='Update products in primary-key ranges of this size (default: one UPDATE)')
+
+    def handle(self, *args, **options):
+        chunk = options['chunk_size']
+        if not chunk:
+            updated = rebuild()
+        else:
+            updated = 0
+            last = Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            for low in range(0, last + 1, chunk):
+                updated += rebuild(Product.objects.filter(pk__gte=low, pk__lt=low + chunk))
+        self.stdout.write(self.style.SUCCESS(f'Ratings recounted for {updated} products'))
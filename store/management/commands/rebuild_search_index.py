@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from store.search import is_indexed_backend, rebuild_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index (PostgreSQL tsvector / SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Products loaded per batch')
+
+    def handle(self, *args, **options):
+        if not is_indexed_backend():
+            self.stdout.write(self.style.WARNING('Database has no full-text index support, search uses icontains fallback'))
+            return
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
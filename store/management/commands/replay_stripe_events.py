@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import StripeEvent
+from store.stripe_events import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Re-process logged Stripe webhook events (status transitions are idempotent)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', help='Stripe event ids (evt_...) to replay')
+        parser.add_argument('--since', type=date.fromisoformat, help='Replay every event received since YYYY-MM-DD')
+        parser.add_argument('--pending', action='store_true', help='Process events that are not processed yet')
+
+    def handle(self, *args, **options):
+        events = StripeEvent.objects.all()
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+        elif options['since']:
+            events = events.filter(received_at__date__gte=options['since'])
+        elif options['pending']:
+            events = events.filter(processed_at__isnull=True)
+        else:
+            raise CommandError('Pass event ids, --since or --pending')
+
+        refs = sorted(set(events.values_list('object_ref', flat=True)))
+        reset = events.exclude(processed_at__isnull=True).update(processed_at=None)
+        processed = sum(process_pending(ref) for ref in refs)
+        left = StripeEvent.objects.filter(object_ref__in=refs, processed_at__isnull=True).count()
+        self.stdout.write(f'Reset {reset} processed events, {len(refs)} payment objects')
+        style = self.style.SUCCESS if not left else self.style.WARNING
+        self.stdout.write(style(f'Processed {processed} events, {left} failed (see StripeEvent.last_error)'))
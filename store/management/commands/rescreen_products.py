@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.moderation import rescreen
+
+
+class Command(BaseCommand):
+    help = 'Re-check the catalog against the current forbidden-term list in one streaming pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true',
+                            help='Unpublish and reject matching products (default: report only)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows fetched and updated per batch')
+
+    def handle(self, *args, **options):
+        def report(pk, name, reason):
+            self.stdout.write(f'#{pk} {name}: {reason}')
+
+        stats = rescreen(
+            Product.objects.filter(is_deleted=False),
+            apply=options['apply'], batch_size=options['batch_size'], progress=report,
+        )
+        action = 'rejected' if options['apply'] else 'would be rejected'
+        self.stdout.write(self.style.SUCCESS(f"Checked {stats['checked']} products, {stats['rejected']} {action}"))
@@ -1,49 +1,52 @@
 from django.core.management.base import BaseCommand
+from store import translation_memory
 from store.models import Product
-from store.utils.translate import translate_text
+from store.translation import LANGS, Translator, fill_from_source, translate_products
+
 
 class Command(BaseCommand):
     help = 'Autotranslate product names and descriptions using LibreTranslate (fills only empty fields by default)'
 
     def add_arguments(self, parser):
         parser.add_argument('--provider', default='libre', help='Translation provider (default: libre)')
-        parser.add_argument('--langs', default='ru,kg,en', help='Comma-separated target languages: ru,kg,en')
+        parser.add_argument('--langs', default=','.join(LANGS), help='Comma-separated target languages: ru,kg,en')
         parser.add_argument('--overwrite', action='store_true', help='Overwrite existing translations')
         parser.add_argument('--limit', type=int, default=0, help='Limit number of products to process (0 = no limit)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent requests to the provider')
+        parser.add_argument('--batch-size', type=int, default=50, help='Texts sent in one provider request')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Products loaded and saved per chunk')
+        parser.add_argument('--fallback-copy', action='store_true',
+                            help='Afterwards, copy the original text into fields that are still empty')
+        parser.add_argument('--fill-chunk-size', type=int, default=0,
+                            help='Primary-key range per UPDATE for --fallback-copy (0 = one UPDATE per field)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count empty fields per language; nothing is translated or written')
 
     def handle(self, *args, **options):
-        provider = options['provider']
         langs = [l.strip() for l in options['langs'].split(',') if l.strip()]
-        overwrite = options['overwrite']
-        limit = options['limit']
+        if options['dry_run']:
+            counts = fill_from_source(langs=langs, dry_run=True)
+            for field, count in counts.items():
+                self.stdout.write(f'{field}: {count} empty')
+            return
+        translator = Translator(provider=options['provider'], workers=options['workers'],
+                                batch_size=options['batch_size'])
+
+        def report(stats):
+            self.stdout.write(
+                f"Products {stats['products']} (id <= {stats['last_pk']}), updated {stats['updated']}, "
+                f"translated {stats['translated']}, from memory {stats['memory_hits']}, "
+                f"failed {stats['failed']}, requests {stats['requests']}, {stats['seconds']:.1f}s"
+            )
 
-        qs = Product.objects.all().order_by('id')
-        if limit > 0:
-            qs = qs[:limit]
-        total = 0
-        updated = 0
-        for p in qs:
-            total += 1
-            changed = False
-            for lang in langs:
-                name_field = f'name_{lang}'
-                desc_field = f'description_{lang}'
-                # name
-                cur_name = getattr(p, name_field, None)
-                if overwrite or not cur_name:
-                    tr = translate_text(p.name, target_lang=lang, provider=provider)
-                    if tr:
-                        setattr(p, name_field, tr)
-                        changed = True
-                # description
-                cur_desc = getattr(p, desc_field, None)
-                if overwrite or not cur_desc:
-                    trd = translate_text(p.description or '', target_lang=lang, provider=provider)
-                    if trd:
-                        setattr(p, desc_field, trd)
-                        changed = True
-            if changed:
-                p.save()
-                updated += 1
-                self.stdout.write(self.style.SUCCESS(f'Updated product #{p.pk}'))
-        self.stdout.write(self.style.SUCCESS(f'Processed {total} products — updated {updated}'))
\ No newline at end of file
+        stats = translate_products(
+            Product.objects.all(), translator, langs=langs, overwrite=options['overwrite'],
+            chunk_size=options['chunk_size'], limit=options['limit'], progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {stats['products']} products — updated {stats['updated']}"))
+        if options['fallback_copy']:
+            # только обработанные товары: при --limit остальные ждут следующего запуска
+            counts = fill_from_source(Product.objects.filter(pk__lte=stats['last_pk']), langs=langs,
+                                      chunk_size=options['fill_chunk_size'])
+            self.stdout.write(f'Copied original text into {sum(counts.values())} untranslated fields')
+        self.stdout.write(f"Translation memory hit rate: {translation_memory.hit_rate():.0%} {translation_memory.metrics}")
@@ -0,0 +1,61 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from store import translation_memory
+from store.models import TranslationMemory
+
+
+class Command(BaseCommand):
+    help = 'Translation memory: hit-rate stats, export to / import from JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['stats', 'export', 'import'])
+        parser.add_argument('path', nargs='?', default='-', help="JSON Lines file for export/import ('-' = stdout/stdin)")
+        parser.add_argument('--target', help='Export only this target language')
+        parser.add_argument('--provider', help='Export only this provider')
+        parser.add_argument('--overwrite', action='store_true', help='On import, replace existing translations')
+        parser.add_argument('--reset-metrics', action='store_true', help='With stats: reset the shared counters')
+
+    def handle(self, *args, **options):
+        getattr(self, f"do_{options['action']}")(options)
+
+    def do_stats(self, options):
+        for row in TranslationMemory.objects.values('provider', 'target_lang').annotate(n=Count('id')).order_by('provider', 'target_lang'):
+            self.stdout.write(f"{row['provider']} → {row['target_lang']}: {row['n']} entries")
+        counters = translation_memory.shared_metrics()
+        self.stdout.write(
+            f"Lookups: {counters['lru_hits']} LRU hits, {counters['db_hits']} DB hits, {counters['misses']} misses, "
+            f"{counters['stored']} stored; hit rate {translation_memory.hit_rate(counters):.1%}"
+        )
+        if options['reset_metrics']:
+            translation_memory.reset_metrics()
+
+    def do_export(self, options):
+        queryset = TranslationMemory.objects.all()
+        if options['target']:
+            queryset = queryset.filter(target_lang=options['target'])
+        if options['provider']:
+            queryset = queryset.filter(provider=options['provider'])
+        out = self.stdout if options['path'] == '-' else open(options['path'], 'w', encoding='utf-8')
+        count = 0
+        try:
+            for line in translation_memory.export_lines(queryset):
+                out.write(line + '\n')
+                count += 1
+        finally:
+            if out is not self.stdout:
+                out.close()
+        self.stderr.write(f'Exported {count} entries')
+
+    def do_import(self, options):
+        source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        try:
+            count = translation_memory.import_lines(source, overwrite=options['overwrite'])
+        except (KeyError, ValueError) as e:
+            raise CommandError(f'Invalid translation memory file: {e}')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        self.stdout.write(self.style.SUCCESS(f'Imported {count} entries'))
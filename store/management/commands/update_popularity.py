@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store import popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute product popularity for products with new events (same as the periodic task)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every product with events in the decay window, ignoring the change log')
+
+    def handle(self, *args, **options):
+        stats = popularity.update(full=options['full'])
+        if stats is None:
+            self.stdout.write(self.style.WARNING('Another process is updating popularity, try again later'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Popularity updated for {stats['products']} products ({stats['views']} views, "
+            f"full: {stats['full']}) in {stats['seconds']:.1f}s"
+        ))
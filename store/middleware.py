@@ -0,0 +1,12 @@
+from . import guest_cart
+
+
+class GuestCartMiddleware:
+    """Выставляет/удаляет подписанную cookie гостевой корзины (см. store.guest_cart)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return guest_cart.update_cookie(request, response)
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+NAME_SQL = " || ' ' || ".join(f"COALESCE({f}, '')" for f in ('name', 'name_ru', 'name_kg', 'name_en'))
+DESCRIPTION_SQL = " || ' ' || ".join(
+    f"COALESCE({f}, '')" for f in ('description', 'description_ru', 'description_kg', 'description_en')
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+            "USING fts5(names, descriptions, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO store_product_fts (rowid, names, descriptions) "
+            f"SELECT id, {NAME_SQL}, {DESCRIPTION_SQL} FROM store_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS store_product_search ("
+            "product_id bigint PRIMARY KEY REFERENCES store_product(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS store_product_search_document_gin "
+            "ON store_product_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            f"INSERT INTO store_product_search (product_id, document) "
+            f"SELECT id, setweight(to_tsvector('simple', {NAME_SQL}), 'A') || "
+            f"setweight(to_tsvector('simple', {DESCRIPTION_SQL}), 'B') FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_alter_assistantphrase_id_alter_cart_id_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+    per_cart = CartItem.objects.filter(cart=OuterRef('pk')).values('cart')
+    Cart.objects.update(
+        item_count=Coalesce(Subquery(per_cart.annotate(s=Sum('quantity')).values('s')), 0),
+        total_amount=Coalesce(
+            Subquery(per_cart.annotate(
+                s=Sum(F('quantity') * F('price'), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+            ).values('s')),
+            Decimal('0'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
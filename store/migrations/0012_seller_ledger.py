@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0011_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Продажа'), ('reversal', 'Сторно')], max_length=10)),
+                ('orders', models.SmallIntegerField(default=1)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('commission', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='store.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'created_at'], name='ledger_seller_created_idx')],
+            },
+        ),
+    ]
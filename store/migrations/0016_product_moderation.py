@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_payment_stripe_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='moderation_status',
+            field=models.CharField(choices=[('approved', 'Одобрен'), ('pending', 'На модерации'), ('rejected', 'Отклонён')], db_index=True, default='approved', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='moderation_reason',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='ModerationVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('ruleset', models.PositiveIntegerField()),
+                ('allowed', models.BooleanField()),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('source', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+# Прежний зашитый в код список и его русские и кыргызские соответствия
+INITIAL_TERMS = [
+    ('beer', 'en'), ('alcohol*', 'en'), ('vodka', 'en'), ('wine', 'en'), ('weapon*', 'en'),
+    ('gun', 'en'), ('guns', 'en'), ('drug', 'en'), ('drugs', 'en'), ('narcotic*', 'en'),
+    ('fake', 'en'), ('counterfeit*', 'en'),
+    ('пиво', 'ru'), ('алкогол*', 'ru'), ('водк*', 'ru'), ('вино', 'ru'), ('сигарет*', 'ru'),
+    ('оружи*', 'ru'), ('пистолет*', 'ru'), ('наркот*', 'ru'), ('подделк*', 'ru'), ('контрафакт*', 'ru'),
+    ('арак', 'kg'), ('курал*', 'kg'), ('тапанча*', 'kg'), ('баңгизат*', 'kg'),
+    ('жасалма', 'kg'),
+]
+
+
+def seed_terms(apps, schema_editor):
+    ForbiddenTerm = apps.get_model('store', 'ForbiddenTerm')
+    ForbiddenTerm.objects.bulk_create(
+        [ForbiddenTerm(term=term, language=language) for term, language in INITIAL_TERMS],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_product_moderation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForbiddenTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, unique=True)),
+                ('language', models.CharField(choices=[('ru', 'Русский'), ('kg', 'Кыргызча'), ('en', 'English')], max_length=2)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(seed_terms, migrations.RunPython.noop),
+    ]
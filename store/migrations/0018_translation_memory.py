@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_forbidden_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('source_lang', models.CharField(default='auto', max_length=8)),
+                ('target_lang', models.CharField(max_length=8)),
+                ('provider', models.CharField(max_length=20)),
+                ('source_text', models.TextField()),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source_hash', 'source_lang', 'target_lang', 'provider'), name='translation_memory_unique')],
+            },
+        ),
+    ]
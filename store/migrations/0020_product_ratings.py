@@ -0,0 +1,54 @@
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+
+def fill_ratings(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    reviews = Review.objects.filter(product=OuterRef('pk'), approved=True).order_by().values('product')
+    Product.objects.update(
+        rating_count=Coalesce(Subquery(reviews.annotate(n=Count('pk')).values('n')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+        rating_avg=Coalesce(Subquery(reviews.annotate(avg=Round(Avg('rating'), 2)).values('avg')), 0.0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_product_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                condition=models.Q(('is_deleted', False), ('is_published', True)),
+                fields=['-rating_avg', '-rating_count', '-id'], name='product_rating_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(
+                condition=models.Q(('approved', True)),
+                fields=['product', '-created_at', '-id'], name='review_product_approved_idx',
+            ),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
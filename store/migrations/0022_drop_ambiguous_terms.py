@@ -0,0 +1,20 @@
+from django.db import migrations
+
+# Кыргызские термины, которые по-русски — обычные слова («сыра» — «пиво» и «сыра» от «сыр»)
+AMBIGUOUS_TERMS = ['сыра']
+
+
+def drop_terms(apps, schema_editor):
+    ForbiddenTerm = apps.get_model('store', 'ForbiddenTerm')
+    ForbiddenTerm.objects.filter(term__in=AMBIGUOUS_TERMS).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_product_popularity'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def merge_duplicate_buckets(apps, schema_editor):
+    # параллельные первые заказы дня могли создать несколько строк одного разреза
+    DailySalesRollup = apps.get_model('store', 'DailySalesRollup')
+    duplicates = (
+        DailySalesRollup.objects.values('date', 'category_id', 'seller_id')
+        .annotate(rows=models.Count('pk')).filter(rows__gt=1).order_by()
+    )
+    for key in duplicates:
+        del key['rows']
+        rows = DailySalesRollup.objects.filter(**key)
+        totals = rows.aggregate(orders_count=Sum('orders_count'), items_sold=Sum('items_sold'), revenue=Sum('revenue'))
+        keep = rows.order_by('pk').first()
+        rows.exclude(pk=keep.pk).delete()
+        DailySalesRollup.objects.filter(pk=keep.pk).update(**totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_drop_ambiguous_terms'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(
+                F('date'),
+                Coalesce('category', Value(0), output_field=models.BigIntegerField()),
+                Coalesce('seller', Value(0), output_field=models.BigIntegerField()),
+                name='rollup_bucket_uniq',
+            ),
+        ),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.conf import settings
+from django.utils import timezone
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -7,6 +12,35 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+MODERATION_CHOICES = (
+    ('approved', 'Одобрен'),
+    ('pending', 'На модерации'),
+    ('rejected', 'Отклонён'),
+)
+
+LANGUAGES = ('ru', 'kg', 'en')
+DEFAULT_LANGUAGE = 'ru'
+
+
+class ProductQuerySet(models.QuerySet):
+    def localized(self, language, description=True):
+        """
+        Аннотировать display_name (и display_description, если description=True)
+        на языке language: пустой перевод заменяется исходным текстом прямо в SQL.
+        Столбцы переводов и исходное описание не загружаются — шаблонам хватает аннотаций.
+        """
+        if language not in LANGUAGES:
+            language = DEFAULT_LANGUAGE
+        annotations = {'display_name': Coalesce(NullIf(F(f'name_{language}'), Value('')), F('name'))}
+        if description:
+            annotations['display_description'] = Coalesce(
+                NullIf(F(f'description_{language}'), Value(''), output_field=models.TextField()), F('description'),
+                output_field=models.TextField(),
+            )
+        deferred = [f'{field}_{lang}' for field in ('name', 'description') for lang in LANGUAGES]
+        return self.annotate(**annotations).defer('description', *deferred)
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
@@ -21,10 +55,46 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # уменьшенные копии image (store/thumbnails.py): хэш содержимого и готовые ширины через запятую
+    thumbnail_key = models.CharField(max_length=64, blank=True, editable=False)
+    thumbnail_widths = models.CharField(max_length=100, blank=True, editable=False)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='products', null=True, blank=True, on_delete=models.SET_NULL)
     is_published = models.BooleanField(default=False, db_index=True)
     is_deleted = models.BooleanField(default=False, db_index=True)
+    # pending — ждёт вердикта AI-модерации (store/moderation.py), в каталоге не показывается
+    moderation_status = models.CharField(max_length=10, choices=MODERATION_CHOICES, default='approved', db_index=True)
+    moderation_reason = models.CharField(max_length=255, blank=True)
+    # одобренные отзывы: число, сумма оценок и средняя; ведёт store/ratings.py
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    # популярность с затуханием по времени (store/popularity.py); view_score — её доля от просмотров
+    popularity = models.FloatField(default=0, editable=False)
+    view_score = models.FloatField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset-пагинация каталога по (created_at, id), см. store/pagination.py
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], name='product_catalog_idx',
+                condition=Q(is_published=True, is_deleted=False),
+            ),
+            # каталог по рейтингу (?sort=rating)
+            models.Index(
+                fields=['-rating_avg', '-rating_count', '-id'], name='product_rating_idx',
+                condition=Q(is_published=True, is_deleted=False),
+            ),
+            # главная и каталог по популярности (?sort=popular)
+            models.Index(
+                fields=['-popularity', '-id'], name='product_popularity_idx',
+                condition=Q(is_published=True, is_deleted=False),
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -40,14 +110,99 @@ class AssistantPhrase(models.Model):
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE, related_name='carts')
     session_key = models.CharField(max_length=40, blank=True, null=True, db_index=True)
+    # Денормализованные итоги: меняются вместе с позициями через add_to_totals()
+    item_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # порционная очистка старых корзин, см. store/carts.py:purge_old_carts
+            models.Index(fields=['created_at'], name='cart_created_idx'),
+            # поиск корзины пользователя/сессии в _get_cart и при слиянии после входа
+            models.Index(fields=['user', 'session_key'], name='cart_user_session_idx'),
+        ]
+
     def __str__(self):
         return f"Cart #{self.pk} for {self.user or self.session_key}"
 
     def total(self):
-        items = self.items.all()
-        return sum([it.quantity * it.price for it in items])
+        return self.total_amount
+
+    def add_to_totals(self, quantity, amount):
+        """Атомарно сдвинуть сохранённые итоги на (quantity, amount) — F-выражения, без гонок."""
+        if not quantity and not amount:
+            return
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=F('item_count') + quantity,
+            total_amount=F('total_amount') + amount,
+        )
+        self.item_count += quantity
+        self.total_amount += amount
+
+    def lines(self):
+        return list(self.items.select_related('product'))
+
+    def find_item(self, item_id, backup_only=False):
+        items = self.items.filter(pk=item_id)
+        if backup_only:
+            items = items.filter(is_deleted_backup=True)
+        return items.select_related('product').first()
+
+    def add_product(self, product, quantity):
+        # either update existing CartItem or create new
+        item = self.items.filter(product=product).first()
+        with transaction.atomic():
+            if item:
+                CartItem.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantity)
+                self.add_to_totals(quantity, quantity * item.price)
+            else:
+                CartItem.objects.create(cart=self, product=product, quantity=quantity, price=product.price)
+                self.add_to_totals(quantity, quantity * product.price)
+
+    def remove_item(self, item):
+        with transaction.atomic():
+            item.delete()
+            self.add_to_totals(-item.quantity, -item.subtotal())
+
+    def set_quantity(self, item, quantity):
+        delta = quantity - item.quantity
+        with transaction.atomic():
+            item.quantity = quantity
+            item.save(update_fields=['quantity'])
+            self.add_to_totals(delta, delta * item.price)
+
+    def add_deleted_backup(self, product):
+        # add to cart as a deleted-backup item (quantity 1)
+        item = self.items.filter(product=product).first()
+        with transaction.atomic():
+            if item:
+                old_quantity, old_subtotal = item.quantity, item.subtotal()
+                item.is_deleted_backup = True
+                item.quantity = max(1, item.quantity)
+                item.price = product.price
+                item.save()
+                self.add_to_totals(item.quantity - old_quantity, item.subtotal() - old_subtotal)
+            else:
+                CartItem.objects.create(cart=self, product=product, quantity=1, price=product.price, is_deleted_backup=True)
+                self.add_to_totals(1, product.price)
+
+    def aggregate_totals(self):
+        """Итоги, посчитанные в БД по позициям: (количество, сумма)."""
+        totals = self.items.aggregate(
+            count=Coalesce(Sum('quantity'), 0),
+            amount=Coalesce(Sum(F('quantity') * F('price'), output_field=models.DecimalField()), Decimal('0')),
+        )
+        return totals['count'], totals['amount']
+
+    def recalculate_totals(self):
+        """Сверить сохранённые итоги с агрегатом по позициям и исправить. Возвращает True, если было расхождение."""
+        count, amount = self.aggregate_totals()
+        if (count, amount) == (self.item_count, self.total_amount):
+            return False
+        Cart.objects.filter(pk=self.pk).update(item_count=count, total_amount=amount)
+        self.item_count, self.total_amount = count, amount
+        return True
 
 
 class CartItem(models.Model):
@@ -87,6 +242,15 @@ class Review(models.Model):
     approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # страница отзывов товара: keyset по (created_at, id) среди одобренных
+            models.Index(
+                fields=['product', '-created_at', '-id'], name='review_product_approved_idx',
+                condition=Q(approved=True),
+            ),
+        ]
+
     def __str__(self):
         return f"Review {self.product.name} by {self.user or 'anon'}"
 
@@ -134,3 +298,173 @@ class OrderItem(models.Model):
 
     def subtotal(self):
         return self.price * self.quantity
+
+
+class DailySales(models.Model):
+    """Итоги продаж за день (оплаченные заказы), ведутся store/rollups.py."""
+    date = models.DateField(unique=True)
+    orders_count = models.PositiveIntegerField(default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.orders_count} заказов, {self.revenue}"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Продажи за день в разрезе категории и продавца. Строки только суммируются,
+    поэтому отчёт за любой период — выборка по индексу date и один агрегат.
+    """
+    date = models.DateField()
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    orders_count = models.PositiveIntegerField(default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'category', 'seller'], name='rollup_date_idx'),
+            models.Index(fields=['seller', 'date'], name='rollup_seller_date_idx'),
+        ]
+        constraints = [
+            # одна строка на (день, категория, продавец), включая NULL — на неё опирается вставка без конфликта в rollups._add
+            models.UniqueConstraint(
+                F('date'),
+                Coalesce('category', Value(0), output_field=models.BigIntegerField()),
+                Coalesce('seller', Value(0), output_field=models.BigIntegerField()),
+                name='rollup_bucket_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} / {self.category_id} / {self.seller_id}: {self.revenue}"
+
+
+class SellerLedgerEntry(models.Model):
+    """
+    Проводка продавца по заказу: продажа (+) при оплате, сторно (−) при отмене.
+    Записи только добавляются; доход — сумма проводок, см. store/ledger.py.
+    """
+    KIND_CHOICES = (
+        ('sale', 'Продажа'),
+        ('reversal', 'Сторно'),
+    )
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ledger_entries')
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='ledger_entries')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    orders = models.SmallIntegerField(default=1)  # +1 продажа, −1 сторно: Sum даёт число заказов
+    items_sold = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=12, decimal_places=2)
+    commission = models.DecimalField(max_digits=12, decimal_places=2)
+    net = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', 'created_at'], name='ledger_seller_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.order_id} → {self.seller}: {self.net}"
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди отправки (store/outbox.py). idempotency_key не даёт поставить одно письмо дважды."""
+    STATUS_CHOICES = (
+        ('pending', 'Ожидает'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    )
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    to = models.TextField()  # адреса через запятую
+    from_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # выборка очередной порции: pending с наступившим next_attempt_at
+            models.Index(fields=['next_attempt_at'], name='outbox_due_idx', condition=Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.idempotency_key} → {self.to} ({self.status})"
+
+
+class SellerNotification(models.Model):
+    """Заказ, о котором продавцу ещё нужно написать; письма собираются в дайджест (send_seller_digest)."""
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='order_notifications')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='seller_notifications')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'order'], name='seller_notification_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['seller'], name='seller_notification_due_idx', condition=Q(sent_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"#{self.order_id} → {self.seller}"
+
+
+
+class ModerationVerdict(models.Model):
+    """Вердикт модерации для текста товара; ключ — хэш нормализованного текста и версии правил."""
+    content_hash = models.CharField(max_length=64, unique=True)
+    ruleset = models.PositiveIntegerField()
+    allowed = models.BooleanField()
+    reason = models.CharField(max_length=255, blank=True)
+    source = models.CharField(max_length=10)  # rules | ai
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]}: {'ok' if self.allowed else self.reason}"
+
+
+class ForbiddenTerm(models.Model):
+    """Запрещённый термин для локальной модерации; '*' в конце — префикс слова (см. store/term_matcher.py)."""
+    LANGUAGE_CHOICES = [('ru', 'Русский'), ('kg', 'Кыргызча'), ('en', 'English')]
+
+    term = models.CharField(max_length=100, unique=True)
+    language = models.CharField(max_length=2, choices=LANGUAGE_CHOICES)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.term
+
+
+class TranslationMemory(models.Model):
+    """Готовый перевод текста; одинаковые тексты товаров переводятся у провайдера один раз."""
+    source_hash = models.CharField(max_length=64)  # sha256 исходного текста
+    source_lang = models.CharField(max_length=8, default='auto')
+    target_lang = models.CharField(max_length=8)
+    provider = models.CharField(max_length=20)
+    source_text = models.TextField()
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_hash', 'source_lang', 'target_lang', 'provider'], name='translation_memory_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source_text[:30]} → {self.target_lang}"
+
+
+from .stripe_models import Payment, StripeEvent  # noqa: E402 — модели Stripe живут в отдельном модуле
@@ -0,0 +1,249 @@
+"""
+Модерация товаров: локальные правила и вердикт AI с кэшем вердиктов.
+
+Порядок проверки (screen):
+1. запрещённые термины (таблица ForbiddenTerm) — один проход автомата
+   Ахо — Корасик по нормализованному тексту (store/term_matcher.py). Автомат
+   строится при первой проверке в процессе и пересобирается, когда список
+   терминов меняется (версия в кэше, её поднимают сигналы ForbiddenTerm);
+2. кэш вердиктов: память (Django cache) -> таблица ModerationVerdict. Ключ —
+   хэш нормализованного текста вместе с RULESET_VERSION, поэтому повторная
+   отправка того же товара не идёт в OpenAI, а смена правил (новая версия)
+   автоматически делает старые вердикты неактуальными;
+3. если вердикта нет, товар сохраняется со статусом pending и проверяется
+   задачей moderate_product — добавление товара не ждёт OpenAI.
+"""
+import hashlib
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import catalog_cache, retrieval
+from .models import ForbiddenTerm, ModerationVerdict, Product
+from .term_matcher import TermMatcher
+
+logger = logging.getLogger(__name__)
+
+# Менять при изменении промпта: кэшированные вердикты AI перестанут совпадать.
+# Список терминов сюда не входит — локальная проверка идёт до кэша и вердиктов не пишет.
+RULESET_VERSION = 1
+
+APPROVED, PENDING, REJECTED = 'approved', 'pending', 'rejected'
+
+TERMS_VERSION_KEY = 'forbidden-terms:version'
+TERMS_RECHECK_SECONDS = 30  # как часто другие процессы сверяют версию списка терминов
+_matcher = {'matcher': None, 'version': None, 'checked': 0.0}
+
+Verdict = namedtuple('Verdict', 'allowed reason')
+
+PROMPT = """
+    Ты - строгий модератор сайта маркетплейса. Твоя задача - проверить, можно ли публиковать товар на основе названия и описания.
+
+    Запрещенные категории товаров:
+    - Алкоголь и наркотики (пиво, вино, водка, сигареты, наркотики)
+    - Оружие и боеприпасы (пистолеты, ножи, взрывчатка)
+    - Подделки и контрафакт (фейковые бренды, фальшивые документы)
+    - Незаконные услуги (мошенничество, хакинг, продажа данных)
+    - Вредные или опасные товары (ядовитые вещества, запрещенные химикаты)
+    - Любые товары, нарушающие законы или моральные нормы
+
+    Название товара: "{name}"
+    Описание товара: "{description}"
+
+    Инструкции:
+    - Если товар явно запрещен, ответь "НЕТ: [краткая причина]".
+    - Если товар сомнительный, но не явно запрещен, ответь "НЕТ: [причина]".
+    - Если товар разрешен, ответь "ДА".
+    - Будь строгим, но справедливым. Не блокируй обычные товары.
+
+    Ответь только в формате: ДА или НЕТ: причина
+    """
+
+_client = None
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def content_hash(name, description):
+    text = f'{RULESET_VERSION}\n{_normalize(name)}\n{_normalize(description)}'
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def terms_changed():
+    """Список терминов изменился: пересобрать автомат здесь и (через версию в кэше) в других процессах."""
+    try:
+        cache.incr(TERMS_VERSION_KEY)
+    except ValueError:
+        cache.set(TERMS_VERSION_KEY, 1, None)
+    _matcher['matcher'] = None
+
+
+def term_matcher():
+    now = time.monotonic()
+    if _matcher['matcher'] is not None and now - _matcher['checked'] < TERMS_RECHECK_SECONDS:
+        return _matcher['matcher']
+    version = cache.get(TERMS_VERSION_KEY, 0)
+    if _matcher['matcher'] is None or version != _matcher['version']:
+        terms = ForbiddenTerm.objects.filter(is_active=True).values_list('term', flat=True)
+        _matcher['matcher'] = TermMatcher(terms)
+        _matcher['version'] = version
+    _matcher['checked'] = now
+    return _matcher['matcher']
+
+
+def local_check(name, description):
+    """Вердикт по запрещённым терминам или None, если правила ничего не нашли."""
+    match = term_matcher().search(name + '\n' + description)
+    if match:
+        return Verdict(False, f"Товар содержит запрещенное слово: {match.term.rstrip('*')}")
+    return None
+
+
+def _memory_key(digest):
+    return f'moderation:{digest}'
+
+
+def verdict_deleted(digest):
+    """Вердикт удалён (сигнал): убрать и его копию из кэша."""
+    cache.delete(_memory_key(digest))
+
+
+def cached_verdict(digest):
+    verdict = cache.get(_memory_key(digest))
+    if verdict is not None:
+        return Verdict(*verdict)
+    row = ModerationVerdict.objects.filter(content_hash=digest, expires_at__gt=timezone.now()).first()
+    if row is None:
+        return None
+    verdict = Verdict(row.allowed, row.reason)
+    cache.set(_memory_key(digest), tuple(verdict), min(settings.MODERATION_CACHE_TIMEOUT,
+                                                       (row.expires_at - timezone.now()).total_seconds()))
+    return verdict
+
+
+def store_verdict(digest, verdict, source):
+    ModerationVerdict.objects.update_or_create(content_hash=digest, defaults={
+        'ruleset': RULESET_VERSION, 'allowed': verdict.allowed, 'reason': verdict.reason[:255],
+        'source': source, 'expires_at': timezone.now() + timedelta(seconds=settings.MODERATION_VERDICT_TTL),
+    })
+    cache.set(_memory_key(digest), tuple(verdict), settings.MODERATION_CACHE_TIMEOUT)
+
+
+def ai_enabled():
+    api_key = os.environ.get('OPENAI_API_KEY')
+    return bool(api_key and api_key != 'your-openai-api-key-here')
+
+
+def _ai_client():
+    # один клиент (и пул соединений) на процесс, а не новый на каждую проверку
+    global _client
+    if _client is None:
+        import openai
+        _client = openai.OpenAI(api_key=os.environ.get('OPENAI_API_KEY'), base_url=settings.OPENAI_BASE_URL)
+    return _client
+
+
+def ai_verdict(name, description):
+    """Вердикт OpenAI (Moderation API, затем промпт) или None при ошибке."""
+    client = _ai_client()
+    try:
+        # Сначала используем Moderation API для проверки на вредный контент
+        mod_response = client.moderations.create(input=name + " " + description)
+        if mod_response.results[0].flagged:
+            return Verdict(False, "Товар содержит вредный или запрещенный контент")
+
+        # Затем custom prompt
+        response = client.chat.completions.create(
+            model="gpt-4",  # Используем GPT-4 для лучшей модерации
+            messages=[{"role": "user", "content": PROMPT.format(name=name, description=description)}],
+            max_tokens=50,
+            temperature=0  # Для детерминированного ответа
+        )
+        answer = response.choices[0].message.content.strip()
+    except Exception as e:
+        logger.warning(f"AI-модерация недоступна: {e}")
+        return None
+    if answer.upper().startswith("НЕТ"):
+        reason = answer.split(":", 1)[1].strip() if ":" in answer else "Нарушение правил сайта"
+        return Verdict(False, reason)
+    return Verdict(True, "")  # ДА или неясный ответ — разрешить
+
+
+def screen(name, description):
+    """
+    Быстрая проверка при добавлении товара, без обращения к OpenAI.
+    Возвращает (статус, причина): APPROVED, REJECTED или PENDING (нужна AI-проверка).
+    """
+    verdict = local_check(name, description)
+    if verdict is None:
+        verdict = cached_verdict(content_hash(name, description))
+    if verdict is None and not ai_enabled():
+        verdict = Verdict(True, "")  # Без AI, только простая проверка
+    if verdict is None:
+        return PENDING, ""
+    return (APPROVED if verdict.allowed else REJECTED), verdict.reason
+
+
+def moderate_product(product_id):
+    """
+    Проверить товар в статусе pending и опубликовать или отклонить его.
+    Если OpenAI недоступен, товар остаётся pending (возвращается PENDING) — задача повторит проверку.
+    """
+    product = Product.objects.filter(pk=product_id, moderation_status=PENDING).first()
+    if product is None:
+        return None
+    status, reason = screen(product.name, product.description)
+    if status == PENDING:
+        verdict = ai_verdict(product.name, product.description)
+        if verdict is None:
+            return PENDING
+        store_verdict(content_hash(product.name, product.description), verdict, 'ai')
+        status, reason = (APPROVED if verdict.allowed else REJECTED), verdict.reason
+    product.moderation_status = status
+    product.moderation_reason = reason[:255]
+    product.is_published = status == APPROVED
+    product.save(update_fields=['moderation_status', 'moderation_reason', 'is_published'])
+    return status
+
+
+def rescreen(queryset, apply=False, batch_size=1000, progress=None):
+    """
+    Проверить товары queryset по текущему списку терминов за один потоковый
+    проход (iterator, только нужные поля). С apply=True нарушители снимаются
+    с публикации и получают статус rejected. Возвращает статистику.
+    """
+    matcher = term_matcher()
+    stats = {'checked': 0, 'rejected': 0}
+    hits = []
+
+    def flush():
+        if apply and hits:
+            Product.objects.bulk_update(hits, ['is_published', 'moderation_status', 'moderation_reason'])
+            for product in hits:
+                retrieval.product_changed(product.pk)
+        stats['rejected'] += len(hits)
+        hits.clear()
+
+    rows = queryset.exclude(moderation_status=REJECTED).order_by('pk').values_list('pk', 'name', 'description')
+    for pk, name, description in rows.iterator(chunk_size=batch_size):
+        stats['checked'] += 1
+        match = matcher.search(name + '\n' + description)
+        if match:
+            reason = f"Товар содержит запрещенное слово: {match.term.rstrip('*')}"
+            hits.append(Product(pk=pk, is_published=False, moderation_status=REJECTED, moderation_reason=reason))
+            if progress:
+                progress(pk, name, reason)
+            if len(hits) >= batch_size:
+                flush()
+    flush()
+    if apply and stats['rejected']:
+        catalog_cache.invalidate()  # bulk_update обходит сигналы Product
+    return stats
@@ -0,0 +1,129 @@
+"""
+Очередь исходящих писем (OutgoingEmail).
+
+Задачи не шлют письма сами, а ставят их в очередь с ключом идемпотентности:
+повторный запуск задачи (ретрай Celery, периодический send_pending_emails) не
+создаёт второе письмо. Воркер drain() забирает письма порциями и отправляет
+каждую порцию через одно соединение get_connection(), а не по SMTP-сессии на
+письмо. Неудачные попытки повторяются с экспоненциальной задержкой, скорость
+отправки ограничивается EMAIL_OUTBOX_RATE писем в секунду на воркер.
+
+Порция «арендуется» на LEASE: next_attempt_at сдвигается вперёд, поэтому
+параллельные воркеры (и упавший посреди порции воркер) не шлют письмо дважды.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+MAX_BACKOFF = timedelta(hours=6)
+
+
+def _from_email(from_email):
+    return from_email or settings.DEFAULT_FROM_EMAIL
+
+
+def enqueue(key, subject, body, to, from_email=None):
+    """Поставить письмо в очередь. Возвращает False, если письмо с таким key уже есть."""
+    _, created = OutgoingEmail.objects.get_or_create(idempotency_key=key, defaults={
+        'subject': subject, 'body': body, 'to': ','.join(to), 'from_email': _from_email(from_email),
+    })
+    return created
+
+
+def enqueue_many(messages):
+    """Поставить в очередь (key, subject, body, to) одним INSERT; уже поставленные пропускаются."""
+    OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(idempotency_key=key, subject=subject, body=body, to=','.join(to),
+                      from_email=_from_email(None))
+        for key, subject, body, to in messages
+    ], ignore_conflicts=True)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=now + LEASE)
+    return batch
+
+
+def _backoff(attempts):
+    return min(timedelta(seconds=settings.EMAIL_OUTBOX_BACKOFF * 2 ** (attempts - 1)), MAX_BACKOFF)
+
+
+def _failed(email, error, stats):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+        stats['failed'] += 1
+        logger.error(f"Письмо {email.idempotency_key} не отправлено после {email.attempts} попыток: {error}")
+    else:
+        email.next_attempt_at = timezone.now() + _backoff(email.attempts)
+        stats['retried'] += 1
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _send_batch(batch, interval, stats):
+    sent = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # сервер недоступен — вся порция уходит на повтор
+        for email in batch:
+            _failed(email, e, stats)
+        return
+    try:
+        for email in batch:
+            started = time.monotonic()
+            try:
+                EmailMessage(email.subject, email.body, email.from_email, email.to.split(','),
+                             connection=connection).send()
+            except Exception as e:
+                _failed(email, e, stats)
+            else:
+                sent.append(email.pk)
+            if interval:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        connection.close()
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+    )
+    stats['sent'] += len(sent)
+
+
+def drain(batch_size=None, rate=None):
+    """
+    Отправить все письма, срок которых наступил. Возвращает
+    {'sent', 'retried', 'failed', 'batches'}.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    rate = settings.EMAIL_OUTBOX_RATE if rate is None else rate
+    interval = 1.0 / rate if rate else 0.0
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0}
+    while True:
+        batch = _claim(batch_size)
+        if not batch:
+            break
+        stats['batches'] += 1
+        _send_batch(batch, interval, stats)
+        if len(batch) < batch_size:
+            break
+    return stats
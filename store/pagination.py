@@ -0,0 +1,199 @@
+"""
+Keyset (курсорная) пагинация для каталога и API: по умолчанию по (created_at, id),
+для сортировок каталога — по их полям (ordering), последнее поле всегда id.
+
+Вместо OFFSET страница выбирается условием «после последней показанной записи»,
+поэтому стоимость запроса не зависит от глубины. Курсор — непрозрачная строка
+(base64 от направления и значений полей сортировки). Общее число записей — по
+желанию и приблизительное.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+NEXT = 'n'
+PREVIOUS = 'p'
+ORDERING = ('-created_at', '-id')
+
+COUNT_CACHE_TIMEOUT = 300
+
+
+def _names(ordering):
+    return [field.lstrip('-') for field in ordering]
+
+
+def encode_cursor(obj, direction=NEXT, ordering=ORDERING):
+    # obj — экземпляр модели или строка из .values() с полями ordering
+    values = [obj[name] if isinstance(obj, dict) else getattr(obj, name) for name in _names(ordering)]
+    raw = '|'.join([direction] + [v.isoformat() if hasattr(v, 'isoformat') else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, ordering=ORDERING):
+    """Вернуть (направление, [значения полей ordering]) или None, если курсор повреждён."""
+    if not token:
+        return None
+    names = _names(ordering)
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, *parts = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if len(parts) != len(names):
+            return None
+        values = [model._meta.get_field(name).to_python(part) for name, part in zip(names, parts)]
+    except (ValueError, ValidationError, binascii.Error, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or None in values:
+        return None
+    return direction, values
+
+
+def _after(ordering, values, forward):
+    """
+    Условие «строго после курсора» в порядке ordering (forward=False — «строго до»).
+    Первым идёт нестрогое сравнение по первому полю: оно даёт диапазонный проход по индексу.
+    """
+    names = _names(ordering)
+    ops = []
+    for field in ordering:
+        descending = field.startswith('-')
+        ops.append('lt' if descending == forward else 'gt')
+    condition = Q()
+    for i, name in enumerate(names):
+        condition |= Q(**dict(zip(names[:i], values[:i])), **{f'{name}__{ops[i]}': values[i]})
+    return Q(**{f'{names[0]}__{ops[0]}e': values[0]}) & condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate(queryset, cursor=None, page_size=15, ordering=ORDERING):
+    """
+    Страница queryset в порядке ordering, начиная с курсора.
+    Запрашиваем page_size + 1 строк, чтобы узнать, есть ли следующая страница без COUNT.
+    """
+    decoded = decode_cursor(cursor, queryset.model, ordering)
+    if decoded is None:
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more, items = len(rows) > page_size, rows[:page_size]
+        has_before = False
+    else:
+        direction, values = decoded
+        if direction == NEXT:
+            rows = list(queryset.filter(_after(ordering, values, True)).order_by(*ordering)[:page_size + 1])
+            has_more, items = len(rows) > page_size, rows[:page_size]
+            has_before = True
+        else:
+            rows = list(
+                queryset.filter(_after(ordering, values, False)).order_by(*_reverse(ordering))[:page_size + 1]
+            )
+            has_before, items = len(rows) > page_size, list(reversed(rows[:page_size]))
+            has_more = True
+    next_cursor = encode_cursor(items[-1], NEXT, ordering) if items and has_more else None
+    previous_cursor = encode_cursor(items[0], PREVIOUS, ordering) if items and has_before else None
+    return KeysetPage(items, next_cursor, previous_cursor)
+
+
+def approximate_count(queryset):
+    """
+    Приблизительное число строк: на PostgreSQL — оценка планировщика (EXPLAIN),
+    на остальных СУБД — точный COUNT, закэшированный на несколько минут.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    cache_key = f'approx-count:{digest}'
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    DRF-пагинация для /api/products/ на тех же курсорах, что и HTML-каталог.
+    ?cursor=<токен>, ?page_size=<1..100>, ?count=1 — добавить приблизительное число товаров.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page = paginate(queryset, request.query_params.get(self.cursor_query_param), self.get_page_size(request))
+        self.count = None
+        if request.query_params.get('count') in ('1', 'true'):
+            self.count = approximate_count(queryset)
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'description': 'Приблизительно, только при ?count=1'},
+                'results': schema,
+            },
+        }
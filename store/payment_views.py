@@ -4,7 +4,10 @@ from django.shortcuts import redirect
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Order, OrderItem, Product
+from django.utils import timezone
+from .models import Order, Product
+from . import ledger
+from datetime import date, datetime, time, timedelta
 import json
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -72,25 +75,26 @@ def confirm_payment(request):
         return Response({'error': str(e)}, status=400)
 
 
+def _parse_day(value, next_day=False):
+    # YYYY-MM-DD -> aware datetime at local midnight (of the following day for an inclusive end)
+    if not value:
+        return None
+    day = date.fromisoformat(value)
+    if next_day:
+        day += timedelta(days=1)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def seller_earnings(request):
     """
-    Получить доход продавца
+    Получить доход продавца из журнала проводок (store/ledger.py).
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD — период, обе даты включительно
     """
-    user = request.user
-    seller_orders = OrderItem.objects.filter(
-        order__status='paid',
-        order__items__product__owner=user
-    ).distinct()
-    
-    total_earned = sum([item.subtotal() for item in seller_orders])
-    commission = (total_earned * settings.SELLER_COMMISSION_PERCENTAGE) / 100
-    net_earnings = total_earned - commission
-    
-    return Response({
-        'gross_earnings': total_earned,
-        'commission': commission,
-        'net_earnings': net_earnings,
-        'orders_count': seller_orders.count()
-    })
+    try:
+        start = _parse_day(request.query_params.get('from'))
+        end = _parse_day(request.query_params.get('to'), next_day=True)
+    except ValueError:
+        return Response({'error': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+    return Response(ledger.earnings(request.user, start, end))
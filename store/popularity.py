@@ -0,0 +1,233 @@
+"""
+Популярность товаров для сортировки главной и каталога: Product.popularity.
+
+Сигналы и их вес (POPULARITY_WEIGHTS): просмотры страницы товара, продажи
+(позиции оплаченных заказов), добавления в избранное и одобренные отзывы
+(вес × оценка / 5). Вклад события затухает вдвое за POPULARITY_HALF_LIFE_DAYS.
+
+Затухание без пересчёта всего каталога: вклад события в день d хранится
+умноженным на 2 ** ((d - EPOCH) / half_life), а не делённым на возраст. Так у
+всех товаров «текущий» счёт — сохранённое число, умноженное на один и тот же
+множитель 2 ** (-(сегодня - EPOCH) / half_life), и порядок по popularity
+верен без обновления строк, в которых ничего не происходило. Старые события
+(старше WINDOW_HALF_LIVES периодов) не читаются: их вклад меньше 0,5 %.
+Множитель растёт: при периоде 7 дней float переполнится лет через 19 —
+перед этим EPOCH сдвигают и пересчитывают всё (update_popularity --full).
+
+Обновление (задача update_product_popularity, update()) пересчитывает только
+изменившиеся товары. Какие изменились — журнал в кэше, как в store/retrieval.py:
+номер версии и список id товаров на запись. Пишут в него сигналы Favorite,
+Review и Order и просмотры. Просмотр (record_view) сразу увеличивает общий
+счётчик товара в кэше; в журнал пишется только первый просмотр после того, как
+задача забрала счётчик в view_score, поэтому журнал растёт с числом товаров,
+а не просмотров. Счётчики и журнал должны быть общими для веб-воркеров и
+Celery — без REDIS_URL учёт просмотров выключен (POPULARITY_VIEWS_ENABLED,
+см. settings). Если журнал истёк или ещё не читался, пересчитываются все товары
+с событиями за окно вместе с товарами из уцелевшей части журнала (у товаров
+только с просмотрами событий в БД нет). Результат пишется одним bulk_update.
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import Favorite, OrderItem, Product, Review
+from .rollups import SOLD_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# менять только вместе с полным пересчётом: сохранённые числа отсчитаны от неё
+EPOCH = date(2025, 1, 1)
+WINDOW_HALF_LIVES = 8
+CHUNK_SIZE = 500
+
+VERSION_KEY = 'popularity:version'
+CHANGE_KEY = 'popularity:change:{}'
+PROCESSED_KEY = 'popularity:processed'
+VIEWS_KEY = 'popularity:views:{}'
+LOCK_KEY = 'popularity:lock'
+CHANGE_TTL = 24 * 3600
+MAX_REPLAY = 10000
+
+
+def growth(day):
+    """Множитель вклада события дня day (см. описание модуля)."""
+    return 2 ** ((day - EPOCH).days / settings.POPULARITY_HALF_LIFE_DAYS)
+
+
+def current(product, today=None):
+    """Счёт товара на сегодня в «событиях»: сохранённое число, приведённое к текущей дате."""
+    return product.popularity / growth(today or timezone.localdate())
+
+
+def touch(product_ids):
+    """Записать в журнал, что у товаров появились события (после коммита транзакции)."""
+    product_ids = sorted({pk for pk in product_ids if pk is not None})
+    if not product_ids:
+        return
+
+    def log():
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), product_ids, CHANGE_TTL)
+    transaction.on_commit(log)
+
+
+def order_changed(order_id):
+    """Заказ стал оплаченным или перестал им быть: продажи его товаров изменились."""
+    touch(OrderItem.objects.filter(order_id=order_id).values_list('product_id', flat=True))
+
+
+def record_view(product_id):
+    """Просмотр страницы товара: общий счётчик в кэше; первый просмотр после сбора — в журнал."""
+    if not getattr(settings, 'POPULARITY_VIEWS_ENABLED', False):
+        return
+    key = VIEWS_KEY.format(product_id)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        count = 1 if cache.add(key, 1, None) else cache.incr(key)
+    if count == 1:
+        touch([product_id])
+
+
+def _take_views(product_ids):
+    """Забрать счётчики просмотров товаров: прочитать и вычесть прочитанное (новые просмотры сохраняются)."""
+    keys = {VIEWS_KEY.format(pk): pk for pk in product_ids}
+    taken = {}
+    pending = []
+    for key, count in cache.get_many(list(keys)).items():
+        if not count:
+            continue
+        try:
+            left = cache.decr(key, count)
+        except ValueError:
+            left = 0
+        taken[keys[key]] = count
+        if left > 0:
+            # просмотры между чтением и вычитанием не попали в журнал (счётчик не был нулём)
+            pending.append(keys[key])
+    touch(pending)
+    return taken
+
+
+def _per_day(queryset, date_field, value):
+    """{id товара: [(день, величина)]} за окно."""
+    result = {}
+    rows = (
+        queryset.order_by().annotate(day=TruncDate(date_field)).values('product_id', 'day')
+        .annotate(value=value).values_list('product_id', 'day', 'value')
+    )
+    for pk, day, amount in rows:
+        result.setdefault(pk, []).append((day, amount or 0))
+    return result
+
+
+def _sources(product_ids, since):
+    """Сигналы товаров за окно: {источник: {id товара: [(день, величина)]}}."""
+    sold = OrderItem.objects.filter(
+        product_id__in=product_ids, order__status__in=SOLD_STATUSES, order__created_at__gte=since,
+    )
+    return {
+        'sale': _per_day(sold, 'order__created_at', Sum('quantity')),
+        'favorite': _per_day(Favorite.objects.filter(product_id__in=product_ids, created_at__gte=since),
+                             'created_at', Count('pk')),
+        # отзыв с оценкой 5 весит полный вес, с оценкой 1 — пятую часть
+        'review': _per_day(Review.objects.filter(product_id__in=product_ids, approved=True, created_at__gte=since),
+                           'created_at', Sum('rating')),
+    }
+
+
+def _score(pk, sources):
+    weights = settings.POPULARITY_WEIGHTS
+    score = 0.0
+    for source, per_product in sources.items():
+        weight = weights[source] / 5 if source == 'review' else weights[source]
+        score += sum(weight * amount * growth(day) for day, amount in per_product.get(pk, ()))
+    return score
+
+
+def _window_start():
+    days = settings.POPULARITY_HALF_LIFE_DAYS * WINDOW_HALF_LIVES
+    return timezone.now() - timedelta(days=days)
+
+
+def _active_products(since):
+    """Товары с событиями за окно и с уже накопленной популярностью — для полного пересчёта."""
+    ids = set(OrderItem.objects.filter(order__status__in=SOLD_STATUSES, order__created_at__gte=since)
+              .values_list('product_id', flat=True).distinct())
+    ids |= set(Favorite.objects.filter(created_at__gte=since).values_list('product_id', flat=True).distinct())
+    ids |= set(Review.objects.filter(approved=True, created_at__gte=since)
+               .values_list('product_id', flat=True).distinct())
+    ids |= set(Product.objects.filter(popularity__gt=0).values_list('pk', flat=True))
+    ids.discard(None)
+    return ids
+
+
+def recompute(product_ids, views=None):
+    """Пересчитать popularity товаров product_ids (и добавить просмотры {id: число}) одним bulk_update на порцию."""
+    views = views or {}
+    since = _window_start()
+    today_growth = growth(timezone.localdate())
+    view_weight = settings.POPULARITY_WEIGHTS['view']
+    product_ids = sorted(product_ids)
+    updated = 0
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        sources = _sources(chunk, since)
+        products = list(Product.objects.filter(pk__in=chunk).only('pk', 'popularity', 'view_score'))
+        for product in products:
+            product.view_score += views.get(product.pk, 0) * view_weight * today_growth
+            product.popularity = product.view_score + _score(product.pk, sources)
+        with transaction.atomic():
+            Product.objects.bulk_update(products, ['popularity', 'view_score'], batch_size=CHUNK_SIZE)
+        updated += len(products)
+    return updated
+
+
+def update(full=False):
+    """
+    Периодическое обновление: товары из журнала с прошлого запуска (или все
+    активные, если журнал потерян). Возвращает {'products', 'views', 'full', 'seconds'}.
+    """
+    started = time.monotonic()
+    if not cache.add(LOCK_KEY, 1, 600):
+        logger.info("Популярность уже пересчитывается другим процессом")
+        return None
+    try:
+        version = cache.get(VERSION_KEY, 0)
+        processed = cache.get(PROCESSED_KEY)
+        if processed is None or version < processed or version - processed > MAX_REPLAY:
+            full = True
+            processed = max(0, version - MAX_REPLAY)
+        keys = [CHANGE_KEY.format(v) for v in range(processed + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            full = True  # часть журнала истекла
+        # товары из журнала берутся и при полном пересчёте: у товаров только с
+        # просмотрами нет событий в БД, а журнал ниже помечается обработанным
+        product_ids = set()
+        for ids in changes.values():
+            product_ids.update(ids)
+        if full:
+            product_ids |= _active_products(_window_start())
+        # счётчики просмотров остальных товаров ждут в кэше их следующей записи в журнале
+        views = _take_views(product_ids)
+        updated = recompute(product_ids, views) if product_ids else 0
+        cache.set(PROCESSED_KEY, version, None)
+    finally:
+        cache.delete(LOCK_KEY)
+    if updated:
+        catalog_cache.invalidate()
+    return {'products': updated, 'views': sum(views.values()), 'full': full,
+            'seconds': time.monotonic() - started}
@@ -0,0 +1,88 @@
+"""
+Оценки товаров по одобренным отзывам: Product.rating_count, rating_sum, rating_avg.
+
+Отзыв учитывается, пока approved=True. Сигналы Review (store/signals.py)
+сравнивают учтённое состояние отзыва (товар и оценка, если он был одобрен)
+с новым и применяют разницу одним UPDATE товара:
+    SET rating_count = rating_count + 1, rating_sum = rating_sum + 5, rating_avg = ...
+— без агрегатов по всем отзывам товара. Массовое одобрение в админке идёт через
+set_approved: одна агрегация по выбранным отзывам и UPDATE на каждый товар.
+
+Каталог читает готовые столбцы: звёзды в карточках и ?sort=rating не делают
+запросов к отзывам. queryset.update(approved=...) в обход set_approved сигналов
+не вызывает — после него счётчики пересчитывает rebuild (команда rebuild_ratings).
+"""
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Round
+
+from . import catalog_cache, popularity
+from .models import Product, Review
+
+
+def _average(count, total):
+    return Round(Cast(total, FloatField()) / count, 2)
+
+
+def counted(review):
+    """(товар, оценка), если отзыв входит в рейтинг товара, иначе None; поля не догружаются."""
+    state = review.__dict__
+    if state.get('approved') and state.get('product_id') is not None:
+        return state['product_id'], state.get('rating') or 0
+    return None
+
+
+def apply(product_id, count, total):
+    """Добавить к рейтингу товара count отзывов с суммой оценок total (отрицательные — убрать)."""
+    new_count = F('rating_count') + count
+    new_sum = F('rating_sum') + total
+    Product.objects.filter(pk=product_id).update(
+        rating_count=Greatest(new_count, Value(0)),
+        rating_sum=Greatest(new_sum, Value(0)),
+        rating_avg=Case(
+            When(rating_count__lte=-count, then=Value(0.0)),
+            default=_average(new_count, new_sum),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def review_changed(before, after):
+    """Сигнал: учтённое состояние отзыва было before, стало after (см. counted)."""
+    if before == after:
+        return
+    if before:
+        apply(before[0], -1, -before[1])
+    if after:
+        apply(after[0], 1, after[1])
+    catalog_cache.invalidate()
+
+
+def set_approved(queryset, approved):
+    """Одобрить или снять с публикации отзывы queryset, обновив рейтинги товаров. Возвращает число отзывов."""
+    with transaction.atomic():
+        pks = list(queryset.exclude(approved=approved).select_for_update().values_list('pk', flat=True))
+        if not pks:
+            return 0
+        changed = Review.objects.filter(pk__in=pks)
+        sign = 1 if approved else -1
+        per_product = changed.order_by().values('product_id').annotate(n=Count('pk'), total=Sum('rating'))
+        for row in per_product:
+            apply(row['product_id'], sign * row['n'], sign * row['total'])
+        changed.update(approved=approved)
+        popularity.touch(row['product_id'] for row in per_product)
+    catalog_cache.invalidate()
+    return len(pks)
+
+
+def rebuild(queryset=None):
+    """Пересчитать рейтинги товаров queryset (по умолчанию — всех) одним UPDATE с подзапросами."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    reviews = Review.objects.filter(product=OuterRef('pk'), approved=True).order_by().values('product')
+    count = Coalesce(Subquery(reviews.annotate(n=Count('pk')).values('n')), 0)
+    total = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+    average = Coalesce(Subquery(reviews.annotate(avg=Round(Avg('rating'), 2)).values('avg')), 0.0)
+    # в SET все выражения видят старые значения строки, поэтому средняя — своим подзапросом
+    updated = queryset.update(rating_count=count, rating_sum=total, rating_avg=average)
+    catalog_cache.invalidate()
+    return updated
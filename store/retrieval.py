@@ -0,0 +1,211 @@
+"""
+Подбор товаров для промпта чата: TF-IDF индекс в памяти процесса, без сети.
+
+Документ товара — все переводы названия (с весом NAME_WEIGHT) и описания
+(search.product_document). Слова приводятся к одному виду transliterate из
+term_matcher (кириллица ru/kg транслитерируется), поэтому «велосипед» и
+«velosiped» совпадают, и обрезаются до STEM_LENGTH символов — грубая замена
+стемминга («велосипеды», «велосипедов» -> один терм).
+
+Индекс обратный: терм -> {id товара: вес}. Веса документа нормированы только
+по tf, а idf считается при запросе, поэтому изменение одного товара
+обновляет только его термы (O(длина документа)), без пересчёта остальных.
+Запрос проходит лишь по спискам своих термов; слишком частые термы
+(в большей доле товаров, чем MAX_DF_RATIO) пропускаются как стоп-слова, а у
+длинных списков просматриваются только MAX_POSTINGS товаров с наибольшим весом
+терма — так время запроса не растёт с размером каталога (top-k приближённый).
+
+Индекс строится при первом запросе в процессе. Изменения товаров (сигналы)
+сразу применяются в своём процессе и пишутся в журнал в кэше: номер версии и
+id товара. Другие процессы не чаще раза в RECHECK_SECONDS догоняют журнал,
+перечитывая только изменённые товары, а если журнал истёк — строят индекс заново.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product
+from .search import INDEXED_FIELDS, product_document
+from .term_matcher import transliterate
+
+NAME_WEIGHT = 3
+STEM_LENGTH = 6
+MAX_DF_RATIO = 0.5
+MIN_DOCS_FOR_DF = 20  # в маленьком каталоге частых слов не отбрасываем
+MAX_POSTINGS = 1000
+SNIPPET_LENGTH = 200
+
+VERSION_KEY = 'retrieval:version'
+CHANGE_KEY = 'retrieval:change:{}'
+CHANGE_TTL = 3600
+MAX_REPLAY = 1000
+RECHECK_SECONDS = 5
+
+# поля, от которых зависит индекс: тексты, цена в сниппете и видимость в каталоге
+TRACKED_FIELDS = INDEXED_FIELDS + ('price', 'is_published', 'is_deleted')
+
+_WORD_RE = re.compile(r'\w{2,}')
+_state = {'index': None, 'version': 0, 'checked': 0.0}
+
+
+def tokens(text):
+    return [word[:STEM_LENGTH] for word in _WORD_RE.findall(transliterate(text))]
+
+
+class RetrievalIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)  # терм -> {id товара: вес}
+        self.terms = {}  # id товара -> его термы, для удаления
+        self.meta = {}  # id товара -> (название, цена, начало описания)
+        self._top = {}  # терм -> MAX_POSTINGS лучших пар списка; сбрасывается при его изменении
+        # индекс общий для потоков процесса: изменение из сигнала не должно идти во время поиска
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def add(self, pk, names, descriptions, meta):
+        tf = Counter(tokens(names) * NAME_WEIGHT + tokens(descriptions))
+        weights = {term: 1 + math.log(count) for term, count in tf.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        with self._lock:
+            self.remove(pk)
+            if not weights:
+                return
+            for term, weight in weights.items():
+                self.postings[term][pk] = weight / norm
+                self._top.pop(term, None)
+            self.terms[pk] = tuple(weights)
+            self.meta[pk] = meta
+
+    def remove(self, pk):
+        with self._lock:
+            for term in self.terms.pop(pk, ()):
+                posting = self.postings[term]
+                posting.pop(pk, None)
+                self._top.pop(term, None)
+                if not posting:
+                    del self.postings[term]
+            self.meta.pop(pk, None)
+
+    def _postings(self, term, posting):
+        if len(posting) <= MAX_POSTINGS:
+            return posting.items()
+        top = self._top.get(term)
+        if top is None:
+            top = self._top[term] = heapq.nlargest(MAX_POSTINGS, posting.items(), key=itemgetter(1))
+        return top
+
+    def search(self, query, k):
+        """[(id товара, оценка)] — k лучших по сумме tf·idf² совпавших термов."""
+        query_terms = Counter(tokens(query))
+        scores = defaultdict(float)
+        with self._lock:
+            total = len(self.terms)
+            for term, count in query_terms.items():
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                if total >= MIN_DOCS_FOR_DF and len(posting) > total * MAX_DF_RATIO:
+                    continue
+                idf = math.log((total + 1) / (len(posting) + 1)) + 1
+                weight = (1 + math.log(count)) * idf * idf
+                for pk, doc_weight in self._postings(term, posting):
+                    scores[pk] += weight * doc_weight
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+
+def _products():
+    return Product.objects.filter(is_published=True, is_deleted=False).only('pk', 'price', *INDEXED_FIELDS)
+
+
+def _add(index, product):
+    names, descriptions = product_document(product)
+    snippet = ' '.join((product.description or '').split())[:SNIPPET_LENGTH]
+    index.add(product.pk, names, descriptions, (product.name, product.price, snippet))
+
+
+def _reload(index, pks):
+    products = _products().in_bulk(pks)
+    for pk in pks:
+        if pk in products:
+            _add(index, products[pk])
+        else:
+            index.remove(pk)
+
+
+def build():
+    # версию читаем до загрузки: изменения, пришедшие во время сборки, будут доиграны
+    version = cache.get(VERSION_KEY, 0)
+    index = RetrievalIndex()
+    for product in _products().iterator(chunk_size=2000):
+        _add(index, product)
+    _state.update(index=index, version=version, checked=time.monotonic())
+    return index
+
+
+def get_index():
+    index = _state['index']
+    if index is None:
+        return build()
+    now = time.monotonic()
+    if now - _state['checked'] < RECHECK_SECONDS:
+        return index
+    _state['checked'] = now
+    version = cache.get(VERSION_KEY, 0)
+    if version == _state['version']:
+        return index
+    if version < _state['version'] or version - _state['version'] > MAX_REPLAY:
+        return build()
+    keys = [CHANGE_KEY.format(v) for v in range(_state['version'] + 1, version + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return build()  # часть журнала истекла
+    _reload(index, set(changes.values()))
+    _state['version'] = version
+    return index
+
+
+def reset():
+    _state.update(index=None, version=0, checked=0.0)
+
+
+def product_changed(pk):
+    """Товар изменён или удалён: после коммита обновить индекс процесса и записать изменение в журнал."""
+    def apply():
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), pk, CHANGE_TTL)
+        index = _state['index']
+        if index is not None:
+            _reload(index, {pk})
+            if version == _state['version'] + 1:
+                _state['version'] = version
+    transaction.on_commit(apply)
+
+
+def top_products(question, k=None):
+    """[(id, название, цена, начало описания)] — k товаров, ближайших к вопросу."""
+    index = get_index()
+    k = k or settings.CHAT_CONTEXT_PRODUCTS
+    hits = [(pk, index.meta.get(pk)) for pk, _ in index.search(question, k)]
+    return [(pk, *meta) for pk, meta in hits if meta]  # товар мог уйти из индекса после поиска
+
+
+def product_context(question, k=None):
+    """Текст для промпта: не больше k строк о товарах, независимо от размера каталога."""
+    return '\n'.join(
+        f"- {name}, {price} сом: {snippet}" if snippet else f"- {name}, {price} сом"
+        for _, name, price, snippet in top_products(question, k)
+    )
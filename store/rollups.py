@@ -0,0 +1,131 @@
+"""
+Свёртки продаж по дням: DailySales (итоги дня) и DailySalesRollup (день × категория × продавец).
+
+Заказ попадает в свёртку, когда переходит в оплаченный статус (SOLD_STATUSES), и
+вычитается, если покидает его (отмена) или удаляется — см. store/signals.py.
+Изменение одного заказа — пара агрегатов по его позициям и UPDATE ... + F() по
+затронутым строкам свёртки; недостающие строки сначала вставляются без конфликта
+(ON CONFLICT DO NOTHING), поэтому параллельные первые заказы дня не падают на
+уникальности и не плодят дубликаты. Массовые queryset.update(status=...) сигналов
+не вызывают: после них свёртку нужно пересобрать (rebuild / backfill_sales_rollup).
+
+Отчёты читают только свёртку: период любой длины — выборка по индексу date.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+
+from .models import DailySales, DailySalesRollup, Order, OrderItem
+
+# shipped — тоже проданный заказ, из отчётов он пропадать не должен
+SOLD_STATUSES = ('paid', 'shipped')
+
+_MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _aggregate(orders):
+    """
+    Итоги по дням и по (день, категория, продавец) для queryset заказов — два запроса.
+    Возвращает (days, buckets): {day: [orders, items, revenue]}, {(day, category, seller): [...]}.
+    """
+    days = defaultdict(lambda: [0, 0, Decimal('0')])
+    buckets = {}
+    per_day = (
+        orders.order_by().annotate(day=TruncDate('created_at')).values('day')
+        .annotate(n=Count('pk'), revenue=Sum('total_amount'))
+    )
+    for row in per_day:
+        days[row['day']][0] = row['n']
+        days[row['day']][2] = row['revenue'] or Decimal('0')
+    per_bucket = (
+        OrderItem.objects.filter(order__in=orders).order_by()
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product__category_id', 'product__owner_id')
+        .annotate(
+            n=Count('order_id', distinct=True),
+            items=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=_MONEY),
+        )
+    )
+    for row in per_bucket:
+        key = (row['day'], row['product__category_id'], row['product__owner_id'])
+        buckets[key] = [row['n'], row['items'], row['revenue']]
+        days[row['day']][1] += row['items']
+    return days, buckets
+
+
+def _add(model, keys, orders_count, items_sold, revenue):
+    # Первый заказ дня может прийти одновременно в нескольких транзакциях: строка
+    # вставляется без конфликта (уже есть — ничего не делаем), затем UPDATE + F()
+    model.objects.bulk_create([model(**keys)], ignore_conflicts=True)
+    model.objects.filter(**keys).update(
+        orders_count=F('orders_count') + orders_count,
+        items_sold=F('items_sold') + items_sold,
+        revenue=F('revenue') + revenue,
+    )
+
+
+def apply_orders(orders, sign=1):
+    """Прибавить (sign=1) или вычесть (sign=-1) заказы queryset orders из свёртки."""
+    days, buckets = _aggregate(orders)
+    with transaction.atomic():
+        for day, (n, items, revenue) in days.items():
+            _add(DailySales, {'date': day}, sign * n, sign * items, sign * revenue)
+        for (day, category_id, seller_id), (n, items, revenue) in buckets.items():
+            _add(
+                DailySalesRollup, {'date': day, 'category_id': category_id, 'seller_id': seller_id},
+                sign * n, sign * items, sign * revenue,
+            )
+
+
+def rebuild(start, end):
+    """Пересобрать свёртку за даты [start, end] с нуля. Возвращает число дней с продажами."""
+    orders = Order.objects.filter(status__in=SOLD_STATUSES, created_at__date__range=(start, end))
+    days, buckets = _aggregate(orders)
+    with transaction.atomic():
+        DailySales.objects.filter(date__range=(start, end)).delete()
+        DailySalesRollup.objects.filter(date__range=(start, end)).delete()
+        DailySales.objects.bulk_create([
+            DailySales(date=day, orders_count=n, items_sold=items, revenue=revenue)
+            for day, (n, items, revenue) in days.items()
+        ])
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(date=day, category_id=category_id, seller_id=seller_id,
+                             orders_count=n, items_sold=items, revenue=revenue)
+            for (day, category_id, seller_id), (n, items, revenue) in buckets.items()
+        ])
+    return len(days)
+
+
+def date_batches(start, end, days):
+    """Разбить [start, end] на отрезки по days дней (для порционной пересборки)."""
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        yield start, stop
+        start = stop + timedelta(days=1)
+
+
+def sales_report(start, end):
+    """Итоги продаж за [start, end] — один агрегат по DailySales."""
+    totals = DailySales.objects.filter(date__range=(start, end)).aggregate(
+        orders_count=Sum('orders_count'), total_revenue=Sum('revenue'), products_sold=Sum('items_sold'),
+    )
+    return {
+        'orders_count': totals['orders_count'] or 0,
+        'total_revenue': totals['total_revenue'] or 0,
+        'products_sold': totals['products_sold'] or 0,
+    }
+
+
+def sales_breakdown(start, end, by='category'):
+    """Продажи за [start, end] в разрезе by ('category' или 'seller'), по убыванию выручки."""
+    return (
+        DailySalesRollup.objects.filter(date__range=(start, end))
+        .values(f'{by}_id')
+        .annotate(orders_count=Sum('orders_count'), items_sold=Sum('items_sold'), revenue=Sum('revenue'))
+        .order_by('-revenue')
+    )
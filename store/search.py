@@ -0,0 +1,223 @@
+"""
+Полнотекстовый поиск по товарам.
+
+Индекс хранится отдельно от store_product и обновляется сигналами
+при сохранении/удалении товара (см. store/signals.py):
+- PostgreSQL: таблица store_product_search с tsvector и GIN-индексом;
+- SQLite: виртуальная таблица FTS5 store_product_fts;
+- прочие СУБД: запасной вариант через icontains по всем полям.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+NAME_FIELDS = ('name', 'name_ru', 'name_kg', 'name_en')
+DESCRIPTION_FIELDS = ('description', 'description_ru', 'description_kg', 'description_en')
+INDEXED_FIELDS = NAME_FIELDS + DESCRIPTION_FIELDS
+
+SQLITE_TABLE = 'store_product_fts'
+POSTGRES_TABLE = 'store_product_search'
+
+# Название весит больше описания при ранжировании
+SQLITE_RANK = f'bm25({SQLITE_TABLE}, 10.0, 1.0)'
+
+MAX_QUERY_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _vendor():
+    return connection.vendor
+
+
+def is_indexed_backend():
+    return _vendor() in ('postgresql', 'sqlite')
+
+
+def query_terms(query):
+    """Разбить запрос на слова (в нижнем регистре, без дублей)."""
+    terms = []
+    for term in _TERM_RE.findall((query or '').lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def _join_unique(values):
+    seen = []
+    for value in values:
+        value = (value or '').strip()
+        if value and value not in seen:
+            seen.append(value)
+    return ' '.join(seen)
+
+
+def product_document(product):
+    """Вернуть (названия, описания) товара для индекса — все переводы без повторов."""
+    names = _join_unique(getattr(product, f, None) for f in NAME_FIELDS)
+    descriptions = _join_unique(getattr(product, f, None) for f in DESCRIPTION_FIELDS)
+    return names, descriptions
+
+
+def index_products(products):
+    """Добавить или обновить пачку товаров в поисковом индексе одним executemany."""
+    vendor = _vendor()
+    rows = [(product.pk, *product_document(product)) for product in products]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.executemany(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, names, descriptions) VALUES (%s, %s, %s)', rows,
+            )
+        elif vendor == 'postgresql':
+            cursor.executemany(
+                f"""
+                INSERT INTO {POSTGRES_TABLE} (product_id, document)
+                VALUES (%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))
+                ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                rows,
+            )
+
+
+def index_product(product):
+    """Добавить или обновить товар в поисковом индексе."""
+    index_products([product])
+
+
+def remove_product(product_id):
+    """Удалить товар из поискового индекса."""
+    vendor = _vendor()
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [product_id])
+        elif vendor == 'postgresql':
+            cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE product_id = %s', [product_id])
+
+
+def rebuild_index(batch_size=2000):
+    """Полностью перестроить индекс, проходя по товарам пачками по id. Возвращает число товаров."""
+    if not is_indexed_backend():
+        return 0
+    with connection.cursor() as cursor:
+        table = SQLITE_TABLE if _vendor() == 'sqlite' else POSTGRES_TABLE
+        cursor.execute(f'DELETE FROM {table}')
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_id).order_by('pk').only('pk', *INDEXED_FIELDS)[:batch_size]
+        )
+        if not batch:
+            break
+        index_products(batch)
+        indexed += len(batch)
+        last_id = batch[-1].pk
+    return indexed
+
+
+def _visible():
+    return Product.objects.filter(is_deleted=False, is_published=True)
+
+
+class SearchResults:
+    """
+    Ленивый результат поиска, совместимый с django.core.paginator.Paginator:
+    count() считает совпадения, срез загружает только нужную страницу в порядке релевантности.
+    """
+
+    def __init__(self, query, queryset=None):
+        self.query = query
+        self.queryset = Product.objects.all() if queryset is None else queryset
+        self.terms = query_terms(query)
+        self._count = None
+
+    def _match_sql(self):
+        if _vendor() == 'sqlite':
+            # префиксный поиск только по последнему слову (ввод «на лету»)
+            match = ' '.join(f'"{term}"' for term in self.terms) + '*'
+            sql = (
+                # CROSS JOIN фиксирует порядок: сначала FTS, затем товары по первичному ключу
+                f'FROM {SQLITE_TABLE} f CROSS JOIN store_product p ON p.id = f.rowid '
+                f'WHERE {SQLITE_TABLE} MATCH %s AND p.is_deleted = %s AND p.is_published = %s'
+            )
+            return sql, [match, False, True], 'f.rowid', SQLITE_RANK
+        tsquery = ' & '.join(self.terms) + ':*'
+        sql = (
+            f"FROM {POSTGRES_TABLE} s JOIN store_product p ON p.id = s.product_id "
+            f"WHERE s.document @@ to_tsquery('simple', %s) AND p.is_deleted = %s AND p.is_published = %s"
+        )
+        return sql, [tsquery, False, True], 's.product_id', "ts_rank(s.document, to_tsquery('simple', %s)) DESC"
+
+    def count(self):
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+            else:
+                sql, params, _, _ = self._match_sql()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) {sql}', params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ids(self, offset=0, limit=None):
+        if not self.terms:
+            return []
+        sql, params, id_column, order = self._match_sql()
+        order_params = [params[0]] if _vendor() == 'postgresql' else []
+        limit_sql = ''
+        limit_params = []
+        if limit is not None:
+            limit_sql = ' LIMIT %s OFFSET %s'
+            limit_params = [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {id_column} {sql} ORDER BY {order}, p.id DESC{limit_sql}',
+                params + order_params + limit_params,
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            limit = None if key.stop is None else max(0, key.stop - start)
+            ids = self.ids(start, limit)
+        else:
+            ids = self.ids(key, 1)
+            if not ids:
+                raise IndexError(key)
+        products = self.queryset.in_bulk(ids)
+        ordered = [products[pk] for pk in ids if pk in products]
+        return ordered if isinstance(key, slice) else ordered[0]
+
+
+def icontains_search(query, queryset=None):
+    """Запасной поиск без индекса: подстрока в любом названии или описании."""
+    condition = Q()
+    for term in query_terms(query):
+        term_q = Q()
+        for field in INDEXED_FIELDS:
+            term_q |= Q(**{f'{field}__icontains': term})
+        condition &= term_q
+    visible = _visible() if queryset is None else queryset.filter(is_deleted=False, is_published=True)
+    return visible.filter(condition).order_by('-created_at')
+
+
+def search_products(query, queryset=None):
+    """
+    Найти опубликованные товары по запросу, отсортированные по релевантности.
+    queryset — откуда загружать найденные товары (например, Product.objects.localized(lang)).
+    """
+    if not query_terms(query):
+        return Product.objects.none()
+    if is_indexed_backend():
+        return SearchResults(query, queryset)
+    return icontains_search(query, queryset)
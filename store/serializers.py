@@ -1,6 +1,45 @@
 from rest_framework import serializers
 from .models import Category, Product
 
+LANGUAGES = ('ru', 'kg', 'en')
+TRANSLATED_FIELDS = ('name', 'description')
+PRODUCT_FIELDS = ['id', 'name', 'name_ru', 'name_kg', 'name_en', 'description', 'description_ru', 'description_kg', 'description_en', 'price', 'stock', 'rating_avg', 'rating_count', 'category']
+
+
+def product_read_options(request):
+    """
+    Разобрать параметры чтения товаров:
+    ?fields=id,name,price — только перечисленные поля;
+    ?lang=ru|kg|en — name/description уже на нужном языке, без полей *_ru/_kg/_en.
+    Возвращает (fields, lang).
+    """
+    params = getattr(request, 'query_params', {}) if request is not None else {}
+    lang = params.get('lang')
+    if lang not in LANGUAGES:
+        lang = None
+    fields = PRODUCT_FIELDS
+    requested = params.get('fields')
+    if requested:
+        wanted = {f.strip() for f in requested.split(',')}
+        fields = [f for f in PRODUCT_FIELDS if f in wanted] or PRODUCT_FIELDS
+    if lang:
+        translations = {f'{base}_{code}' for base in TRANSLATED_FIELDS for code in LANGUAGES}
+        fields = [f for f in fields if f not in translations]
+    return fields, lang
+
+
+def localize(data, lang):
+    """Свернуть name_*/description_* в name/description на языке lang (с откатом на оригинал)."""
+    for base in TRANSLATED_FIELDS:
+        translated = None
+        for code in LANGUAGES:
+            value = data.pop(f'{base}_{code}', None)
+            if code == lang:
+                translated = value
+        if base in data and translated:
+            data[base] = translated
+    return data
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,9 +52,70 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'name_ru', 'name_kg', 'name_en', 'description', 'description_ru', 'description_kg', 'description_en', 'price', 'stock', 'category']
+        fields = PRODUCT_FIELDS
         read_only_fields = ['id']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        fields, lang = product_read_options(request)
+        self._lang = lang
+        keep = set(fields)
+        if lang:
+            # переводы нужны для свёртки, в ответ они не попадут
+            keep |= {f'{base}_{lang}' for base in TRANSLATED_FIELDS if base in keep}
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        lang = getattr(self, '_lang', None)
+        return localize(data, lang) if lang else data
+
+
+class ProductRowSerializer(serializers.BaseSerializer):
+    """
+    Быстрый путь чтения для списков: принимает dict из Product.objects.values(...)
+    (см. value_columns) и не создаёт экземпляры моделей. Формат ответа совпадает
+    с ProductSerializer, включая ?fields= и ?lang=.
+    """
+    price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
 
+    @staticmethod
+    def value_columns(fields, lang):
+        columns = ['id', 'created_at']  # created_at нужен курсору пагинации
+        for name in fields:
+            if name == 'category':
+                columns += ['category_id', 'category__name', 'category__slug']
+            elif name != 'id':
+                columns.append(name)
+                if lang and name in TRANSLATED_FIELDS:
+                    columns.append(f'{name}_{lang}')
+        return columns
 
+    def _options(self):
+        if not hasattr(self, '_read_options'):
+            self._read_options = product_read_options(self.context.get('request'))
+        return self._read_options
 
+    def to_representation(self, row):
+        fields, lang = self._options()
+        data = {}
+        for name in fields:
+            if name == 'category':
+                data['category'] = {
+                    'id': row['category_id'],
+                    'name': row['category__name'],
+                    'slug': row['category__slug'],
+                }
+            elif name == 'price':
+                data['price'] = self.price_field.to_representation(row['price'])
+            else:
+                data[name] = row[name]
+        if lang:
+            for base in TRANSLATED_FIELDS:
+                if base in data and row.get(f'{base}_{lang}'):
+                    data[base] = row[f'{base}_{lang}']
+        return data
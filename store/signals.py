@@ -0,0 +1,105 @@
+"""
+Сигналы моделей магазина: поддержка производных данных в актуальном состоянии.
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import catalog_cache, ledger, moderation, popularity, ratings, retrieval, rollups, search, thumbnails
+from .models import Favorite, ForbiddenTerm, ModerationVerdict, Order, Product, Review
+
+
+@receiver(post_init, sender=Product)
+def product_loaded(sender, instance, **kwargs):
+    # Запоминаем состояние, чтобы при сохранении понять, изменился ли каталог
+    instance._catalog_snapshot = catalog_cache.snapshot(instance) if instance.pk else None
+    instance._image_name = thumbnails.loaded_image(instance)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    # Переиндексируем только если могли измениться тексты
+    if update_fields is None or set(update_fields) & set(search.INDEXED_FIELDS):
+        search.index_product(instance)
+    if update_fields is None or set(update_fields) & set(retrieval.TRACKED_FIELDS):
+        retrieval.product_changed(instance.pk)
+    if update_fields is None or 'image' in update_fields:
+        thumbnails.image_saved(instance, getattr(instance, '_image_name', thumbnails.NOT_LOADED))
+    if created or catalog_cache.product_changed(instance, getattr(instance, '_catalog_snapshot', None)):
+        catalog_cache.invalidate()
+    instance._catalog_snapshot = catalog_cache.snapshot(instance)
+    instance._image_name = thumbnails.loaded_image(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+    retrieval.product_changed(instance.pk)
+    catalog_cache.invalidate()
+
+
+@receiver(post_init, sender=Order)
+def order_loaded(sender, instance, **kwargs):
+    instance._was_sold = instance.pk is not None and instance.status in rollups.SOLD_STATUSES
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    # Свёртку продаж и журнал продавцов меняет только переход в оплаченный статус или выход из него
+    is_sold = instance.status in rollups.SOLD_STATUSES
+    if is_sold != instance._was_sold:
+        rollups.apply_orders(Order.objects.filter(pk=instance.pk), sign=1 if is_sold else -1)
+        if is_sold:
+            ledger.record_order(instance)
+        else:
+            ledger.reverse_order(instance)
+        popularity.order_changed(instance.pk)
+    instance._was_sold = is_sold
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    # pre_delete: позиции заказа ещё на месте
+    if instance._was_sold:
+        rollups.apply_orders(Order.objects.filter(pk=instance.pk), sign=-1)
+        ledger.reverse_order(instance)
+        popularity.order_changed(instance.pk)
+
+
+@receiver(post_save, sender=ForbiddenTerm)
+@receiver(post_delete, sender=ForbiddenTerm)
+def forbidden_terms_changed(sender, **kwargs):
+    moderation.terms_changed()
+
+
+@receiver(post_delete, sender=ModerationVerdict)
+def moderation_verdict_deleted(sender, instance, **kwargs):
+    # иначе удалённый в админке вердикт ещё MODERATION_CACHE_TIMEOUT отдаётся из кэша
+    moderation.verdict_deleted(instance.content_hash)
+
+
+@receiver(post_init, sender=Review)
+def review_loaded(sender, instance, **kwargs):
+    instance._rated = ratings.counted(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    # рейтинг товара меняют одобрение, снятие одобрения, новая оценка или перенос к другому товару
+    rated = ratings.counted(instance)
+    if rated != instance._rated:
+        ratings.review_changed(instance._rated, rated)
+        popularity.touch([instance._rated and instance._rated[0], rated and rated[0]])
+    instance._rated = rated
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    if instance._rated:
+        ratings.review_changed(instance._rated, None)
+        popularity.touch([instance._rated[0]])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, **kwargs):
+    popularity.touch([instance.product_id])
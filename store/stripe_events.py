@@ -0,0 +1,164 @@
+"""
+Вебхуки Stripe: приём в журнал и асинхронная обработка.
+
+Вебхук только проверяет подпись, дописывает событие в StripeEvent (ключ — id
+события) и сразу отвечает 200; статусы меняет задача process_stripe_events.
+Повторные доставки одного события Stripe шлёт часами — они отсекаются меткой
+в кэше ещё до базы, а если кэш пуст, уникальным event_id.
+
+События одного платежа обрабатываются по порядку stripe_created. Ключ
+очереди (object_ref) у всех событий платежа один — PaymentIntent: события
+checkout.session несут его в поле payment_intent, charge.* — тоже; только
+сессия без PaymentIntent ставится под своим id. Если событие упало, следующие
+за ним ждут повтора. Событие, для которого платёж ещё не найден (например,
+payment_intent.succeeded пришёл раньше checkout.session.completed, который
+сохраняет PaymentIntent), остаётся необработанным, не задерживая остальные, —
+его подбирает задача process_pending_stripe_events (до MAX_ATTEMPTS попыток).
+Переходы статусов допускаются только вперёд (TRANSITIONS), поэтому повторная
+или запоздавшая обработка события ничего не ломает — на этом держится и
+replay_stripe_events.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+SEEN_KEY = 'stripe-event:{}'
+SEEN_TTL = 3 * 24 * 3600  # Stripe повторяет доставку до трёх суток
+MAX_ATTEMPTS = 20  # дальше событие повторяет только replay_stripe_events
+UNMATCHED = 'Платёж не найден'
+
+# событие -> статус платежа
+EVENT_STATUS = {
+    'checkout.session.completed': 'succeeded',
+    'checkout.session.async_payment_succeeded': 'succeeded',
+    'checkout.session.async_payment_failed': 'failed',
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.payment_failed': 'failed',
+    'charge.failed': 'failed',
+    'charge.refunded': 'refunded',
+}
+# новый статус платежа -> из каких статусов в него можно перейти
+TRANSITIONS = {
+    'succeeded': {'pending', 'failed'},
+    'failed': {'pending'},
+    'refunded': {'succeeded'},
+}
+# статус платежа -> статус заказа
+ORDER_STATUS = {
+    'succeeded': 'paid',
+    'refunded': 'cancelled',
+}
+
+
+def object_ref(event):
+    """Ключ очереди платежа: PaymentIntent события, а у сессии без него — id сессии."""
+    obj = event['data']['object']
+    if obj.get('object') == 'payment_intent':
+        return obj['id']
+    return obj.get('payment_intent') or obj['id']
+
+
+def ingest(event):
+    """
+    Записать проверенное событие в журнал и поставить обработку. Возвращает
+    False для повторной доставки — такой запрос не пишет в базу.
+    """
+    seen = SEEN_KEY.format(event['id'])
+    if not cache.add(seen, 1, SEEN_TTL):
+        return False
+    ref = object_ref(event)
+    try:
+        with transaction.atomic():
+            StripeEvent.objects.create(
+                event_id=event['id'], type=event['type'], object_ref=ref,
+                stripe_created=event['created'], payload=event,
+            )
+    except IntegrityError:
+        return False
+    except Exception:
+        # событие не записано — Stripe должен прислать его снова
+        cache.delete(seen)
+        raise
+    from .tasks import process_stripe_events
+    transaction.on_commit(lambda: process_stripe_events.delay(ref))
+    return True
+
+
+def set_payment_status(lookup, status, payment_intent=''):
+    """
+    Атомарно перевести платёж (Payment по Q lookup) в status и заказ — в
+    соответствующий статус. Недопустимый переход ничего не меняет.
+    Возвращает (payment или None, изменился ли статус).
+    """
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(lookup).first()
+        if payment is None:
+            return None, False
+        fields = []
+        if payment_intent and not payment.payment_intent:
+            payment.payment_intent = payment_intent
+            fields.append('payment_intent')
+        changed = payment.status in TRANSITIONS.get(status, ())
+        if changed:
+            payment.status = status
+            fields.append('status')
+        if fields:
+            payment.save(update_fields=fields + ['updated_at'])
+        if changed and status in ORDER_STATUS:
+            order = payment.order
+            order.status = ORDER_STATUS[status]
+            order.save(update_fields=['status'])  # save(): сигналы ведут свёртку продаж и журнал продавцов
+        if changed and status == 'succeeded':
+            from .tasks import send_order_confirmation, send_seller_notification
+            order_id = payment.order_id
+            transaction.on_commit(lambda: (send_order_confirmation.delay(order_id),
+                                           send_seller_notification.delay(order_id)))
+    return payment, changed
+
+
+def _handle(payload):
+    """Применить событие. False — платёж события не найден (событие нужно повторить позже)."""
+    status = EVENT_STATUS.get(payload['type'])
+    if status is None:
+        return True
+    obj = payload['data']['object']
+    if obj.get('object') == 'checkout.session':
+        if obj.get('payment_status') == 'unpaid' and status == 'succeeded':
+            return True  # отложенная оплата: дождёмся async_payment_succeeded
+        lookup, payment_intent = Q(stripe_id=obj['id']), obj.get('payment_intent') or ''
+    else:
+        lookup, payment_intent = Q(payment_intent=object_ref(payload)), ''
+    payment, _ = set_payment_status(lookup, status, payment_intent=payment_intent)
+    return payment is not None
+
+
+def process_pending(ref):
+    """Обработать по порядку необработанные события платежа ref. Возвращает число обработанных."""
+    processed = 0
+    events = StripeEvent.objects.filter(object_ref=ref, processed_at__isnull=True).order_by('stripe_created', 'pk')
+    for event in events:
+        try:
+            with transaction.atomic():
+                # событие могла уже забрать параллельная задача
+                if not StripeEvent.objects.select_for_update().filter(pk=event.pk, processed_at__isnull=True).exists():
+                    continue
+                if not _handle(event.payload):
+                    # не ошибка: платёж появится с другим событием, порядок остальных не нарушается
+                    StripeEvent.objects.filter(pk=event.pk).update(attempts=F('attempts') + 1, last_error=UNMATCHED)
+                    continue
+                StripeEvent.objects.filter(pk=event.pk).update(
+                    processed_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+                )
+            processed += 1
+        except Exception as e:
+            StripeEvent.objects.filter(pk=event.pk).update(attempts=F('attempts') + 1, last_error=str(e)[:1000])
+            logger.error(f"Событие Stripe {event.event_id} не обработано: {e}")
+            break  # порядок важнее: следующие события платежа ждут повтора
+    return processed
@@ -12,6 +12,8 @@ class Payment(models.Model):
     
     order = models.OneToOneField('Order', on_delete=models.CASCADE, related_name='payment')
     stripe_id = models.CharField(max_length=255, unique=True)
+    # PaymentIntent сессии: события payment_intent.* / charge.* ссылаются на него, а не на stripe_id
+    payment_intent = models.CharField(max_length=255, blank=True, db_index=True)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
     method = models.CharField(max_length=50, default='card')  # card, wallet, etc
@@ -20,3 +22,30 @@ class Payment(models.Model):
     
     def __str__(self):
         return f"Payment {self.stripe_id} for Order #{self.order.id}"
+
+
+class StripeEvent(models.Model):
+    """
+    Журнал входящих событий Stripe (store/stripe_events.py). event_id уникален —
+    повторные доставки одного события не записываются и не обрабатываются дважды.
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    # платёж, к которому относится событие (PaymentIntent, у сессии без него — id сессии):
+    # события одного платежа обрабатываются по порядку stripe_created
+    object_ref = models.CharField(max_length=255)
+    stripe_created = models.BigIntegerField()
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['object_ref', 'stripe_created'], name='stripe_event_pending_idx',
+                         condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} ({self.type})"
@@ -8,6 +8,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from .models import Payment, Order
+from . import stripe_events
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
 
@@ -53,12 +54,15 @@ def create_checkout_session(request, order_id):
 @csrf_exempt
 @require_POST
 def stripe_webhook(request):
-    """Вебхук от Stripe для обновления статуса платежей"""
+    """
+    Вебхук от Stripe: проверить подпись, записать событие в журнал и сразу ответить.
+    Статусы платежей меняет задача process_stripe_events (см. store/stripe_events.py)
+    """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
         )
     except ValueError:
@@ -66,28 +70,7 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError:
         return JsonResponse({'error': 'Invalid signature'}, status=400)
     
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        try:
-            payment = Payment.objects.get(stripe_id=session.id)
-            payment.status = 'succeeded'
-            payment.save()
-            
-            order = payment.order
-            order.status = 'paid'
-            order.save()
-        except Payment.DoesNotExist:
-            pass
-    
-    elif event['type'] == 'charge.failed':
-        charge = event['data']['object']
-        try:
-            payment = Payment.objects.get(stripe_id=charge.payment_intent)
-            payment.status = 'failed'
-            payment.save()
-        except Payment.DoesNotExist:
-            pass
-    
+    stripe_events.ingest(json.loads(payload))
     return JsonResponse({'status': 'success'})
 
 
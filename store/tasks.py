@@ -2,31 +2,50 @@
 Celery задачи для асинхронных операций
 """
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from .models import Order, Cart, Review, Product
+from .models import Order
+from . import outbox
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _kick_outbox():
+    # Письма уходят порциями: небольшая задержка собирает письма одной волны в одну порцию
+    drain_email_outbox.apply_async(countdown=settings.EMAIL_OUTBOX_KICK_DELAY)
+
+
+@shared_task
+def drain_email_outbox():
+    """Отправить письма из очереди (store/outbox.py) порциями через общее соединение"""
+    stats = outbox.drain()
+    if stats['batches']:
+        logger.info(f"Очередь писем: отправлено {stats['sent']}, на повтор {stats['retried']}, "
+                    f"с ошибкой {stats['failed']}, порций {stats['batches']}")
+    return stats
+
+
 @shared_task
 def send_pending_emails():
-    """Отправка ожидающих email уведомлений"""
+    """Поставить в очередь письма о новых заказах (каждое — один раз, по ключу идемпотентности)"""
     try:
         # Пример: отправить email о новом заказе
-        orders = Order.objects.filter(status='new').order_by('-created_at')[:10]
-        for order in orders:
-            if order.user and order.user.email:
-                send_mail(
-                    f'Заказ #{order.id} получен',
-                    f'Ваш заказ на сумму {order.total_amount} сом принят в обработку.',
-                    'noreply@storehub.kg',
-                    [order.user.email],
-                    fail_silently=False,
-                )
-        logger.info(f"Отправлено {len(orders)} email уведомлений")
+        orders = (
+            Order.objects.filter(status='new', created_at__gte=timezone.now() - timedelta(days=1), user__isnull=False)
+            .exclude(user__email='').select_related('user')
+        )
+        outbox.enqueue_many([
+            (
+                f'order-received:{order.id}',
+                f'Заказ #{order.id} получен',
+                f'Ваш заказ на сумму {order.total_amount} сом принят в обработку.',
+                [order.user.email],
+            )
+            for order in orders
+        ])
+        drain_email_outbox.delay()
     except Exception as e:
         logger.error(f"Ошибка при отправке email: {e}")
 
@@ -42,7 +61,8 @@ def send_order_confirmation(order_id):
                 for item in order.items.all()
             ])
             
-            send_mail(
+            outbox.enqueue(
+                f'order-confirmation:{order.id}',
                 f'Подтверждение заказа #{order.id}',
                 f'''Спасибо за заказ!
 
@@ -54,42 +74,72 @@ def send_order_confirmation(order_id):
 Статус: {order.get_status_display()}
 
 Мы свяжемся с вами в течение часа.''',
-                'noreply@storehub.kg',
                 [order.user.email],
-                fail_silently=False,
             )
-            logger.info(f"Подтверждение заказа {order_id} отправлено")
+            _kick_outbox()
+            logger.info(f"Подтверждение заказа {order_id} поставлено в очередь")
     except Order.DoesNotExist:
         logger.error(f"Заказ {order_id} не найден")
 
 
 @shared_task
 def send_seller_notification(order_id):
-    """Уведомить продавца о новом заказе"""
-    try:
-        order = Order.objects.get(id=order_id)
-        
-        # Группировать товары по продавцам
-        sellers = {}
-        for item in order.items.all():
-            if item.product.owner:
-                if item.product.owner not in sellers:
-                    sellers[item.product.owner] = []
-                sellers[item.product.owner].append(item)
-        
-        # Отправить уведомления
-        for seller, items in sellers.items():
-            if seller.email:
-                items_text = '\n'.join([
-                    f"- {item.name} x{item.quantity}"
-                    for item in items
-                ])
-                
-                send_mail(
-                    f'Новый заказ #{order.id}',
-                    f'''У вас новый заказ!
-
-Заказ: {order.id}
+    """
+    Уведомить продавцов о новом заказе. Продавцы заказа — один запрос; каждому
+    пишется отметка SellerNotification и ставится отдельная задача-дайджест.
+    Заказы, пришедшие продавцу за SELLER_DIGEST_WINDOW секунд, уходят одним письмом.
+    """
+    from django.core.cache import cache
+    from .models import OrderItem, SellerNotification
+
+    seller_ids = list(
+        OrderItem.objects.filter(order_id=order_id, product__owner__isnull=False)
+        .exclude(product__owner__email='')
+        .order_by().values_list('product__owner_id', flat=True).distinct()
+    )
+    if not seller_ids:
+        logger.info(f"У заказа {order_id} нет продавцов для уведомления")
+        return
+    SellerNotification.objects.bulk_create(
+        [SellerNotification(seller_id=seller_id, order_id=order_id) for seller_id in seller_ids],
+        ignore_conflicts=True,
+    )
+    window = settings.SELLER_DIGEST_WINDOW
+    for seller_id in seller_ids:
+        # первый заказ в окне ставит дайджест, остальные к нему присоединяются
+        if cache.add(f'seller-digest:{seller_id}', 1, window):
+            send_seller_digest.apply_async((seller_id,), countdown=window)
+    logger.info(f"Уведомления продавцам для заказа {order_id} поставлены в очередь")
+
+
+@shared_task
+def send_seller_digest(seller_id):
+    """Одно письмо продавцу обо всех его заказах, накопленных за окно"""
+    from django.db import transaction
+    from .models import OrderItem, SellerNotification
+
+    with transaction.atomic():
+        pending = list(
+            SellerNotification.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(seller_id=seller_id, sent_at__isnull=True)
+            .select_related('seller', 'order').order_by('order_id')
+        )
+        if not pending:
+            return
+        items = {}
+        for item in OrderItem.objects.filter(
+            order_id__in=[n.order_id for n in pending], product__owner_id=seller_id,
+        ).order_by('order_id', 'pk'):
+            items.setdefault(item.order_id, []).append(item)
+
+        blocks = []
+        for notification in pending:
+            order = notification.order
+            items_text = '\n'.join([
+                f"- {item.name} x{item.quantity}"
+                for item in items.get(order.id, [])
+            ])
+            blocks.append(f'''Заказ: {order.id}
 Ваши товары:
 {items_text}
 
@@ -97,49 +147,109 @@ def send_seller_notification(order_id):
 Имя: {order.full_name}
 Email: {order.email}
 Телефон: {order.phone}
-Адрес: {order.address}''',
-                    'noreply@storehub.kg',
-                    [seller.email],
-                    fail_silently=False,
-                )
-        logger.info(f"Уведомления продавцам для заказа {order_id} отправлены")
-    except Order.DoesNotExist:
-        logger.error(f"Заказ {order_id} не найден")
+Адрес: {order.address}''')
+        if len(pending) == 1:
+            subject, intro = f'Новый заказ #{pending[0].order_id}', 'У вас новый заказ!'
+        else:
+            subject, intro = f'Новые заказы: {len(pending)}', f'У вас {len(pending)} новых заказов!'
+        outbox.enqueue(
+            f'seller-digest:{seller_id}:{pending[0].pk}',
+            subject,
+            intro + '\n\n' + '\n\n'.join(blocks),
+            [pending[0].seller.email],
+        )
+        SellerNotification.objects.filter(pk__in=[n.pk for n in pending]).update(sent_at=timezone.now())
+    _kick_outbox()
+    logger.info(f"Дайджест продавцу {seller_id}: заказов {len(pending)}")
+
+
+@shared_task
+def flush_seller_digests():
+    """Страховка: отправить дайджесты, окно которых прошло, а задача не выполнилась"""
+    from .models import SellerNotification
+
+    cutoff = timezone.now() - timedelta(seconds=settings.SELLER_DIGEST_WINDOW * 2)
+    seller_ids = (
+        SellerNotification.objects.filter(sent_at__isnull=True, created_at__lt=cutoff)
+        .order_by().values_list('seller_id', flat=True).distinct()
+    )
+    for seller_id in seller_ids:
+        send_seller_digest.delay(seller_id)
+
+
+@shared_task
+def moderate_product(product_id):
+    """AI-модерация товара, сохранённого со статусом pending"""
+    from .moderation import PENDING, moderate_product as run
+
+    status = run(product_id)
+    if status == PENDING:
+        logger.warning(f"AI-модерация товара {product_id} не удалась, повтор через {settings.MODERATION_RETRY_DELAY} с")
+        moderate_product.apply_async((product_id,), countdown=settings.MODERATION_RETRY_DELAY)
+    elif status:
+        logger.info(f"Товар {product_id} прошёл модерацию: {status}")
+
+
+@shared_task
+def generate_thumbnails(product_id):
+    """Уменьшенные копии фото товара для srcset (store/thumbnails.py)"""
+    from .thumbnails import generate
+
+    key = generate(product_id)
+    if key:
+        logger.info(f"Копии фото товара {product_id} готовы: {key}")
 
 
 @shared_task
 def cleanup_old_carts():
-    """Удалить старые заброшенные корзины"""
+    """Удалить старые заброшенные корзины порциями (см. carts.purge_old_carts)"""
+    from .carts import purge_old_carts
+
+    def report(stats):
+        rate = stats['carts'] / stats['seconds'] if stats['seconds'] else 0
+        logger.info(
+            f"Очистка корзин: порция {stats['batches']}, удалено {stats['carts']} корзин "
+            f"и {stats['items']} позиций, id <= {stats['last_pk']}, {rate:.0f} корзин/с"
+        )
+
     try:
-        # Удалить корзины старше 30 дней
-        cutoff_date = timezone.now() - timedelta(days=30)
-        old_carts = Cart.objects.filter(created_at__lt=cutoff_date)
-        count = old_carts.count()
-        old_carts.delete()
-        logger.info(f"Удалено {count} старых корзин")
+        now = timezone.now()
+        stats = purge_old_carts(
+            cutoff=now - timedelta(days=settings.CART_CLEANUP_DAYS),
+            backup_cutoff=now - timedelta(days=settings.CART_CLEANUP_BACKUP_DAYS),
+            batch_size=settings.CART_CLEANUP_BATCH_SIZE,
+            sleep=settings.CART_CLEANUP_SLEEP,
+            progress=report,
+        )
+        logger.info(f"Удалено {stats['carts']} старых корзин за {stats['seconds']:.1f} с")
+        return stats
     except Exception as e:
         logger.error(f"Ошибка при удалении корзин: {e}")
 
 
+@shared_task
+def merge_guest_cart(session_key, user_id):
+    """Слить гостевую корзину в корзину пользователя после входа (в фоне)"""
+    from django.contrib.auth import get_user_model
+    from .carts import merge_session_cart
+
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        logger.error(f"Пользователь {user_id} не найден, корзина {session_key} не объединена")
+        return
+    merge_session_cart(session_key, user)
+    logger.info(f"Гостевая корзина {session_key} объединена с корзиной пользователя {user_id}")
+
+
 @shared_task
 def generate_daily_report():
-    """Генерировать ежедневный отчет о продажах"""
+    """Генерировать ежедневный отчет о продажах (из свёртки DailySales)"""
     try:
-        from django.db.models import Sum, Count
-        from datetime import date
-        
-        today = date.today()
-        orders_today = Order.objects.filter(
-            created_at__date=today,
-            status='paid'
-        )
-        
-        stats = {
-            'orders_count': orders_today.count(),
-            'total_revenue': orders_today.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
-            'products_sold': sum([item.quantity for order in orders_today for item in order.items.all()]),
-        }
-        
+        from .rollups import sales_report
+
+        today = timezone.localdate()
+        stats = sales_report(today, today)
+
         logger.info(f"Ежедневный отчет {today}: {stats}")
         
         # Можно отправить на email admin
@@ -152,33 +262,50 @@ def generate_daily_report():
 def process_payment_callback(payment_id, status):
     """Обработать платежный callback от Stripe"""
     try:
-        from .models import Payment
-        payment = Payment.objects.get(stripe_id=payment_id)
-        payment.status = status
-        payment.save()
-        
-        if status == 'succeeded':
-            payment.order.status = 'paid'
-            payment.order.save()
-            
-            # Отправить подтверждение
-            send_order_confirmation.delay(payment.order.id)
-            send_seller_notification.delay(payment.order.id)
-        
-        logger.info(f"Платеж {payment_id} обновлен: {status}")
+        from django.db.models import Q
+        from .stripe_events import set_payment_status
+
+        payment, changed = set_payment_status(Q(stripe_id=payment_id), status)
+        if payment is None:
+            logger.error(f"Платеж {payment_id} не найден")
+        elif changed:
+            logger.info(f"Платеж {payment_id} обновлен: {status}")
     except Exception as e:
         logger.error(f"Ошибка при обработке платежа: {e}")
 
 
+@shared_task
+def process_stripe_events(object_ref):
+    """Обработать события Stripe одного платежа по порядку"""
+    from .stripe_events import process_pending
+    return process_pending(object_ref)
+
+
+@shared_task
+def process_pending_stripe_events():
+    """Страховка: обработать события, для которых задача не выполнилась, упала или платёж ещё не был найден"""
+    from .models import StripeEvent
+    from .stripe_events import MAX_ATTEMPTS
+
+    cutoff = timezone.now() - timedelta(minutes=1)
+    refs = (
+        StripeEvent.objects.filter(processed_at__isnull=True, received_at__lt=cutoff, attempts__lt=MAX_ATTEMPTS)
+        .order_by().values_list('object_ref', flat=True).distinct()
+    )
+    for ref in refs:
+        process_stripe_events.delay(ref)
+
+
 @shared_task
 def update_product_popularity():
-    """Обновить популярность товаров (для рейтинга)"""
-    try:
-        # Увеличить счетчик просмотров или продаж
-        products = Product.objects.filter(is_deleted=False)
-        logger.info(f"Обновлена популярность {products.count()} товаров")
-    except Exception as e:
-        logger.error(f"Ошибка при обновлении популярности: {e}")
+    """Пересчитать популярность товаров, у которых были события (store/popularity.py)"""
+    from . import popularity
+
+    stats = popularity.update()
+    if stats:
+        logger.info(f"Популярность обновлена у {stats['products']} товаров (просмотров {stats['views']}, "
+                    f"полный пересчёт: {stats['full']}) за {stats['seconds']:.1f} с")
+    return stats
 
 
 @shared_task
@@ -191,7 +318,8 @@ def send_review_reminder(order_id):
         # Проверить что достаточно времени прошло
         if (timezone.now() - order.created_at).days >= 3:
             if order.user and order.user.email:
-                send_mail(
+                outbox.enqueue(
+                    f'review-reminder:{order.id}',
                     'Оставьте отзыв о вашей покупке',
                     f'''Привет {order.user.first_name}!
 
@@ -199,27 +327,9 @@ def send_review_reminder(order_id):
 Ваши отзывы помогают улучшать качество.
 
 Оставить отзыв: https://storehub.kg/orders/{order_id}/reviews/''',
-                    'noreply@storehub.kg',
                     [order.user.email],
-                    fail_silently=False,
                 )
-        logger.info(f"Напоминание об отзыве для заказа {order_id} отправлено")
+                _kick_outbox()
+        logger.info(f"Напоминание об отзыве для заказа {order_id} поставлено в очередь")
     except Order.DoesNotExist:
         logger.error(f"Заказ {order_id} не найден")
-
-
-# Периодическая задача для Celery Beat
-app.conf.beat_schedule = {
-    'send-emails-every-15-min': {
-        'task': 'store.tasks.send_pending_emails',
-        'schedule': 900.0,  # 15 минут в секундах
-    },
-    'cleanup-carts-daily': {
-        'task': 'store.tasks.cleanup_old_carts',
-        'schedule': 86400.0,  # 24 часа
-    },
-    'daily-report': {
-        'task': 'store.tasks.generate_daily_report',
-        'schedule': 86400.0,
-    },
-}
@@ -0,0 +1,29 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image(product, sizes, alt='', **attrs):
+    """
+    Фото товара с адаптивными копиями:
+        {% product_image product "(max-width: 768px) 50vw, 20vw" alt=product.display_name style="..." %}
+    Есть копии — <picture> с WebP и JPEG в srcset, браузер сам выбирает ширину;
+    нет — исходное фото, как раньше.
+    """
+    attrs.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    if not product.thumbnail_widths:  # копий нет, ещё делаются или не получились (thumbnails.FAILED)
+        return format_html('<img src="{}" alt="{}"{}>', product.image.url, alt, extra)
+    largest = product.thumbnail_widths.rsplit(',', 1)[-1]
+    return format_html(
+        '<picture style="display:contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>'
+        '</picture>',
+        thumbnails.srcset(product, 'webp'), sizes,
+        thumbnails.url(product, int(largest), 'jpg'), thumbnails.srcset(product, 'jpg'), sizes, alt, extra,
+    )
@@ -0,0 +1,158 @@
+"""
+Поиск запрещённых терминов в тексте товара: автомат Ахо — Корасик.
+
+Текст и термины приводятся к одному виду (normalize): регистр, диакритика,
+невидимые символы и «двойники» — буквы другого алфавита и символы (@, $, 0),
+которыми заменяют буквы, чтобы обойти фильтр. Двойники приводятся к алфавиту
+своего слова: в «vоdka» с кириллической «о» она становится латинской, в
+«вoдка» с латинской «o» — кириллической. Слова не транслитерируются, поэтому
+латинский термин совпадает только с латинским словом, а кириллический — с
+кириллическим: «drug» не находится в «друг». Кыргызские ң, ө, ү сводятся к
+н, о, у — термины ru/kg пишутся одним алфавитом, и слова, общие для обоих
+языков (как «сыра» — «пиво» по-кыргызски), в список не вносят.
+Автомат строится один раз и находит все термины за один проход по тексту,
+независимо от их числа. Совпадение засчитывается только на границе слова;
+термин с '*' на конце — префикс слова («наркот*» ловит «наркотики»).
+
+transliterate — для поиска (store/retrieval.py), где «velosiped» должен
+находить «велосипед»; для запрещённых терминов он не годится.
+"""
+import re
+import unicodedata
+from collections import deque, namedtuple
+
+Match = namedtuple('Match', 'term start end')
+
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+# латинские и кириллические буквы, которые выглядят одинаково (после casefold)
+_HOMOGLYPHS = dict(zip('abcehkmoptxy', 'авсенкмортху'))
+# символы вместо букв: (латинская, кириллическая)
+_SYMBOLS = {'@': ('a', 'а'), '$': ('s', 'с'), '0': ('o', 'о')}
+_CYRILLIC_HOMOGLYPHS = {c: l for l, c in _HOMOGLYPHS.items()}
+
+
+def _fold_table(to_cyrillic, number):
+    mapping = dict(_HOMOGLYPHS if to_cyrillic else _CYRILLIC_HOMOGLYPHS)
+    for symbol, letters in _SYMBOLS.items():
+        if not (number and symbol == '0'):  # в «200г» ноль — цифра
+            mapping[symbol] = letters[to_cyrillic]
+    return str.maketrans(mapping)
+
+
+# (к кириллице?, в слове есть другие цифры?) -> таблица
+_FOLD = {(c, n): _fold_table(c, n) for c in (False, True) for n in (False, True)}
+# мягкий перенос и символы нулевой ширины вставляют внутрь слов — удаляем
+_INVISIBLE = {'\u00ad': '', '\u200b': '', '\u200c': '', '\u200d': '', '\u2060': '', '\ufeff': ''}
+_TABLE = str.maketrans({
+    **_INVISIBLE,
+    **{chr(c): '' for c in range(0x300, 0x370)},  # комбинируемые диакритические знаки (ё -> е, й -> и)
+    'ң': 'н', 'ө': 'о', 'ү': 'у',  # кыргызские буквы
+})
+_TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+_WORD_RE = re.compile(r'[\w@$]+')
+
+
+def _is_latin(ch):
+    return 'a' <= ch <= 'z'
+
+
+def _is_cyrillic(ch):
+    return 'а' <= ch <= 'я'
+
+
+def _fold_word(match):
+    """Привести двойники в слове к его алфавиту: по буквам, которых нет в другом алфавите, иначе по большинству."""
+    word = match.group()
+    latin = sum(1 for ch in word if _is_latin(ch))
+    cyrillic = sum(1 for ch in word if _is_cyrillic(ch))
+    if not latin and not cyrillic:
+        return word  # число или одни символы
+    own_latin = sum(1 for ch in word if _is_latin(ch) and ch not in _HOMOGLYPHS)
+    own_cyrillic = sum(1 for ch in word if _is_cyrillic(ch) and ch not in _CYRILLIC_HOMOGLYPHS)
+    to_cyrillic = own_cyrillic > own_latin if own_cyrillic != own_latin else cyrillic > latin
+    number = any(ch.isdigit() and ch != '0' for ch in word)
+    return word.translate(_FOLD[to_cyrillic, number])
+
+
+def normalize(text):
+    """Привести текст к виду, в котором ищутся термины."""
+    # NFKD раскладывает и «широкие»/стилизованные буквы, и диакритику, которую убирает таблица
+    text = unicodedata.normalize('NFKD', text).casefold().translate(_TABLE)
+    return _WORD_RE.sub(_fold_word, text)
+
+
+def transliterate(text):
+    """normalize и кириллица латиницей — для поиска, где алфавит запроса не важен."""
+    return normalize(text).translate(_TRANSLIT_TABLE)
+
+
+class TermMatcher:
+    def __init__(self, terms):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for term in terms:
+            prefix = term.endswith('*')
+            key = normalize(term.rstrip('*')).strip()
+            if key:
+                self._add(key, (len(key), prefix, term))
+        self._link()
+
+    def _add(self, key, output):
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node] += (output,)
+
+    def _link(self):
+        # суффиксные ссылки обходом в ширину; выходы узла дополняются выходами его ссылки
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+
+    def __len__(self):
+        return sum(1 for outputs in self._out if outputs)
+
+    def finditer(self, text):
+        """Все совпадения на границах слов; позиции — в нормализованном тексте."""
+        text = normalize(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        size = len(text)
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            for length, prefix, term in out[node]:
+                start = i - length + 1
+                if start and text[start - 1].isalnum():
+                    continue
+                if not prefix and i + 1 < size and text[i + 1].isalnum():
+                    continue
+                yield Match(term, start, i + 1)
+
+    def search(self, text):
+        """Первое совпадение или None."""
+        return next(self.finditer(text), None)
@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .carts import merge_session_cart, purge_old_carts
+from .inventory import OrderLine, place_order
+from . import outbox
+from .models import Cart, CartItem, Category, DailySales, DailySalesRollup, Order, OrderItem, OutgoingEmail, Product
+from .models import Favorite, ForbiddenTerm, ModerationVerdict, Payment, Review, SellerNotification, StripeEvent, TranslationMemory
+from .pagination import encode_cursor, paginate
+from .stripe_events import process_pending
+from .term_matcher import TermMatcher
+from .translation import Translator, fill_from_source, translate_products
+from .utils.translate import translate_text
+from . import chat, moderation, popularity, ratings, retrieval, thumbnails, translation_memory
+from .tasks import process_pending_stripe_events, send_seller_digest, send_seller_notification
+from .rollups import rebuild, sales_breakdown, sales_report
+from .search import search_products
+
+
+def _product(stock=5, **kwargs):
+    category, _ = Category.objects.get_or_create(name='Test', slug='test')
+    defaults = dict(category=category, name='Hot product', slug=f'hot-{Product.objects.count()}',
+                    price=100, stock=stock, is_published=True)
+    defaults.update(kwargs)
+    return Product.objects.create(**defaults)
+
+
+class SearchIndexTests(TestCase):
+    def search(self, query):
+        return [p.name for p in search_products(query)[:10]]
+
+    def test_ranks_name_matches_first_and_skips_hidden_products(self):
+        _product(name='Чехол для телефона', description='Подходит к велосипеду')
+        _product(name='Горный велосипед')
+        _product(name='Велосипед детский', is_published=False)
+        _product(name='Велосипед старый', is_deleted=True)
+        # совпадение в названии выше совпадения в описании; последнее слово — префикс
+        self.assertEqual(self.search('велосипед'), ['Горный велосипед', 'Чехол для телефона'])
+        self.assertEqual(self.search('вело'), ['Горный велосипед', 'Чехол для телефона'])
+        self.assertEqual(self.search('чехол велосипед'), ['Чехол для телефона'])
+        self.assertEqual(search_products('велосипед').count(), 2)
+        self.assertEqual(self.search('подходит'), ['Чехол для телефона'])
+
+    def test_index_follows_saves_deletes_and_rebuild(self):
+        product = _product(name='Самокат')
+        product.name = 'Электросамокат'
+        product.name_en = 'Scooter'
+        product.save()
+        self.assertEqual(self.search('самокат'), [])
+        self.assertEqual(self.search('scooter'), ['Электросамокат'])
+
+        product.delete()
+        self.assertEqual(self.search('scooter'), [])
+
+        other = _product(name='Палатка')
+        Product.objects.filter(pk=other.pk).update(name='Шатёр')  # update() обходит сигналы
+        self.assertEqual(self.search('шатёр'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('шатёр'), ['Шатёр'])
+
+
+@override_settings(CATALOG_CACHE_ENABLED=True)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_product_changes_invalidate_cached_grids(self):
+        product = _product(name='Палатка')
+        self.assertContains(self.client.get('/'), 'Палатка')
+        self.assertContains(self.client.get('/products/'), 'Палатка')
+
+        Product.objects.filter(pk=product.pk).update(name='Шатёр')  # в обход сигналов — кэш не знает
+        self.assertContains(self.client.get('/products/'), 'Палатка')
+
+        product = Product.objects.get(pk=product.pk)
+        product.description = 'В сетке не показывается'
+        product.save()
+        self.assertContains(self.client.get('/products/'), 'Палатка')  # поля вне сетки кэш не сбрасывают
+
+        product.price = 150
+        product.save()
+        for url in ('/', '/products/'):
+            response = self.client.get(url)
+            self.assertContains(response, 'Шатёр')
+            self.assertContains(response, '150')
+
+        _product(name='Гамак')
+        self.assertContains(self.client.get('/products/'), 'Гамак')
+
+    def test_only_bounded_pages_are_cached(self):
+        for i in range(20):
+            _product(name=f'Товар {i}')
+        with mock.patch('store.catalog_cache.cache.set', wraps=cache.set) as cache_set:
+            cursors = {}
+            for sort in ('rating', 'new'):
+                first = self.client.get(f'/products/?sort={sort}&page=999999').context['product_grid']
+                cursors[sort] = re.search(r'cursor=([\w-]+)', first).group(1)
+                self.client.get(f'/products/?sort={sort}&cursor={cursors[sort]}')
+            forged = encode_cursor({'created_at': timezone.now(), 'id': 10 ** 6})
+            self.client.get(f'/products/?cursor={forged}')
+            self.client.get(f'/products/?sort=rating&cursor={cursors["new"]}')  # курсор другой сортировки
+        keys = [call.args[0] for call in cache_set.call_args_list if call.args[0].startswith('catalog:')]
+        # ?page= больше не участвует, выдуманный или чужой курсор в кэш не попадает
+        self.assertEqual([key.split(':', 2)[2] for key in keys],
+                         ['list-rating:ru:first', f'list-rating:ru:{cursors["rating"]}',
+                          'list-new:ru:first', f'list-new:ru:{cursors["new"]}'])
+
+    @override_settings(CATALOG_CACHE_ENABLED=False)
+    def test_disabled_without_shared_cache(self):
+        product = _product(name='Палатка')
+        self.client.get('/products/')
+        Product.objects.filter(pk=product.pk).update(name='Шатёр')
+        self.assertContains(self.client.get('/products/'), 'Шатёр')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        products = [_product(name=f'Товар {i}') for i in range(7)]
+        # одинаковое время у части товаров: порядок внутри — по id
+        Product.objects.filter(pk__in=[p.pk for p in products[2:5]]).update(created_at=products[2].created_at)
+        self.order = list(Product.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def test_next_pages_are_stable_when_products_are_added(self):
+        first = paginate(Product.objects.all(), None, 3)
+        self.assertEqual([p.pk for p in first], self.order[:3])
+        _product(name='Новый')  # появился после показа первой страницы
+        second = paginate(Product.objects.all(), first.next_cursor, 3)
+        third = paginate(Product.objects.all(), second.next_cursor, 3)
+        self.assertEqual([p.pk for p in second] + [p.pk for p in third], self.order[3:])
+        self.assertFalse(third.has_next())
+
+        back = paginate(Product.objects.all(), second.previous_cursor, 3)
+        self.assertEqual([p.pk for p in back], self.order[:3])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        for cursor in ('garbage', encode_cursor({'created_at': timezone.now(), 'id': 1}).upper(), '%%%'):
+            self.assertEqual([p.pk for p in paginate(Product.objects.all(), cursor, 3)], self.order[:3])
+        response = self.client.get('/products/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Товар 6', response.context['product_grid'])
+
+    def test_sorted_catalog_pages_by_cursor_with_ties(self):
+        for i in range(7, 20):
+            _product(name=f'Товар {i}')  # больше одной страницы каталога
+        # популярность с повторами: внутри равных значений порядок по id
+        for i, product in enumerate(Product.objects.order_by('pk')):
+            Product.objects.filter(pk=product.pk).update(popularity=i // 3)
+        ordering = ('-popularity', '-id')
+        expected = list(Product.objects.order_by(*ordering).values_list('pk', flat=True))
+        first = paginate(Product.objects.all(), None, 3, ordering)
+        second = paginate(Product.objects.all(), first.next_cursor, 3, ordering)
+        third = paginate(Product.objects.all(), second.next_cursor, 3, ordering)
+        self.assertEqual([p.pk for page in (first, second, third) for p in page], expected[:9])
+        back = paginate(Product.objects.all(), third.previous_cursor, 3, ordering)
+        self.assertEqual([p.pk for p in back], expected[3:6])
+
+        names, pages = [], 0
+        url = '/products/?sort=popular'
+        while url:
+            grid = self.client.get(url).context['product_grid']
+            names += dict.fromkeys(re.findall(r'Товар \d+', grid))
+            pages += 1
+            link = re.search(r'href="(\?sort=popular&cursor=[\w-]+)">Далее', grid)
+            url = '/products/' + link.group(1) if link else None
+        self.assertEqual(pages, 2)
+        self.assertEqual(names, [Product.objects.get(pk=pk).name for pk in expected])
+
+    def test_api_follows_next_links(self):
+        seen = []
+        url = '/api/products/?page_size=3&fields=id'
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, self.order)
+        self.assertEqual(self.client.get('/api/products/?cursor=garbage&page_size=3&fields=id').json()['results'],
+                         [{'id': pk} for pk in self.order[:3]])
+
+
+class ProductApiTests(TestCase):
+    def setUp(self):
+        self.product = _product(name='Велосипед', name_ru='Велосипед', name_kg='Велосипед kg', name_en='Bicycle',
+                                description='Горный', description_en='Mountain', price='1234.50')
+
+    def _pair(self, query=''):
+        listed = self.client.get(f'/api/products/?{query}').json()['results']
+        detail = self.client.get(f'/api/products/{self.product.pk}/?{query}').json()
+        return listed[0], detail
+
+    def test_list_rows_match_full_serializer(self):
+        listed, detail = self._pair()
+        self.assertEqual(listed, detail)
+        self.assertEqual(listed['price'], '1234.50')
+        self.assertEqual(listed['category'], {'id': self.product.category_id, 'name': 'Test', 'slug': 'test'})
+
+    def test_fields_and_lang_options(self):
+        listed, detail = self._pair('fields=id,name,description,price&lang=en')
+        self.assertEqual(listed, detail)
+        self.assertEqual(listed, {'id': self.product.pk, 'name': 'Bicycle', 'description': 'Mountain',
+                                  'price': '1234.50'})
+        # перевода нет — остаётся оригинал
+        listed, detail = self._pair('fields=description&lang=kg')
+        self.assertEqual(listed, detail)
+        self.assertEqual(listed, {'description': 'Горный'})
+        # неизвестные поля и язык игнорируются
+        listed, detail = self._pair('fields=nope&lang=xx')
+        self.assertEqual(listed, detail)
+        self.assertIn('name_en', listed)
+
+
+class PlaceOrderTests(TestCase):
+    def test_reserves_whole_cart_and_reports_failed_lines(self):
+        ok = _product(stock=3)
+        short = _product(stock=1)
+        cart = Cart.objects.create(session_key='s', item_count=4, total_amount=400)
+        ok_item = CartItem.objects.create(cart=cart, product=ok, quantity=2, price=ok.price)
+        short_item = CartItem.objects.create(cart=cart, product=short, quantity=2, price=short.price)
+
+        order, failures = place_order([
+            OrderLine(ok, 2, ok.price, ok_item),
+            OrderLine(short, 2, short.price, short_item),
+        ])
+
+        self.assertEqual([f.line.product for f in failures], [short])
+        self.assertEqual(order.total_amount, 200)
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(ok.pk, 2)])
+        ok.refresh_from_db()
+        short.refresh_from_db()
+        self.assertEqual((ok.stock, short.stock), (1, 1))
+        # оформленная позиция ушла из корзины, неоформленная осталась
+        self.assertEqual(list(cart.items.values_list('pk', flat=True)), [short_item.pk])
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total_amount), (2, 200))
+
+    def test_no_order_when_nothing_reserved(self):
+        product = _product(stock=0)
+        order, failures = place_order([OrderLine(product, 1, product.price, None)])
+        self.assertIsNone(order)
+        self.assertEqual(len(failures), 1)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failure_reason_comes_from_the_current_row(self):
+        product = _product(stock=3)
+        stale = Product.objects.get(pk=product.pk)
+        Product.objects.filter(pk=product.pk).update(stock=1)
+        order, failures = place_order([OrderLine(stale, 2, stale.price, None)])
+        self.assertIsNone(order)
+        self.assertEqual(failures[0].reason, 'Недостаточно товара на складе (осталось 1 шт.)')
+
+        Product.objects.filter(pk=product.pk).update(is_deleted=True)
+        order, failures = place_order([OrderLine(stale, 1, stale.price, None)])
+        self.assertEqual(failures[0].reason, 'Товар больше не продаётся')
+
+    def test_sold_out_product_is_hidden(self):
+        product = _product(stock=1)
+        place_order([OrderLine(product, 1, product.price, None)])
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertFalse(product.is_published)
+
+
+class CartTotalsTests(TestCase):
+    def assertTotals(self, cart, count, amount):
+        stored = Cart.objects.get(pk=cart.pk)
+        self.assertEqual((stored.item_count, stored.total_amount), (count, amount))
+        self.assertEqual(stored.aggregate_totals(), (count, amount))
+
+    def test_totals_follow_add_update_remove(self):
+        first, second = _product(price=Decimal('100')), _product(price=Decimal('49.50'))
+        cart = Cart.objects.create(session_key='s')
+        cart.add_product(first, 2)
+        cart.add_product(second, 1)
+        cart.add_product(first, 1)
+        self.assertTotals(cart, 4, Decimal('349.50'))
+        cart.set_quantity(cart.items.get(product=second), 3)
+        self.assertTotals(cart, 6, Decimal('448.50'))
+        cart.remove_item(cart.items.get(product=first))
+        self.assertTotals(cart, 3, Decimal('148.50'))
+        cart.add_deleted_backup(second)
+        self.assertTotals(cart, 3, Decimal('148.50'))
+        self.assertFalse(cart.recalculate_totals())
+
+    @override_settings(GUEST_CART_STORE='db')
+    def test_totals_follow_cart_views(self):
+        first, second = _product(price=100), _product(price=250)
+        self.client.post(f'/cart/add/{first.pk}/', {'quantity': 2})
+        self.client.post(f'/cart/add/{second.pk}/')
+        self.client.post(f'/cart/add/{first.pk}/')
+        cart = Cart.objects.get()
+        self.assertTotals(cart, 4, Decimal('550'))
+        item = cart.items.get(product=first)
+        self.client.post(f'/cart/update/{item.pk}/', {'quantity': 1})
+        self.assertTotals(cart, 2, Decimal('350'))
+        self.client.post(f'/cart/remove/{cart.items.get(product=second).pk}/')
+        self.assertTotals(cart, 1, Decimal('100'))
+        self.client.post(f'/cart/update/{item.pk}/', {'quantity': 0})
+        self.assertTotals(cart, 0, Decimal('0'))
+        self.assertEqual(self.client.get('/cart/').context['total'], 0)
+
+
+class MergeSessionCartTests(TestCase):
+    def _guest_cart(self, session_key, products, quantity=1):
+        cart = Cart.objects.create(session_key=session_key)
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity, price=product.price)
+            cart.add_to_totals(quantity, quantity * product.price)
+        return cart
+
+    def test_merges_overlapping_and_moves_the_rest(self):
+        user = get_user_model().objects.create_user('buyer')
+        shared, guest_only = _product(), _product()
+        user_cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=user_cart, product=shared, quantity=2, price=shared.price)
+        user_cart.add_to_totals(2, 2 * shared.price)
+        self._guest_cart('guest', [shared, guest_only], quantity=3)
+
+        merge_session_cart('guest', user)
+
+        user_cart.refresh_from_db()
+        self.assertEqual(
+            dict(user_cart.items.values_list('product_id', 'quantity')),
+            {shared.pk: 5, guest_only.pk: 3},
+        )
+        self.assertEqual((user_cart.item_count, user_cart.total_amount), (8, 800))
+        self.assertFalse(Cart.objects.filter(session_key='guest').exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        user = get_user_model().objects.create_user('buyer')
+        counts = []
+        for size in (1, 10, 50):
+            Cart.objects.filter(user=user).delete()
+            products = [_product() for _ in range(size)]
+            user_cart = Cart.objects.create(user=user)
+            # половина товаров уже лежит в корзине пользователя
+            for product in products[::2]:
+                CartItem.objects.create(cart=user_cart, product=product, quantity=1, price=product.price)
+            self._guest_cart(f'guest-{size}', products)
+            with CaptureQueriesContext(connection) as queries:
+                merge_session_cart(f'guest-{size}', user)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+# Тестовая SQLite — общая in-memory база, где параллельная запись сразу падает с
+# «table is locked»; гонку имеет смысл проверять на СУБД с построчными блокировками.
+@override_settings(GUEST_CART_STORE='cache')
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_guest_cart_stays_in_cache_until_login(self):
+        first, second = _product(price=10), _product(price=25)
+        self.client.post(f'/cart/add/{first.pk}/', {'quantity': 2})
+        self.client.post(f'/cart/add/{second.pk}/')
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.client.get('/cart/').context['cart'].total_amount, 45)
+
+        user = get_user_model().objects.create_user('guest', password='pw')
+        self.client.post('/login/', {'username': 'guest', 'password': 'pw'})
+
+        cart = Cart.objects.get()
+        self.assertEqual(cart.user, user)
+        self.assertEqual((cart.item_count, cart.total_amount), (3, 45))
+        self.assertEqual(self.client.cookies['guest_cart'].value, '')
+
+    def test_product_in_another_guest_cart_stays_hidden(self):
+        product = _product()
+        other = self.client_class()
+        self.client.post(f'/cart/add/{product.pk}/')
+        other.post(f'/cart/add/{product.pk}/')
+
+        other.post(f'/cart/remove/{product.pk}/')
+        product.refresh_from_db()
+        self.assertFalse(product.is_published)  # всё ещё лежит в первой гостевой корзине
+
+        self.client.post(f'/cart/update/{product.pk}/', {'quantity': 0})
+        product.refresh_from_db()
+        self.assertTrue(product.is_published)
+
+    def test_guest_checkout_removes_only_ordered_lines(self):
+        ok, short = _product(stock=5), _product(stock=1)
+        self.client.post(f'/cart/add/{ok.pk}/', {'quantity': 2})
+        self.client.post(f'/cart/add/{short.pk}/', {'quantity': 3})
+
+        self.client.post('/checkout/')
+
+        order = Order.objects.get()
+        self.assertIsNone(order.user)
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(ok.pk, 2)])
+        lines = self.client.get('/cart/').context['items']
+        self.assertEqual([(it.product, it.quantity) for it in lines], [(short, 3)])
+        self.assertFalse(Cart.objects.exists())
+
+
+class PurgeOldCartsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        product = _product()
+        self.carts = {}
+        for name, age, backup in (('old', 40, False), ('old_backup', 40, True),
+                                  ('ancient_backup', 100, True), ('fresh', 1, False)):
+            cart = Cart.objects.create(session_key=name, item_count=1, total_amount=100)
+            CartItem.objects.create(cart=cart, product=product, price=100, is_deleted_backup=backup)
+            Cart.objects.filter(pk=cart.pk).update(created_at=self.now - timedelta(days=age))
+            self.carts[name] = cart
+
+    def purge(self, **kwargs):
+        return purge_old_carts(self.now - timedelta(days=30), self.now - timedelta(days=90), **kwargs)
+
+    def test_purges_in_batches_and_keeps_recent_backups(self):
+        batches = []
+        stats = self.purge(batch_size=1, progress=lambda s: batches.append(s['carts']))
+
+        self.assertEqual(set(Cart.objects.values_list('session_key', flat=True)), {'old_backup', 'fresh'})
+        self.assertEqual((stats['carts'], stats['items']), (2, 2))
+        self.assertEqual(batches, [1, 2])
+
+    def test_interrupted_run_resumes_from_remaining_carts(self):
+        def interrupt(stats):
+            raise RuntimeError('worker killed')
+
+        with self.assertRaises(RuntimeError):
+            self.purge(batch_size=1, progress=interrupt)
+        self.assertFalse(Cart.objects.filter(pk=self.carts['old'].pk).exists())
+
+        stats = self.purge()
+
+        self.assertFalse(Cart.objects.filter(pk=self.carts['ancient_backup'].pk).exists())
+        self.assertEqual(set(Cart.objects.values_list('session_key', flat=True)), {'old_backup', 'fresh'})
+        self.assertEqual(stats['carts'], 1)
+
+
+class SalesRollupTests(TestCase):
+    def _order(self, *lines):
+        order = Order.objects.create(total_amount=sum(p.price * q for p, q in lines))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=p, name=p.name, price=p.price, quantity=q) for p, q in lines
+        ])
+        return order
+
+    def test_rollup_follows_paid_status(self):
+        seller = get_user_model().objects.create_user('seller')
+        mine, other = _product(price=10, owner=seller), _product(price=30)
+        paid = self._order((mine, 2), (other, 1))
+        self._order((mine, 5))  # не оплачен — в отчёт не попадает
+        cancelled = self._order((other, 1))
+        today = timezone.localdate()
+
+        for order in (paid, cancelled):
+            order.status = 'paid'
+            order.save()
+        paid.status = 'shipped'
+        paid.save()
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+        self.assertEqual(sales_report(today, today), {'orders_count': 1, 'total_revenue': 50, 'products_sold': 3})
+        by_seller = {row['seller_id']: row['revenue'] for row in sales_breakdown(today, today, by='seller')}
+        self.assertEqual(by_seller, {seller.pk: 20, None: 30})
+
+        incremental = sorted(DailySalesRollup.objects.values_list('seller_id', 'orders_count', 'items_sold', 'revenue'),
+                             key=str)
+        rebuild(today, today)
+        rebuilt = sorted(DailySalesRollup.objects.values_list('seller_id', 'orders_count', 'items_sold', 'revenue'),
+                         key=str)
+        self.assertEqual([r for r in incremental if r[1]], rebuilt)
+        self.assertEqual(DailySales.objects.get().orders_count, 1)
+
+    def test_rows_created_by_a_concurrent_order_are_reused(self):
+        product = _product(price=10)
+        today = timezone.localdate()
+        # строки дня уже вставила параллельная транзакция первого заказа
+        DailySales.objects.create(date=today, orders_count=1, items_sold=1, revenue=10)
+        DailySalesRollup.objects.create(date=today, category=product.category, orders_count=1, items_sold=1, revenue=10)
+
+        order = self._order((product, 2))
+        order.status = 'paid'
+        order.save()
+
+        self.assertEqual(list(DailySales.objects.values_list('orders_count', 'items_sold', 'revenue')), [(2, 3, 30)])
+        self.assertEqual(list(DailySalesRollup.objects.values_list('orders_count', 'items_sold', 'revenue')),
+                         [(2, 3, 30)])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailySalesRollup.objects.create(date=today, category=product.category)
+
+
+@override_settings(SELLER_COMMISSION_PERCENTAGE='10')
+class SellerLedgerTests(TestCase):
+    def test_earnings_count_only_own_items_and_reverse_on_cancel(self):
+        seller, other = (get_user_model().objects.create_user(name) for name in ('seller', 'other'))
+        mine, theirs = _product(price=100, owner=seller), _product(price=500, owner=other)
+        order = Order.objects.create(total_amount=700)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=mine, name='mine', price=100, quantity=2),
+            OrderItem(order=order, product=theirs, name='theirs', price=500, quantity=1),
+        ])
+        order.status = 'paid'
+        order.save()
+        self.client.force_login(seller)
+
+        data = self.client.get('/api/seller/earnings/').json()
+        self.assertEqual(data, {'gross_earnings': 200, 'commission': 20, 'net_earnings': 180, 'orders_count': 1})
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(f'/api/seller/earnings/?to={yesterday}').json()['orders_count'], 0)
+        self.assertEqual(self.client.get('/api/seller/earnings/?from=bad').status_code, 400)
+
+        order.status = 'cancelled'
+        order.save()
+        data = self.client.get('/api/seller/earnings/').json()
+        self.assertEqual((data['net_earnings'], data['orders_count']), (0, 0))
+
+
+@override_settings(EMAIL_OUTBOX_RATE=0, EMAIL_OUTBOX_BATCH_SIZE=2, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(TestCase):
+    def test_enqueue_is_idempotent_and_drain_sends_in_batches(self):
+        for i in range(3):
+            self.assertTrue(outbox.enqueue(f'k{i}', 'Subject', 'Body', ['a@example.com']))
+        self.assertFalse(outbox.enqueue('k0', 'Subject', 'Body', ['a@example.com']))
+
+        stats = outbox.drain()
+
+        self.assertEqual((stats['sent'], stats['batches']), (3, 2))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(outbox.drain()['sent'], 0)
+
+    def test_failed_send_is_retried_with_backoff_then_given_up(self):
+        outbox.enqueue('k', 'Subject', 'Body', ['a@example.com'])
+        with mock.patch('store.outbox.EmailMessage.send', side_effect=OSError('down')):
+            self.assertEqual(outbox.drain()['retried'], 1)
+            email = OutgoingEmail.objects.get()
+            self.assertEqual((email.status, email.attempts), ('pending', 1))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.drain()['failed'], 1)
+        self.assertEqual(OutgoingEmail.objects.get().status, 'failed')
+
+
+@mock.patch('store.tasks._kick_outbox')
+@mock.patch('store.tasks.send_seller_digest.apply_async')
+class SellerDigestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_orders_within_window_become_one_digest_per_seller(self, schedule_digest, kick_outbox):
+        alice, bob = (get_user_model().objects.create_user(n, email=f'{n}@example.com') for n in ('alice', 'bob'))
+        products = [_product(owner=alice), _product(owner=alice), _product(owner=bob)]
+        orders = []
+        for _ in range(2):
+            order = Order.objects.create(full_name='Buyer')
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=p, name=p.name, price=p.price) for p in products])
+            orders.append(order)
+
+        with self.assertNumQueries(2):
+            send_seller_notification(orders[0].pk)
+        send_seller_notification(orders[1].pk)
+        send_seller_notification(orders[1].pk)  # ретрай задачи не дублирует уведомление
+
+        self.assertEqual(sorted(call.args[0] for call in schedule_digest.call_args_list), [(alice.pk,), (bob.pk,)])
+        send_seller_digest(alice.pk)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.to, email.subject), ('alice@example.com', 'Новые заказы: 2'))
+        self.assertEqual(email.body.count('x1'), 4)
+        self.assertFalse(SellerNotification.objects.filter(seller=alice, sent_at__isnull=True).exists())
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+@mock.patch('store.tasks.send_seller_notification.delay')
+@mock.patch('store.tasks.send_order_confirmation.delay')
+@mock.patch('store.tasks.process_stripe_events.delay')
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = Order.objects.create(total_amount=100)
+        self.payment = Payment.objects.create(order=self.order, stripe_id='cs_1', amount=100)
+
+    def deliver(self, event_id, type, obj, created=0):
+        payload = json.dumps({'id': event_id, 'type': type, 'created': created, 'data': {'object': obj}})
+        timestamp = int(time.time())
+        signature = hmac.new(b'whsec_test', f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post('/stripe/webhook/', payload, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}')
+
+    def test_retried_events_are_logged_once_and_processed_in_order(self, process, confirm, notify):
+        session = {'id': 'cs_1', 'object': 'checkout.session', 'payment_intent': 'pi_1', 'payment_status': 'paid'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.deliver('evt_1', 'checkout.session.completed', session, created=1).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.deliver('evt_1', 'checkout.session.completed', session, created=1).status_code, 200)
+        self.deliver('evt_2', 'charge.failed', {'id': 'ch_1', 'object': 'charge', 'payment_intent': 'pi_1'}, created=2)
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        # события сессии и её PaymentIntent — в одной очереди платежа
+        process.assert_called_once_with('pi_1')
+        self.assertEqual(set(StripeEvent.objects.values_list('object_ref', flat=True)), {'pi_1'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending('pi_1'), 2)
+
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        # запоздавший charge.failed не откатывает успешный платёж
+        self.assertEqual((self.payment.status, self.payment.payment_intent, self.order.status), ('succeeded', 'pi_1', 'paid'))
+        confirm.assert_called_once_with(self.order.pk)
+        self.assertEqual(process_pending('pi_1'), 0)
+
+        self.deliver('evt_3', 'charge.refunded', {'id': 'ch_1', 'object': 'charge', 'payment_intent': 'pi_1'}, created=3)
+        process_pending('pi_1')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+
+    def test_event_before_its_payment_is_known_waits_for_retry(self, process, confirm, notify):
+        # payment_intent.succeeded приходит раньше checkout.session.completed, который сохраняет PaymentIntent
+        self.deliver('evt_1', 'payment_intent.succeeded', {'id': 'pi_1', 'object': 'payment_intent'}, created=1)
+        self.deliver('evt_2', 'charge.refunded', {'id': 'ch_1', 'object': 'charge', 'payment_intent': 'pi_1'},
+                     created=3)
+        self.assertEqual(process_pending('pi_1'), 0)
+        self.assertEqual(StripeEvent.objects.filter(processed_at__isnull=True).count(), 2)
+        self.assertEqual(StripeEvent.objects.get(event_id='evt_1').last_error, 'Платёж не найден')
+
+        session = {'id': 'cs_1', 'object': 'checkout.session', 'payment_intent': 'pi_1', 'payment_status': 'paid'}
+        self.deliver('evt_3', 'checkout.session.completed', session, created=2)
+        StripeEvent.objects.update(received_at=timezone.now() - timedelta(minutes=5))
+        process.reset_mock()
+        process_pending_stripe_events()
+        process.assert_called_once_with('pi_1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending('pi_1'), 2)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')  # оплачен, затем возврат — по порядку stripe_created
+        # ранний payment_intent.succeeded теперь находит платёж и ничего не меняет
+        self.assertEqual(process_pending('pi_1'), 1)
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_bad_signature_is_rejected(self, process, confirm, notify):
+        response = self.client.post('/stripe/webhook/', '{}', content_type='application/json',
+                                    HTTP_STRIPE_SIGNATURE='t=1,v1=bad')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'})
+@mock.patch('store.tasks.moderate_product.delay')
+class ModerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category, _ = Category.objects.get_or_create(name='Test', slug='test')
+
+    def submit(self, name, description='Хорошее состояние'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/add-product/', {
+                'name': name, 'description': description, 'price': '10', 'stock': '1', 'category': self.category.pk,
+            })
+
+    def test_unknown_text_waits_for_ai_and_verdict_is_reused(self, moderate_later):
+        self.submit('Велосипед')
+        product = Product.objects.get()
+        self.assertEqual((product.moderation_status, product.is_published), ('pending', False))
+        moderate_later.assert_called_once_with(product.pk)
+
+        with mock.patch('store.moderation.ai_verdict', return_value=moderation.Verdict(True, '')) as ai:
+            self.assertEqual(moderation.moderate_product(product.pk), 'approved')
+            cache.clear()  # вердикт найдётся и в базе
+            self.submit('  велосипед ')
+        ai.assert_called_once()
+        self.assertEqual(list(Product.objects.values_list('is_published', flat=True)), [True, True])
+
+    def test_product_stays_pending_when_ai_fails(self, moderate_later):
+        self.submit('Велосипед')
+        product = Product.objects.get()
+        with mock.patch('store.moderation.ai_verdict', return_value=None):
+            self.assertEqual(moderation.moderate_product(product.pk), 'pending')
+        product.refresh_from_db()
+        self.assertEqual((product.moderation_status, product.is_published), ('pending', False))
+
+    def test_unmoderated_products_are_not_sold_or_republished(self, moderate_later):
+        pending = _product(name='Велосипед', is_published=False, moderation_status='pending')
+        self.assertEqual(self.client.get(f'/products/{pending.slug}/').status_code, 404)
+        self.client.post(f'/cart/add/{pending.pk}/')
+        self.client.post(f'/products/{pending.pk}/buy/')
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+        # товар попал в корзину до модерации: заказ его не продаёт, удаление из корзины не публикует
+        user = get_user_model().objects.create_user('buyer')
+        cart = Cart.objects.create(user=user, item_count=1, total_amount=pending.price)
+        item = CartItem.objects.create(cart=cart, product=pending, quantity=1, price=pending.price)
+        order, failures = place_order([OrderLine(pending, 1, pending.price, item)])
+        self.assertIsNone(order)
+        self.assertEqual(failures[0].reason, 'Товар больше не продаётся')
+        self.client.force_login(user)
+        self.client.post(f'/cart/remove/{item.pk}/')
+        self.assertFalse(CartItem.objects.exists())
+        pending.refresh_from_db()
+        self.assertFalse(pending.is_published)
+
+    def test_deleted_verdict_is_not_served_from_cache(self, moderate_later):
+        digest = moderation.content_hash('Велосипед', '')
+        moderation.store_verdict(digest, moderation.Verdict(False, 'нельзя'), 'ai')
+        self.assertEqual(moderation.cached_verdict(digest), moderation.Verdict(False, 'нельзя'))
+        ModerationVerdict.objects.filter(content_hash=digest).delete()
+        self.assertIsNone(moderation.cached_verdict(digest))
+
+    def test_forbidden_word_is_rejected_without_ai(self, moderate_later):
+        with mock.patch('store.moderation.ai_verdict') as ai:
+            response = self.submit('Craft beer')
+        self.assertContains(response, 'запрещенное слово: beer')
+        ai.assert_not_called()
+        self.assertFalse(Product.objects.exists())
+
+
+class ForbiddenTermTests(TestCase):
+    def tearDown(self):
+        moderation.terms_changed()
+
+    def test_matcher_normalizes_scripts_and_respects_word_boundaries(self):
+        matcher = TermMatcher(['vodka', 'наркот*', 'gun', 'арак'])
+        self.assertEqual(matcher.search('Продаю ВОДКУ и vоdka').term, 'vodka')  # кириллическая «о»
+        self.assertEqual(matcher.search('наркотики').term, 'наркот*')
+        self.assertEqual(matcher.search('ар@к').term, 'арак')
+        self.assertIsNone(matcher.search('begun, guns-free'))
+
+    def test_terms_match_only_words_of_their_own_script(self):
+        moderation.terms_changed()
+        for text in ('мой лучший друг', 'Кружка «Лучший друг»', 'Нарезка сыра гауда 200 г'):
+            self.assertIsNone(moderation.local_check(text, ''), text)
+        # двойники другого алфавита внутри слова по-прежнему ловятся
+        self.assertIn('drugs', moderation.local_check('Cheap drugs', '').reason)
+        self.assertIn('vodka', moderation.local_check('Premium vоdka', '').reason)  # кириллическая «о»
+        self.assertIn('водк', moderation.local_check('вoдка 0,5', '').reason)  # латинская «o»
+
+        mug = _product(name='Кружка «Лучший друг»', description='Нарезка сыра гауда 200 г в подарок')
+        self.assertEqual(moderation.rescreen(Product.objects.all(), apply=True)['rejected'], 0)
+        mug.refresh_from_db()
+        self.assertEqual((mug.is_published, mug.moderation_status), (True, 'approved'))
+
+    def test_terms_come_from_database_and_rescreen_rejects_existing_products(self):
+        ok, bad = _product(name='Велосипед'), _product(name='Самокат', description='В подарок тапанча')
+        ForbiddenTerm.objects.filter(term='тапанча*').update(is_active=False)
+        moderation.terms_changed()
+        self.assertIsNone(moderation.local_check(bad.name, bad.description))
+
+        ForbiddenTerm.objects.create(term='самокат', language='ru')
+        self.assertEqual(moderation.rescreen(Product.objects.all()), {'checked': 2, 'rejected': 1})
+        bad.refresh_from_db()
+        self.assertTrue(bad.is_published)  # без apply только отчёт
+
+        moderation.rescreen(Product.objects.all(), apply=True, batch_size=1)
+        bad.refresh_from_db()
+        ok.refresh_from_db()
+        self.assertEqual((bad.is_published, bad.moderation_status), (False, 'rejected'))
+        self.assertIn('самокат', bad.moderation_reason)
+        self.assertTrue(ok.is_published)
+
+
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'test'})
+class ChatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        chat.answers.clear()
+
+    async def ask(self, message):
+        response = await self.async_client.post('/api/chat/', {'message': message},
+                                                content_type='application/json', ACCEPT='text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        return response, body
+
+    async def test_streams_tokens_and_reuses_answer_for_same_question(self):
+        calls = []
+
+        async def fake_completion(message):
+            calls.append(message)
+            for token in ('Через ', 'личный ', 'кабинет.'):
+                yield token
+
+        with mock.patch('store.chat.stream_completion', fake_completion):
+            response, body = await self.ask('Как вернуть товар?')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertEqual(body.count('event: token'), 3)
+            self.assertTrue(body.endswith('event: done\ndata: {}\n\n'))
+
+            _, body = await self.ask('  как вернуть ТОВАР ')
+        self.assertEqual(len(calls), 1)
+        self.assertIn('Через личный кабинет.', body)
+        self.assertEqual(await cache.aget('chat-active:anon:127.0.0.1'), 0)  # место освобождено
+
+    async def test_catalog_change_invalidates_cached_answers(self):
+        answers = iter(['Есть велосипед.', 'Велосипедов нет.'])
+
+        async def fake_completion(message):
+            yield next(answers)
+
+        with mock.patch('store.chat.stream_completion', fake_completion):
+            await self.ask('Есть велосипеды?')
+            await cache.aset(retrieval.VERSION_KEY, 1)  # товар изменён (журнал retrieval)
+            _, body = await self.ask('Есть велосипеды?')
+        self.assertIn('Велосипедов нет.', body)
+
+    async def test_slot_is_released_when_client_leaves(self):
+        async def fake_completion(message):
+            for token in ('Через ', 'личный ', 'кабинет.'):
+                yield token
+
+        key = 'chat-active:anon:127.0.0.1'
+        with mock.patch('store.chat.stream_completion', fake_completion):
+            # ушёл до первого события: поток ни разу не читали
+            response = await self.async_client.post('/api/chat/', {'message': 'Привет'},
+                                                    content_type='application/json', ACCEPT='text/event-stream')
+            self.assertEqual(await cache.aget(key), 1)
+            response.close()
+            self.assertEqual(await cache.aget(key), 0)
+
+            # ушёл посреди ответа
+            response = await self.async_client.post('/api/chat/', {'message': 'Как вернуть товар?'},
+                                                    content_type='application/json', ACCEPT='text/event-stream')
+            await anext(aiter(response.streaming_content))
+            response.close()
+            self.assertEqual(await cache.aget(key), 0)
+
+    @override_settings(CHAT_MAX_CONCURRENT_PER_USER=1)
+    async def test_rejects_requests_over_concurrency_limit(self):
+        self.assertTrue(await chat.acquire_slot('anon:127.0.0.1'))
+        response = await self.async_client.post('/api/chat/', {'message': 'Привет'}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        await chat.release_slot('anon:127.0.0.1')
+
+
+class RetrievalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        retrieval.reset()
+        self.bike = _product(name='Горный велосипед', name_en='Mountain bike', description='Алюминиевая рама, 21 скорость')
+        self.kettle = _product(name='Электрочайник', description='Чайник на 1,7 литра')
+        _product(name='Старый велосипед', is_published=False)
+
+    def test_finds_published_products_across_languages(self):
+        self.assertEqual([row[0] for row in retrieval.top_products('велосипеды для гор', k=3)], [self.bike.pk])
+        self.assertEqual(retrieval.top_products('mountain bike')[0][0], self.bike.pk)
+        self.assertEqual(retrieval.top_products('velosiped')[0][0], self.bike.pk)
+        self.assertIn('Электрочайник, 100.00 сом: Чайник на 1,7 литра', retrieval.product_context('чайник'))
+
+    def test_index_follows_product_changes(self):
+        retrieval.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kettle.name = 'Электрический самовар'
+            self.kettle.save()
+            self.bike.is_published = False
+            self.bike.save(update_fields=['is_published'])
+        self.assertEqual(retrieval.top_products('велосипед'), [])
+        self.assertEqual(retrieval.top_products('самовар')[0][0], self.kettle.pk)
+
+        # другой процесс догоняет изменения по журналу в кэше
+        retrieval._state.update(version=retrieval._state['version'] - 2, checked=0.0)
+        retrieval._state['index'].remove(self.kettle.pk)
+        self.assertEqual(retrieval.top_products('самовар')[0][0], self.kettle.pk)
+
+    def test_sold_out_product_leaves_chat_context(self):
+        retrieval.get_index()
+        Product.objects.filter(pk=self.kettle.pk).update(stock=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order([OrderLine(self.kettle, 1, self.kettle.price, None)])
+        self.assertEqual(retrieval.top_products('чайник'), [])
+        self.assertEqual(cache.get(retrieval.VERSION_KEY), 1)  # версия кэша ответов чата тоже сдвинулась
+
+
+class TranslationPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        translation_memory.clear_lru()
+        self.calls = []
+
+    def fake_batch(self, texts, lang, session, provider, api_url):
+        self.calls.append((lang, list(texts)))
+        if 'сломано' in texts:
+            raise ConnectionError('provider is down')
+        return [f'{lang}:{text}' for text in texts]
+
+    def test_batches_unique_texts_and_reuses_translation_memory(self):
+        first = _product(name='Чайник', description='Новый')
+        second = _product(name='Кружка', description='Новый', name_en='Mug')
+        with mock.patch('store.translation.translate_batch', self.fake_batch):
+            stats = translate_products(Product.objects.all(), Translator(batch_size=10), langs=['en', 'kg'])
+        self.assertEqual(sorted(lang for lang, _ in self.calls), ['en', 'kg'])  # одна пачка на язык
+        self.assertEqual(sorted(next(texts for lang, texts in self.calls if lang == 'en')), ['Новый', 'Чайник'])
+        second.refresh_from_db()
+        self.assertEqual((second.name_en, second.description_en, second.name_kg), ('Mug', 'en:Новый', 'kg:Кружка'))
+        self.assertEqual(stats['updated'], 2)
+
+        Product.objects.filter(pk=first.pk).update(name_kg=None)
+        self.calls.clear()
+        with mock.patch('store.translation.translate_batch', self.fake_batch):
+            stats = translate_products(Product.objects.all(), Translator(), langs=['kg'])
+        self.assertEqual((self.calls, stats['memory_hits']), ([], 1))
+        self.assertEqual(TranslationMemory.objects.count(), 5)
+
+    def test_failed_batch_leaves_fields_empty_and_run_resumes(self):
+        done = _product(name='Чайник')
+        broken = _product(name='сломано')
+        ok = _product(name='Лампа')
+        with mock.patch('store.translation.translate_batch', self.fake_batch):
+            # прерванный запуск успел перевести только первый товар
+            translate_products(Product.objects.all(), Translator(), langs=['en'], limit=1)
+            done.refresh_from_db()
+            self.assertEqual(done.name_en, 'en:Чайник')
+            self.calls.clear()
+            translate_products(Product.objects.all(), Translator(batch_size=1), langs=['en'])
+            ok.refresh_from_db()
+            self.assertEqual(ok.name_en, 'en:Лампа')
+            self.assertNotIn('Чайник', [text for _, texts in self.calls for text in texts])  # уже переведён
+            stats = translate_products(Product.objects.all(), Translator(), langs=['en'])
+        broken.refresh_from_db()
+        self.assertFalse(broken.name_en)
+        self.assertEqual(stats['failed'], 1)
+
+
+class TranslationMemoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        translation_memory.clear_lru()
+        translation_memory.reset_metrics()
+
+    def test_lru_front_counts_hits_and_misses(self):
+        translation_memory.store_many({'Новый': 'Жаңы'}, 'kg', 'libre')
+        translation_memory.clear_lru()
+        self.assertEqual(translation_memory.lookup_many(['Новый', 'Б/у'], 'kg', 'libre'), {'Новый': 'Жаңы'})
+        with self.assertNumQueries(0):
+            self.assertEqual(translation_memory.lookup_many(['Новый'], 'kg', 'libre'), {'Новый': 'Жаңы'})
+        self.assertEqual(translation_memory.lookup_many(['Новый'], 'en', 'libre'), {})
+        self.assertEqual(translation_memory.shared_metrics(), {'lru_hits': 1, 'db_hits': 1, 'misses': 2, 'stored': 1})
+        self.assertEqual(translation_memory.hit_rate(), 0.5)
+
+    def test_translate_text_uses_memory_and_export_import_round_trip(self):
+        with mock.patch('store.utils.translate.translate_batch', return_value=['New']) as provider:
+            self.assertEqual(translate_text('Новый', 'en'), 'New')
+            self.assertEqual(translate_text('Новый', 'en'), 'New')
+        provider.assert_called_once()
+        with mock.patch('store.utils.translate.translate_batch', side_effect=ConnectionError('down')):
+            with self.assertLogs('store.utils.translate', 'WARNING'):
+                self.assertEqual(translate_text('Б/у', 'en'), '')
+
+        lines = list(translation_memory.export_lines())
+        self.assertEqual(json.loads(lines[0])['text'], 'New')
+        TranslationMemory.objects.all().delete()
+        translation_memory.clear_lru()
+        edited = lines[0].replace('"New"', '"Brand new"')
+        self.assertEqual(translation_memory.import_lines([edited]), 1)
+        self.assertEqual(translation_memory.lookup_many(['Новый'], 'en', 'libre'), {'Новый': 'Brand new'})
+        translation_memory.import_lines(lines, overwrite=True)
+        self.assertEqual(TranslationMemory.objects.get().text, 'New')
+
+    def test_command_exports_to_command_stdout(self):
+        translation_memory.store_many({'Новый': 'Жаңы', 'Б/у': 'Колдонулган'}, 'kg', 'libre')
+        out, err = StringIO(), StringIO()
+        call_command('translation_memory', 'export', stdout=out, stderr=err)
+        self.assertEqual(sorted(json.loads(line)['text'] for line in out.getvalue().splitlines()),
+                         ['Жаңы', 'Колдонулган'])
+        self.assertIn('Exported 2 entries', err.getvalue())
+
+
+class FillFromSourceTests(TestCase):
+    def test_copies_source_into_empty_fields_with_one_update_per_field(self):
+        blank = _product(name='Чайник', description='', name_ru='', name_kg='Чайнек')
+        full = _product(name='Лампа', description='Яркая', **{f'{f}_{l}': 'x' for f in ('name', 'description')
+                                                            for l in ('ru', 'kg', 'en')})
+        self.assertEqual(fill_from_source(dry_run=True)['name_ru'], 1)
+        with self.assertNumQueries(6):
+            counts = fill_from_source()
+        self.assertEqual(counts, {'name_ru': 1, 'description_ru': 0, 'name_kg': 0, 'description_kg': 0,
+                                  'name_en': 1, 'description_en': 0})
+        blank.refresh_from_db()
+        self.assertEqual((blank.name_ru, blank.name_kg, blank.name_en, blank.description_en), ('Чайник', 'Чайнек', 'Чайник', None))
+
+        Product.objects.update(name_en=None)
+        self.assertEqual(fill_from_source(langs=['en'], chunk_size=1)['name_en'], 2)
+        full.refresh_from_db()
+        self.assertEqual((full.name_en, full.name_ru), ('Лампа', 'x'))
+
+
+class LocalizedProductTests(TestCase):
+    def test_falls_back_to_source_text_and_skips_translation_columns(self):
+        _product(name='Чайник', description='Стальной', name_kg='Чайнек', name_en='', description_kg=None)
+        product = Product.objects.localized('kg').get()
+        self.assertEqual((product.display_name, product.display_description), ('Чайнек', 'Стальной'))
+        self.assertEqual(Product.objects.localized('en', description=False).get().display_name, 'Чайник')
+        self.assertEqual(Product.objects.localized('de').get().display_name, 'Чайник')
+        self.assertTrue({'description', 'name_kg', 'description_en'} <= product.get_deferred_fields())
+
+        # count и страница — без дозагрузки отложенных полей в шаблоне
+        with self.assertNumQueries(2):
+            response = self.client.get('/search/?q=')
+        self.assertContains(response, 'Чайник')
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, THUMBNAILS_ASYNC=False,
+                                              THUMBNAIL_WIDTHS=[160, 320, 640])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _upload(self, size, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_generates_content_addressed_thumbnails_and_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = _product(image=self._upload((500, 300)))
+        product.refresh_from_db()
+        self.assertEqual(product.thumbnail_widths, '160,320,500')
+        name = thumbnails.thumbnail_name(product.thumbnail_key, 320, 'webp')
+        self.assertTrue(default_storage.exists(name))
+
+        html = Template('{% load product_images %}{% product_image p "20vw" alt=p.name %}').render(
+            Context({'p': product}))
+        self.assertIn(f'/media/{name} 320w', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('sizes="20vw"', html)
+
+        # та же картинка у другого товара — те же файлы, без повторного кодирования
+        with self.captureOnCommitCallbacks(execute=True):
+            other = _product(image=self._upload((500, 300)))
+        other.refresh_from_db()
+        self.assertEqual(other.thumbnail_key, product.thumbnail_key)
+
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content)[:4], b'RIFF')
+        self.assertEqual(self.client.get(f'/media/{name}', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # новое фото: старые копии сбрасываются сразу, новые делаются после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            product.image = self._upload((800, 600), 'blue')
+            product.save()
+            self.assertEqual(Product.objects.get(pk=product.pk).thumbnail_key, '')
+        product.refresh_from_db()
+        self.assertEqual(product.thumbnail_widths, '160,320,640')
+
+    def test_command_backfills_missing_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            product = _product(image=self._upload((200, 200)))
+        _product()
+        call_command('generate_thumbnails', stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.thumbnail_widths, '160,200')
+        html = Template('{% load product_images %}{% product_image p "80px" %}').render(Context({'p': _product(
+            image='products/missing.jpg')}))
+        self.assertIn('src="/media/products/missing.jpg"', html)
+
+    def test_broken_image_is_not_requeued_on_every_save(self):
+        with mock.patch('store.thumbnails.schedule', wraps=thumbnails.schedule) as schedule:
+            with self.assertLogs('store.thumbnails', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+                product = _product(image=SimpleUploadedFile('photo.jpg', b'not an image'))
+            product = Product.objects.get(pk=product.pk)
+            self.assertEqual(product.thumbnail_key, thumbnails.FAILED)
+            with self.captureOnCommitCallbacks(execute=True):
+                product.stock = 4
+                product.save()
+                product.is_published = False
+                product.save()
+        self.assertEqual(schedule.call_count, 1)
+        call_command('generate_thumbnails', stdout=StringIO())  # без --all битые фото не трогает
+        self.assertEqual(Product.objects.get(pk=product.pk).thumbnail_key, thumbnails.FAILED)
+
+
+class RatingTests(TestCase):
+    def _review(self, product, rating, approved=True):
+        return Review.objects.create(product=product, rating=rating, approved=approved)
+
+    def test_counters_follow_approval_edits_and_deletes(self):
+        product = _product()
+        five = self._review(product, 5)
+        pending = self._review(product, 2, approved=False)
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_avg), (1, 5.0))
+
+        pending.approved = True
+        pending.save()
+        five.rating = 4
+        five.save()
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum, product.rating_avg), (2, 6, 3.0))
+
+        Review.objects.get(pk=five.pk).delete()
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_avg), (1, 2.0))
+        pending.delete()
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum, product.rating_avg), (0, 0, 0.0))
+
+    def test_bulk_approval_and_rebuild(self):
+        first, second = _product(), _product()
+        for rating in (5, 4, 4):
+            self._review(first, rating, approved=False)
+        self._review(second, 3, approved=False)
+        self.assertEqual(ratings.set_approved(Review.objects.all(), True), 4)
+        self.assertEqual(ratings.set_approved(Review.objects.all(), True), 0)
+        first.refresh_from_db()
+        self.assertEqual((first.rating_count, first.rating_avg), (3, 4.33))
+
+        Review.objects.filter(product=second).update(rating=1)  # в обход сигналов
+        Product.objects.update(rating_count=0, rating_sum=0, rating_avg=0)
+        ratings.rebuild()
+        second.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual((second.rating_count, second.rating_avg, first.rating_sum), (1, 1.0, 13))
+
+        ratings.set_approved(Review.objects.filter(product=first, rating=5), False)
+        first.refresh_from_db()
+        self.assertEqual((first.rating_count, first.rating_avg), (2, 4.0))
+
+    def test_catalog_sorts_by_rating_and_reviews_load_by_page(self):
+        low, high = _product(name='Low'), _product(name='High')
+        self._review(low, 2)
+        for _ in range(12):
+            self._review(high, 5)
+        with self.assertNumQueries(2):  # count и страница, отзывы не читаются
+            response = self.client.get('/products/?sort=rating')
+        content = response.content.decode()
+        self.assertLess(content.index('High'), content.index('Low'))
+        self.assertIn('5,0 (12 отзывов)', content.replace('5.0', '5,0'))
+
+        self.assertContains(self.client.get(f'/products/{high.slug}/'), f'data-url="/products/{high.pk}/reviews/"')
+        url = f'/products/{high.pk}/reviews/'
+        first = self.client.get(url)
+        self.assertEqual(first.content.decode().count('★★★★★'), 10)
+        rest = self.client.get(url, {'cursor': first['X-Next-Cursor']})
+        self.assertEqual(rest.content.decode().count('★★★★★'), 2)
+        self.assertEqual(rest['X-Next-Cursor'], '')
+
+
+@override_settings(POPULARITY_VIEWS_ENABLED=True)
+class PopularityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_only_products_with_new_events_are_recomputed(self):
+        viewed, sold = _product(name='Viewed'), _product(name='Sold')
+        _product(name='Idle')
+        self.assertEqual(popularity.update()['full'], True)  # журнал ещё не читался
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(4):
+                self.client.get(f'/products/{viewed.slug}/')
+            user = get_user_model().objects.create_user('fan')
+            Favorite.objects.create(user=user, product=sold)
+            order = Order.objects.create(total_amount=200)
+            OrderItem.objects.create(order=order, product=sold, name='Sold', price=100, quantity=2)
+            order.status = 'paid'
+            order.save()
+        stats = popularity.update()
+        self.assertEqual((stats['products'], stats['views'], stats['full']), (2, 4, False))
+
+        today = timezone.localdate()
+        viewed.refresh_from_db()
+        sold.refresh_from_db()
+        self.assertAlmostEqual(popularity.current(viewed, today), 4)
+        self.assertAlmostEqual(popularity.current(sold, today), 5 + 2 * 10)
+        content = self.client.get('/').content.decode()
+        self.assertLess(content.index('Sold'), content.index('Viewed'))
+        self.assertLess(content.index('Viewed'), content.index('Idle'))
+
+        self.assertEqual(popularity.update()['products'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.filter(product=sold).delete()
+        self.assertEqual(popularity.update()['products'], 1)
+        sold.refresh_from_db()
+        self.assertAlmostEqual(popularity.current(sold, today), 20)
+
+    def test_views_count_on_full_recompute(self):
+        viewed = _product(name='Viewed')
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.client.get(f'/products/{viewed.slug}/')
+        # журнал ещё не читался: полный пересчёт, у товара нет событий в БД — только просмотры
+        stats = popularity.update()
+        self.assertEqual((stats['full'], stats['views']), (True, 3))
+        viewed.refresh_from_db()
+        self.assertAlmostEqual(popularity.current(viewed, timezone.localdate()), 3)
+
+    def test_views_from_any_process_reach_the_task(self):
+        viewed = _product(name='Viewed')
+        with self.captureOnCommitCallbacks(execute=True):
+            popularity.record_view(viewed.pk)
+            popularity.record_view(viewed.pk)
+        self.assertEqual(cache.get(popularity.VERSION_KEY), 1)  # в журнал — только первый просмотр
+        popularity.update()
+        with self.captureOnCommitCallbacks(execute=True):
+            popularity.record_view(viewed.pk)
+        # счётчик уже забран задачей: новый просмотр снова попадает в журнал
+        stats = popularity.update()
+        self.assertEqual((stats['full'], stats['products'], stats['views']), (False, 1, 1))
+        viewed.refresh_from_db()
+        self.assertAlmostEqual(popularity.current(viewed, timezone.localdate()), 3)
+
+    @override_settings(POPULARITY_VIEWS_ENABLED=False)
+    def test_views_are_not_counted_without_shared_cache(self):
+        viewed = _product(name='Viewed')
+        self.client.get(f'/products/{viewed.slug}/')
+        self.assertIsNone(cache.get(popularity.VIEWS_KEY.format(viewed.pk)))
+
+    def test_older_events_weigh_less(self):
+        day = timezone.localdate()
+        self.assertAlmostEqual(popularity.growth(day) / popularity.growth(day - timedelta(days=7)), 2)
+        fresh, old = _product(), _product()
+        user = get_user_model().objects.create_user('fan')
+        Favorite.objects.create(user=user, product=fresh)
+        Favorite.objects.create(user=user, product=old)
+        Favorite.objects.filter(product=old).update(created_at=timezone.now() - timedelta(days=7))
+        popularity.recompute([fresh.pk, old.pk])
+        fresh.refresh_from_db()
+        old.refresh_from_db()
+        self.assertAlmostEqual(fresh.popularity / old.popularity, 2, places=1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Параллельные оформления одного «горячего» товара не продают больше остатка."""
+    buyers = 20
+    stock = 5
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        product = _product(stock=self.stock)
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def buy():
+            try:
+                barrier.wait()
+                order, _ = place_order([OrderLine(product, 1, product.price, None)])
+                results.append(order is not None)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.buyers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
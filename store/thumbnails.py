@@ -0,0 +1,156 @@
+"""
+Уменьшенные копии фото товаров для srcset.
+
+- После загрузки нового Product.image сигнал (store/signals.py) ставит задачу
+  generate_thumbnails (или, при THUMBNAILS_ASYNC=False, делает копии сразу
+  после коммита). Задача пишет WebP и JPEG для каждой ширины THUMBNAIL_WIDTHS
+  не больше исходной и сохраняет в товаре ключ и готовые ширины.
+- Имена копий адресуются содержимым: thumbs/<ab>/<ключ>-<ширина>.<webp|jpg>,
+  где ключ — хэш исходного файла вместе с настройками качества. Содержимое
+  файла по адресу никогда не меняется, поэтому его можно кэшировать навсегда
+  (Cache-Control: immutable, см. views.thumbnail и nginx.conf), а одинаковые
+  фото разных товаров хранятся один раз.
+- Пока копий нет (или фото битое), шаблонный тег product_image
+  (templatetags/product_images.py) выводит исходное фото, как раньше.
+- Копии ставятся только при смене фото. Фото, которое не удалось прочитать,
+  помечается ключом FAILED и не ставится снова ни при сохранении товара, ни
+  командой generate_thumbnails (кроме --all); новое фото сбрасывает отметку.
+- Старые фото доделывает команда generate_thumbnails.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import catalog_cache
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('webp', 'jpg')
+DIRECTORY = 'thumbs'
+# меняется вместе со способом уменьшения: новые ключи, а не новое содержимое по старым адресам
+PIPELINE_VERSION = 1
+NOT_LOADED = object()
+FAILED = 'failed'  # thumbnail_key фото, копии которого сделать не удалось
+
+
+def thumbnail_name(key, width, ext):
+    return f'{DIRECTORY}/{key[:2]}/{key}-{width}.{ext}'
+
+
+def thumbnail_key(data):
+    params = f'{PIPELINE_VERSION}:{settings.THUMBNAIL_QUALITY}'.encode()
+    return hashlib.sha256(params + b'\0' + data).hexdigest()[:40]
+
+
+def target_widths(width):
+    """Ширины копий для фото шириной width: без увеличения; узкое фото — одна копия своей ширины."""
+    widths = [w for w in sorted(settings.THUMBNAIL_WIDTHS) if w <= width]
+    if width < max(settings.THUMBNAIL_WIDTHS) and width not in widths:
+        widths.append(width)
+    return widths
+
+
+def _encode(image, ext):
+    buffer = BytesIO()
+    if ext == 'webp':
+        image.save(buffer, 'WEBP', quality=settings.THUMBNAIL_QUALITY, method=4)
+    else:
+        image.save(buffer, 'JPEG', quality=settings.THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render(data):
+    """(ключ, ширины) для содержимого фото; копии, которых ещё нет в хранилище, записываются."""
+    from PIL import Image, ImageOps
+
+    key = thumbnail_key(data)
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        widths = target_widths(image.width)
+        # от большей ширины к меньшей: каждая копия уменьшается из предыдущей, а не из оригинала
+        current = image
+        for width in reversed(widths):
+            names = {ext: thumbnail_name(key, width, ext) for ext in FORMATS}
+            if all(default_storage.exists(name) for name in names.values()):
+                continue
+            height = max(1, round(image.height * width / image.width))
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+            for ext, name in names.items():
+                if not default_storage.exists(name):
+                    default_storage.save(name, ContentFile(_encode(current, ext)))
+    return key, widths
+
+
+def generate(product_id):
+    """Сделать копии фото товара. Возвращает ключ копий или None (нет фото или оно не читается)."""
+    product = Product.objects.filter(pk=product_id).only('pk', 'image').first()
+    if product is None or not product.image:
+        return None
+    name = product.image.name
+    try:
+        with product.image.open('rb') as source:
+            data = source.read()
+        key, widths = render(data)
+    except Exception as e:
+        logger.warning(f"Не удалось сделать копии фото товара {product_id} ({name}): {e}")
+        Product.objects.filter(pk=product_id, image=name).update(thumbnail_key=FAILED, thumbnail_widths='')
+        return None
+    # фото могли заменить, пока копии делались: тогда сработает задача нового фото
+    updated = Product.objects.filter(pk=product_id, image=name).update(
+        thumbnail_key=key, thumbnail_widths=','.join(map(str, widths)),
+    )
+    if updated:
+        catalog_cache.invalidate()
+    return key
+
+
+def schedule(product_id):
+    """Сделать копии после коммита: задачей Celery или сразу (THUMBNAILS_ASYNC=False)."""
+    def run():
+        if settings.THUMBNAILS_ASYNC:
+            from .tasks import generate_thumbnails
+            generate_thumbnails.delay(product_id)
+        else:
+            generate(product_id)
+    transaction.on_commit(run)
+
+
+def loaded_image(product):
+    """Имя фото, загруженное в объект, или NOT_LOADED (поле отложено) — для сравнения при сохранении."""
+    value = product.__dict__.get('image', NOT_LOADED)
+    return getattr(value, 'name', value) or ''
+
+
+def image_saved(product, previous):
+    """Товар сохранён (сигнал): фото заменено или удалено — сбросить старые копии и поставить новые."""
+    if 'image' not in product.__dict__:
+        return  # фото не загружалось — значит, и не менялось
+    name = product.image.name or ''
+    if previous is NOT_LOADED:
+        previous = name
+    if name == previous:
+        return  # копии уже есть, ещё делаются или фото битое — повторно не ставим
+    if product.thumbnail_key:
+        product.thumbnail_key = product.thumbnail_widths = ''
+        Product.objects.filter(pk=product.pk).update(thumbnail_key='', thumbnail_widths='')
+    if name:
+        schedule(product.pk)
+
+
+def url(product, width, ext):
+    return default_storage.url(thumbnail_name(product.thumbnail_key, width, ext))
+
+
+def srcset(product, ext):
+    widths = [int(w) for w in product.thumbnail_widths.split(',') if w]
+    return ', '.join(f'{url(product, w, ext)} {w}w' for w in widths)
@@ -0,0 +1,202 @@
+"""
+Перевод названий и описаний товаров пачками и параллельно.
+
+- Товары обходятся порциями по chunk_size первичных ключей; для порции
+  собираются все тексты, которым нужен перевод, без повторов по языку.
+- Уже переведённые тексты берутся из памяти переводов (translation_memory).
+- Остальные уходят к провайдеру пачками по batch_size текстов в одном
+  запросе; пачки всех языков выполняются одновременно в пуле из workers
+  потоков через одну HTTP-сессию с пулом соединений. Потоки только ходят в
+  сеть — с базой работает основной поток.
+- Результаты порции записываются одним bulk_update, затем обновляются
+  производные данные, которые обычно ведут сигналы Product.
+- Позиция запуска нигде не хранится: без overwrite переводятся только пустые
+  поля, поэтому повторный запуск после прерванного сам продолжает с
+  непереведённых товаров (уже переведённые тексты берутся из памяти переводов).
+  Пачка, упавшая у провайдера, не ломает запуск — её поля останутся пустыми и
+  переведутся при следующем.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+
+from . import catalog_cache, retrieval, search, translation_memory
+from .models import Product
+from .utils.translate import make_session, translate_batch
+
+logger = logging.getLogger(__name__)
+
+LANGS = ('ru', 'kg', 'en')
+SOURCE_FIELDS = ('name', 'description')
+
+
+def target_field(source, lang):
+    return f'{source}_{lang}'
+
+
+class Translator:
+    """
+    Перевод наборов текстов: память переводов, затем пачки к провайдеру в пуле
+    потоков. offline=True — только память, без обращений к провайдеру.
+    """
+
+    def __init__(self, provider='libre', workers=4, batch_size=50, max_chars=5000, api_url=None, offline=False):
+        self.provider = provider
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.api_url = api_url
+        self.offline = offline
+        self.session = None if offline else make_session(pool_size=workers)
+        self.stats = {'memory_hits': 0, 'translated': 0, 'failed': 0, 'requests': 0}
+
+    def _batches(self, texts):
+        batch, chars = [], 0
+        for text in texts:
+            if batch and (len(batch) >= self.batch_size or chars + len(text) > self.max_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            yield batch
+
+    def translate_many(self, texts_by_lang):
+        """{язык: тексты} -> {(язык, текст): перевод}; непереведённых текстов в ответе нет."""
+        result = {}
+        missing = {}
+        for lang, texts in texts_by_lang.items():
+            found = translation_memory.lookup_many(texts, lang, self.provider)
+            self.stats['memory_hits'] += len(found)
+            result.update(((lang, text), translation) for text, translation in found.items())
+            missing[lang] = sorted(set(texts) - set(found))
+        if self.offline:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(translate_batch, batch, lang, self.session, self.provider, self.api_url): (lang, batch)
+                for lang, texts in missing.items() for batch in self._batches(texts)
+            }
+            fresh = {}
+            for future in as_completed(futures):
+                lang, batch = futures[future]
+                self.stats['requests'] += 1
+                try:
+                    translations = future.result()
+                except Exception as e:
+                    self.stats['failed'] += len(batch)
+                    logger.warning(f"Перевод на {lang} не удался ({len(batch)} текстов): {e}")
+                    continue
+                for text, translation in zip(batch, translations):
+                    if translation:
+                        fresh.setdefault(lang, {})[text] = translation
+                        result[(lang, text)] = translation
+                        self.stats['translated'] += 1
+        for lang, translations in fresh.items():
+            translation_memory.store_many(translations, lang, self.provider)
+        return result
+
+
+def products_updated(products):
+    """Обновить то, что для save() делают сигналы: поиск, индекс чата, кэш каталога."""
+    search.index_products(products)
+    for product in products:
+        retrieval.product_changed(product.pk)
+    catalog_cache.invalidate()
+
+
+def translate_products(queryset, translator, langs=LANGS, overwrite=False, chunk_size=500, limit=0,
+                       progress=None):
+    """
+    Перевести пустые (или все, overwrite) поля name_<lang>/description_<lang>
+    товаров queryset. Возвращает stats: {'products', 'updated', 'last_pk', 'seconds'}
+    и счётчики translator.stats.
+    """
+    started = time.monotonic()
+    last_pk = 0
+    stats = {'products': 0, 'updated': 0, 'last_pk': last_pk, 'seconds': 0.0}
+    # все переводимые поля: индекс поиска читает их после bulk_update
+    fields = ['pk', *SOURCE_FIELDS, *search.INDEXED_FIELDS]
+    while not limit or stats['products'] < limit:
+        size = min(chunk_size, limit - stats['products']) if limit else chunk_size
+        products = list(queryset.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:size])
+        if not products:
+            break
+        wanted = {lang: set() for lang in langs}
+        for product in products:
+            for lang in langs:
+                for source in SOURCE_FIELDS:
+                    text = (getattr(product, source) or '').strip()
+                    if text and (overwrite or not getattr(product, target_field(source, lang))):
+                        wanted[lang].add(text)
+        translations = translator.translate_many(wanted)
+
+        changed, changed_fields = [], set()
+        for product in products:
+            dirty = False
+            for lang in langs:
+                for source in SOURCE_FIELDS:
+                    field = target_field(source, lang)
+                    text = (getattr(product, source) or '').strip()
+                    translation = translations.get((lang, text))
+                    if translation and (overwrite or not getattr(product, field)):
+                        setattr(product, field, translation)
+                        changed_fields.add(field)
+                        dirty = True
+            if dirty:
+                changed.append(product)
+        if changed:
+            with transaction.atomic():
+                Product.objects.bulk_update(changed, sorted(changed_fields), batch_size=500)
+                products_updated(changed)
+
+        last_pk = products[-1].pk
+        stats['products'] += len(products)
+        stats['updated'] += len(changed)
+        stats['last_pk'] = last_pk
+        stats['seconds'] = time.monotonic() - started
+        if progress:
+            progress({**stats, **translator.stats})
+        if len(products) < size:
+            break
+    stats['seconds'] = time.monotonic() - started
+    return {**stats, **translator.stats}
+
+
+def fill_from_source(queryset=None, langs=LANGS, dry_run=False, chunk_size=0):
+    """
+    Скопировать name/description в пустые поля перевода множественными
+    UPDATE, по одному на поле:
+        UPDATE store_product SET name_ru = name WHERE (name_ru IS NULL OR name_ru = '') AND name <> ''
+    chunk_size — обновлять диапазонами первичного ключа, короткими транзакциями
+    (для очень больших таблиц). dry_run — только посчитать строки.
+    Возвращает {поле: число строк}.
+
+    Сигналы Product здесь не нужны: копия исходного текста не меняет ни
+    документ поиска и чата (переводы в нём без повторов), ни то, что видит
+    покупатель (пустой перевод и так заменяется исходным текстом).
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    counts = {}
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk')) if chunk_size and not dry_run else None
+    for lang in langs:
+        for source in SOURCE_FIELDS:
+            field = target_field(source, lang)
+            empty = queryset.filter(Q(**{f'{field}__isnull': True}) | Q(**{field: ''})).exclude(**{source: ''})
+            if dry_run:
+                counts[field] = empty.count()
+            elif not chunk_size:
+                counts[field] = empty.update(**{field: F(source)})
+            else:
+                counts[field] = 0
+                low = bounds['low'] or 0
+                while bounds['high'] is not None and low <= bounds['high']:
+                    counts[field] += empty.filter(pk__gte=low, pk__lt=low + chunk_size).update(**{field: F(source)})
+                    low += chunk_size
+    if not dry_run and any(counts.values()):
+        catalog_cache.invalidate()
+    return counts
@@ -0,0 +1,169 @@
+"""
+Память переводов: (хэш исходного текста, язык источника, язык перевода,
+провайдер) -> перевод.
+
+Одинаковые тексты разных товаров («Новый», «Б/у», общие описания)
+переводятся у провайдера один раз. Два уровня:
+- LRU в памяти процесса (TRANSLATION_MEMORY_LRU_SIZE записей) — повторы внутри
+  одного запуска и в админке не ходят даже в базу;
+- таблица TranslationMemory — общая для всех процессов и запусков.
+Память используют translate_text, translate_products (store/translation.py),
+действие админки и fill_translations --use-memory.
+
+Метрики: счётчики попаданий (LRU, база) и промахов — в процессе (metrics) и
+накопительно в общем кэше (shared_metrics), см. команду translation_memory stats.
+Выгрузка и загрузка — JSON Lines, по объекту на строку:
+{"source_lang": "auto", "target_lang": "kg", "provider": "libre", "source": "...", "text": "..."}
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TranslationMemory
+
+SOURCE_LANG = 'auto'
+LOOKUP_CHUNK = 500  # хэшей в одном IN (...)
+METRICS = ('lru_hits', 'db_hits', 'misses', 'stored')
+METRICS_KEY = 'translation-memory:{}'
+
+_lru = OrderedDict()
+# LRU общий для потоков процесса (пул Translator, потоки ASGI/WSGI)
+_lru_lock = threading.Lock()
+metrics = dict.fromkeys(METRICS, 0)
+
+
+def source_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _remember(key, text):
+    with _lru_lock:
+        _lru[key] = text
+        _lru.move_to_end(key)
+        while len(_lru) > settings.TRANSLATION_MEMORY_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _count(**counts):
+    for name, value in counts.items():
+        if not value:
+            continue
+        metrics[name] += value
+        try:
+            cache.incr(METRICS_KEY.format(name), value)
+        except ValueError:
+            cache.add(METRICS_KEY.format(name), 0, None)
+            cache.incr(METRICS_KEY.format(name), value)
+
+
+def hit_rate(counters=None):
+    counters = counters or metrics
+    hits = counters['lru_hits'] + counters['db_hits']
+    total = hits + counters['misses']
+    return hits / total if total else 0.0
+
+
+def shared_metrics():
+    """Накопительные счётчики всех процессов (из общего кэша)."""
+    values = cache.get_many([METRICS_KEY.format(name) for name in METRICS])
+    return {name: values.get(METRICS_KEY.format(name), 0) for name in METRICS}
+
+
+def reset_metrics():
+    metrics.update(dict.fromkeys(METRICS, 0))
+    cache.delete_many([METRICS_KEY.format(name) for name in METRICS])
+
+
+def clear_lru():
+    with _lru_lock:
+        _lru.clear()
+
+
+def lookup_many(texts, target_lang, provider, source_lang=SOURCE_LANG):
+    """{текст: перевод} для текстов, уже переведённых раньше: сначала LRU, затем база."""
+    found = {}
+    by_hash = {}
+    with _lru_lock:
+        for text in texts:
+            digest = source_hash(text)
+            translation = _lru.get((digest, source_lang, target_lang, provider))
+            if translation is None:
+                by_hash[digest] = text
+            else:
+                _lru.move_to_end((digest, source_lang, target_lang, provider))
+                found[text] = translation
+    lru_hits = len(found)
+    hashes = list(by_hash)
+    for start in range(0, len(hashes), LOOKUP_CHUNK):
+        rows = TranslationMemory.objects.filter(
+            source_hash__in=hashes[start:start + LOOKUP_CHUNK], source_lang=source_lang,
+            target_lang=target_lang, provider=provider,
+        ).values_list('source_hash', 'text')
+        for digest, translation in rows:
+            found[by_hash[digest]] = translation
+            _remember((digest, source_lang, target_lang, provider), translation)
+    _count(lru_hits=lru_hits, db_hits=len(found) - lru_hits, misses=len(by_hash) - (len(found) - lru_hits))
+    return found
+
+
+def store_many(translations, target_lang, provider, source_lang=SOURCE_LANG, overwrite=False):
+    """Сохранить {текст: перевод}; без overwrite известные переводы не перезаписываются."""
+    rows = [
+        TranslationMemory(
+            source_hash=source_hash(source), source_lang=source_lang, target_lang=target_lang,
+            provider=provider, source_text=source, text=text,
+        )
+        for source, text in translations.items() if text
+    ]
+    if overwrite:
+        TranslationMemory.objects.bulk_create(
+            rows, batch_size=500, update_conflicts=True, update_fields=['text'],
+            unique_fields=['source_hash', 'source_lang', 'target_lang', 'provider'],
+        )
+    else:
+        TranslationMemory.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+    for row in rows:
+        key = (row.source_hash, source_lang, target_lang, provider)
+        if overwrite or key in _lru:  # проверка без блокировки: в худшем случае лишняя запись
+            _remember(key, row.text)
+    _count(stored=len(rows))
+    return len(rows)
+
+
+def export_lines(queryset=None):
+    """Строки JSON Lines со всеми записями queryset (по умолчанию — всей памяти)."""
+    queryset = TranslationMemory.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values_list('source_lang', 'target_lang', 'provider', 'source_text', 'text')
+    for source_lang, target_lang, provider, source, text in rows.iterator(chunk_size=2000):
+        yield json.dumps({
+            'source_lang': source_lang, 'target_lang': target_lang, 'provider': provider,
+            'source': source, 'text': text,
+        }, ensure_ascii=False)
+
+
+def import_lines(lines, overwrite=False, batch_size=1000):
+    """Загрузить записи JSON Lines (формат export_lines). Возвращает число записей в файле."""
+    groups = {}
+    total = 0
+
+    def flush():
+        for (source_lang, target_lang, provider), translations in groups.items():
+            store_many(translations, target_lang, provider, source_lang=source_lang, overwrite=overwrite)
+        groups.clear()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        key = (item.get('source_lang') or SOURCE_LANG, item['target_lang'], item['provider'])
+        groups.setdefault(key, {})[item['source']] = item['text']
+        total += 1
+        if total % batch_size == 0:
+            flush()
+    flush()
+    return total
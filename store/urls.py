@@ -1,5 +1,7 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 from . import views
+from . import stripe_views
 from .views import AIChatView
 
 urlpatterns = [
@@ -22,6 +24,7 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('checkout/', views.checkout_view, name='checkout'),
     path('order/confirm/<int:order_id>/', views.order_confirm, name='order_confirm'),
+    path('stripe/webhook/', stripe_views.stripe_webhook, name='stripe_webhook'),
     
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
     path('cart/restore/<int:item_id>/', views.cart_restore, name='cart_restore'),
@@ -31,6 +34,7 @@ urlpatterns = [
     path('favorites/remove/<int:product_id>/', views.fav_remove, name='fav_remove'),
   
     path('products/<int:product_id>/review/', views.review_add, name='review_add'),
+    path('products/<int:product_id>/reviews/', views.product_reviews, name='product_reviews'),
     path('products/<int:product_id>/reserve/', views.reserve_view, name='reserve'),
     path('products/<int:product_id>/buy/', views.buy_now, name='buy_now'),
     
@@ -38,6 +42,8 @@ urlpatterns = [
     path('reservations/<int:res_id>/cancel/', views.cancel_reservation, name='cancel_reservation'),
 
     path('search/', views.search_view, name='search'),
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}thumbs/(?P<name>[0-9a-f]{{2}}/[0-9a-f]+-\d+\.(?:webp|jpg))$',
+            views.thumbnail, name='thumbnail'),
 
     path("ai/chat/", AIChatView.as_view()),
     path('chat/', views.chat_view, name='chat'),
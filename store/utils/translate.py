@@ -1,27 +1,77 @@
+import logging
 import os
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception:
     requests = None
 
 LANG_MAP = {'kg': 'ky', 'ru': 'ru', 'en': 'en'}
 
+logger = logging.getLogger(__name__)
+
+
+_session = None
+
 
 def translate_text(text, target_lang, provider='libre', api_url=None, timeout=10):
-    """Translate text using LibreTranslate (default). Returns translated text or empty string on error."""
+    """Translate text using LibreTranslate (default), through the translation memory.
+    Returns translated text or empty string on error (the error is logged)."""
+    from store import translation_memory
+
     if not text:
         return ''
     if provider != 'libre':
         raise NotImplementedError('Only libre provider implemented')
     if requests is None:
         raise RuntimeError('requests library is required for translation. Install it with pip install requests')
-    t = LANG_MAP.get(target_lang, target_lang)
-    url = api_url or os.environ.get('LIBRETRANSLATE_URL', 'https://libretranslate.com/translate')
+    remembered = translation_memory.lookup_many([text], target_lang, provider).get(text)
+    if remembered:
+        return remembered
+    global _session
+    if _session is None:
+        _session = make_session()
     try:
-        resp = requests.post(url, data={'q': text, 'source': 'auto', 'target': t, 'format': 'text'}, timeout=timeout)
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get('translatedText', '') or ''
-    except Exception:
+        translated = translate_batch([text], target_lang, _session, provider, api_url, timeout)[0]
+    except Exception as e:
+        logger.warning(f'Translation to {target_lang} failed: {e}')
         return ''
+    translation_memory.store_many({text: translated}, target_lang, provider)
+    return translated
+
+
+def _api_url(api_url=None):
+    return api_url or os.environ.get('LIBRETRANSLATE_URL', 'https://libretranslate.com/translate')
+
+
+def make_session(pool_size=8, retries=2):
+    """HTTP session with a connection pool sized for pool_size worker threads and retries on overload."""
+    if requests is None:
+        raise RuntimeError('requests library is required for translation. Install it with pip install requests')
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504), allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def translate_batch(texts, target_lang, session, provider='libre', api_url=None, timeout=30):
+    """Translate a list of texts in one request (LibreTranslate accepts q as a list).
+    Returns translations in the same order; raises on any error so the caller can retry the batch later."""
+    if provider != 'libre':
+        raise NotImplementedError('Only libre provider implemented')
+    payload = {'q': list(texts), 'source': 'auto', 'target': LANG_MAP.get(target_lang, target_lang), 'format': 'text'}
+    api_key = os.environ.get('LIBRETRANSLATE_API_KEY')
+    if api_key:
+        payload['api_key'] = api_key
+    resp = session.post(_api_url(api_url), json=payload, timeout=timeout)
+    resp.raise_for_status()
+    translated = resp.json().get('translatedText')
+    if isinstance(translated, str):
+        translated = [translated]
+    if not isinstance(translated, list) or len(translated) != len(payload['q']):
+        raise ValueError('Unexpected LibreTranslate response')
+    return [text or '' for text in translated]
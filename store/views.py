@@ -1,118 +1,77 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from .forms import ProductForm, RegisterForm
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from .models import Category, Product, Cart, CartItem
-from .models import Order, OrderItem
+from .models import Order
 from .models import Favorite, Review, Reservation
 from .forms import CategoryForm
+from .search import search_products
+from . import catalog_cache
+from .carts import merge_session_cart
+from . import chat, moderation, popularity, thumbnails
+from . import guest_cart
+from .guest_cart import GuestCart
+from .inventory import OrderLine, lines_from_cart, place_order
+from .pagination import ORDERING, ProductCursorPagination, approximate_count, decode_cursor, encode_cursor, paginate
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils.text import slugify
+from django.views import View
+from django.views.decorators.http import condition
 from django.core.paginator import Paginator
-from rest_framework.views import APIView
 from rest_framework.response import Response
-import openai
-import os
+import json
 
-def check_product_compliance(name, description):
+class AIChatView(View):
     """
-    Проверяет, соответствует ли товар правилам сайта с помощью AI или простых правил.
-    Возвращает True, если можно публиковать, False иначе.
+    Async chat endpoint. Streams the answer token by token as server-sent events
+    when the client accepts text/event-stream, otherwise returns {"answer": ...}.
     """
-    api_key = os.environ.get('OPENAI_API_KEY')
-    use_ai = api_key and api_key != 'your-openai-api-key-here'
-    
-    # Простая проверка на запрещенные слова
-    forbidden_words = ['beer', 'alcohol', 'vodka', 'wine', 'weapon', 'gun', 'drug', 'narcotic', 'fake', 'counterfeit']
-    text = (name + ' ' + description).lower()
-    for word in forbidden_words:
-        if word in text:
-            return False, f"Товар содержит запрещенное слово: {word}"
-    
-    if not use_ai:
-        # Без AI, только простая проверка
-        return True, ""
-    
-    client = openai.OpenAI(api_key=api_key)
-    prompt = f"""
-    Ты - строгий модератор сайта маркетплейса. Твоя задача - проверить, можно ли публиковать товар на основе названия и описания.
-
-    Запрещенные категории товаров:
-    - Алкоголь и наркотики (пиво, вино, водка, сигареты, наркотики)
-    - Оружие и боеприпасы (пистолеты, ножи, взрывчатка)
-    - Подделки и контрафакт (фейковые бренды, фальшивые документы)
-    - Незаконные услуги (мошенничество, хакинг, продажа данных)
-    - Вредные или опасные товары (ядовитые вещества, запрещенные химикаты)
-    - Любые товары, нарушающие законы или моральные нормы
-
-    Название товара: "{name}"
-    Описание товара: "{description}"
-
-    Инструкции:
-    - Если товар явно запрещен, ответь "НЕТ: [краткая причина]".
-    - Если товар сомнительный, но не явно запрещен, ответь "НЕТ: [причина]".
-    - Если товар разрешен, ответь "ДА".
-    - Будь строгим, но справедливым. Не блокируй обычные товары.
-
-    Ответь только в формате: ДА или НЕТ: причина
-    """
-    try:
-        # Сначала используем Moderation API для проверки на вредный контент
-        mod_response = client.moderations.create(input=name + " " + description)
-        if mod_response.results[0].flagged:
-            return False, "Товар содержит вредный или запрещенный контент"
-        
-        # Затем custom prompt
-        response = client.chat.completions.create(
-            model="gpt-4",  # Используем GPT-4 для лучшей модерации
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0  # Для детерминированного ответа
-        )
-        answer = response.choices[0].message.content.strip()
-        if answer.upper().startswith("ДА"):
-            return True, ""
-        elif answer.upper().startswith("НЕТ"):
-            reason = answer.split(":", 1)[1].strip() if ":" in answer else "Нарушение правил сайта"
-            return False, reason
-        else:
-            return True, ""  # Если ответ неясный, разрешить
-    except Exception as e:
-        # В случае ошибки, разрешить публикацию
-        return True, ""
-
-class AIChatView(APIView):
-    def post(self, request):
-        message = request.data.get("message")
-        if not message:
-            return Response({"answer": "Пожалуйста, задайте вопрос."})
 
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if not api_key or api_key == 'your-openai-api-key-here':
-            return Response({"answer": "Чат временно недоступен. API ключ не настроен."})
+    async def post(self, request):
+        message = _chat_message(request)
+        if not message:
+            return JsonResponse({"answer": "Пожалуйста, задайте вопрос."})
 
-        client = openai.OpenAI(api_key=api_key)
-        prompt = f"""
-        Ты - помощник сайта маркетплейса. Отвечай только на вопросы, связанные с сайтом, покупками, продажами, правилами и советами по использованию сайта.
-        Не отвечай на посторонние вопросы. Если вопрос не про сайт, скажи "Я могу помочь только с вопросами о сайте."
+        user = await request.auser()
+        if user.is_authenticated:
+            identity = f'user:{user.pk}'
+        else:
+            identity = f'anon:{request.session.session_key or request.META.get("REMOTE_ADDR")}'
+        if not await chat.acquire_slot(identity):
+            return JsonResponse({"answer": chat.BUSY}, status=429)
+
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            # the stream owns the slot: it is released when the answer ends or when
+            # Django closes the response (also after a client disconnect)
+            response = StreamingHttpResponse(chat.SSEStream(message, identity), content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # nginx must not buffer the stream
+            return response
 
-        Вопрос пользователя: {message}
+        try:
+            answer = ''.join([token async for token in chat.answer_tokens(message)]).strip()
+        except Exception:
+            answer = chat.ERROR
+        finally:
+            await chat.release_slot(identity)
+        return JsonResponse({"answer": answer})
 
-        Контекст сайта: Это маркетплейс для продажи товаров. Пользователи могут добавлять товары, покупать, использовать корзину, избранное. Правила: не размещать запрещенные товары, быть честным.
 
-        Дай полезный совет или ответ.
-        """
+def _chat_message(request):
+    if request.content_type == 'application/json':
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=200
-            )
-            answer = response.choices[0].message.content.strip()
-        except Exception as e:
-            answer = "Извините, произошла ошибка. Попробуйте позже."
-
-        return Response({"answer": answer})
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return ''
+        message = data.get("message") if isinstance(data, dict) else None
+    else:
+        message = request.POST.get("message")
+    return message.strip() if isinstance(message, str) else ''
 
 def _unique_slug_for_model(model, base_slug):
     """Return a unique slug for given model by appending -1, -2... if needed."""
@@ -124,20 +83,31 @@ def _unique_slug_for_model(model, base_slug):
     return slug
 from rest_framework import viewsets
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer
+from .serializers import CategorySerializer, ProductSerializer, ProductRowSerializer, product_read_options
+
+
+def _favorites_set(request):
+    if not request.user.is_authenticated:
+        return set()
+    return set(Favorite.objects.filter(user=request.user).values_list('product_id', flat=True))
 
 
 def home(request):
     # Главная страница маркетплейса с товарами и баннерами
-    products = Product.objects.filter(is_deleted=False, is_published=True).order_by('-created_at')[:10]
     language = request.session.get('lang', 'ru')
-    favorites_set = set()
-    if request.user.is_authenticated:
-        favorites_set = set(Favorite.objects.filter(user=request.user).values_list('product_id', flat=True))
+
+    def build():
+        products = (
+            Product.objects.localized(language, description=False)
+            .filter(is_deleted=False, is_published=True).order_by('-popularity', '-id')[:10]
+        )
+        html = catalog_cache.render_fragment('store/_catalog_home.html', {'products': products, 'language': language})
+        return html, True
+
+    grid = catalog_cache.get_fragment('home', language, 1, build)
     return render(request, 'store/index_marketplace.html', {
-        'products': products,
+        'product_grid': catalog_cache.apply_user_markers(grid, request, _favorites_set(request)),
         'language': language,
-        'favorites_set': favorites_set
     })
 
 
@@ -146,23 +116,54 @@ def theme_main(request):
     return render(request, 'store/simple_page.html', {'title':'Тема', 'content':'Здесь можно переключать светлую/тёмную тему через кнопку.'})
 
 
+def _cursor_cache_key(cursor, ordering):
+    # cache key for a keyset page: only cursors that point at an existing product, in
+    # canonical form, so that made-up cursors cannot fill the cache with new keys
+    direction, values = decode_cursor(cursor, Product, ordering)
+    fields = dict(zip([field.lstrip('-') for field in ordering], values))
+    if not Product.objects.filter(**fields).exists():
+        return None
+    return encode_cursor(fields, direction, ordering)
+
+
+# ?sort= for the catalog: stored columns (store/ratings.py, store/popularity.py) with
+# partial indexes, so every sort pages by keyset cursors like the default order by date
+LIST_ORDERINGS = {
+    'new': ORDERING,
+    'rating': ('-rating_avg', '-rating_count', '-id'),
+    'popular': ('-popularity', '-id'),
+}
+
+
 def product_list(request):
-    products = Product.objects.filter(is_deleted=False, is_published=True).order_by('-created_at')
-    
-    # Пагинация: 15 товаров на странице
-    paginator = Paginator(products, 15)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
-    
     language = request.session.get('lang', 'ru')
-    favorites_set = set()
-    if request.user.is_authenticated:
-        favorites_set = set(Favorite.objects.filter(user=request.user).values_list('product_id', flat=True))
+    sort = request.GET.get('sort')
+    if sort not in LIST_ORDERINGS:
+        sort = 'new'
+    ordering = LIST_ORDERINGS[sort]
+    cursor = request.GET.get('cursor') or None
+    if cursor and decode_cursor(cursor, Product, ordering) is None:
+        cursor = None
+
+    def build():
+        products = Product.objects.localized(language, description=False).filter(is_deleted=False, is_published=True)
+        # Курсорная пагинация: 15 товаров на странице, без COUNT и OFFSET
+        page_obj = paginate(products, cursor, 15, ordering)
+        html = catalog_cache.render_fragment('store/_catalog_list.html', {
+            'products': page_obj.object_list,
+            'page_obj': page_obj,
+            'total': approximate_count(products),
+            'sort': sort,
+            'language': language,
+        })
+        return html, True
+
+    page_key = _cursor_cache_key(cursor, ordering) if cursor else 'first'
+    grid = catalog_cache.get_fragment(f'list-{sort}', language, page_key, build)
     return render(request, 'store/product_list.html', {
-        'products': page_obj.object_list,
-        'page_obj': page_obj,
+        'product_grid': catalog_cache.apply_user_markers(grid, request, _favorites_set(request)),
+        'sort': sort,
         'language': language,
-        'favorites_set': favorites_set
     })
 
 
@@ -180,9 +181,10 @@ def add_product(request):
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
             product = form.save(commit=False)
-            # Проверка товара на соответствие правилам
-            compliant, reason = check_product_compliance(product.name, product.description)
-            if not compliant:
+            # Проверка товара на соответствие правилам: запрещённые слова и кэш вердиктов
+            # отвечают сразу, проверка AI идёт в фоне (товар ждёт модерации)
+            status, reason = moderation.screen(product.name, product.description)
+            if status == moderation.REJECTED:
                 messages.error(request, f"Товар не может быть опубликован: {reason}")
                 return render(request, 'store/add_product.html', {'form': form, 'created': created})
             # если категория не выбрана — используем или создаём 'Uncategorized'
@@ -193,9 +195,16 @@ def add_product(request):
             if not getattr(product, 'slug', None):
                 base = slugify(product.name, allow_unicode=True)
                 product.slug = _unique_slug_for_model(Product, base)
-            # пометим как опубликованный по умолчанию, чтобы сразу видеть
-            product.is_published = True
+            # одобренный товар публикуем сразу, чтобы сразу видеть
+            product.moderation_status = status
+            product.is_published = status == moderation.APPROVED
             product.save()
+            if status == moderation.PENDING:
+                from .tasks import moderate_product
+                transaction.on_commit(lambda: moderate_product.delay(product.pk))
+                messages.info(request, 'Товар отправлен на модерацию и появится в каталоге после проверки')
+                # the detail page only shows approved products
+                return redirect('product_list')
             created = True
             return redirect('product_detail', slug=product.slug)
         else:
@@ -246,40 +255,67 @@ def add_category(request):
 
 
 def product_detail(request, slug):
-    product = Product.objects.filter(slug=slug, is_deleted=False).first()
+    language = request.session.get('lang', 'ru')
+    products = Product.objects.localized(language).filter(slug=slug, is_deleted=False)
+    if not request.user.is_staff:
+        # pending and rejected products are only visible to staff (moderation preview)
+        products = products.filter(moderation_status=moderation.APPROVED)
+    product = products.first()
     if not product:
         return HttpResponse('Товар не найден', status=404)
-    # include reviews and favorite state
-    reviews = product.reviews.filter(approved=True).order_by('-created_at')
+    popularity.record_view(product.pk)
+    # reviews are loaded page by page from product_reviews; the header uses the stored rating
     is_fav = False
     favorites_set = set()
     if request.user.is_authenticated:
         is_fav = Favorite.objects.filter(user=request.user, product=product).exists()
         favorites_set = set(Favorite.objects.filter(user=request.user).values_list('product_id', flat=True))
-    language = request.session.get('lang', 'ru')
-    return render(request, 'store/product_detail.html', {'product': product, 'reviews': reviews, 'is_fav': is_fav, 'language': language, 'favorites_set': favorites_set})
+    return render(request, 'store/product_detail.html', {'product': product, 'is_fav': is_fav, 'language': language, 'favorites_set': favorites_set})
+
+
+REVIEWS_PAGE_SIZE = 10
+
+
+def product_reviews(request, product_id):
+    # HTML fragment with one keyset page of approved reviews, fetched by the detail page
+    # as the reviews block scrolls into view; the next cursor is in X-Next-Cursor
+    reviews = (
+        Review.objects.filter(product_id=product_id, approved=True).select_related('user')
+        .only('pk', 'rating', 'text', 'created_at', 'user__username', 'user__first_name')
+    )
+    page = paginate(reviews, request.GET.get('cursor') or None, REVIEWS_PAGE_SIZE)
+    response = render(request, 'store/_reviews.html', {'reviews': page.object_list})
+    response['X-Next-Cursor'] = page.next_cursor or ''
+    return response
+
+
+def _republish_if_free(request, product):
+    # restore product visibility if no other carts (DB or cache-backed guest carts)
+    # contain it; products that are pending or rejected by moderation stay hidden
+    try:
+        if (product and product.moderation_status == moderation.APPROVED
+                and not guest_cart.held(product.pk)
+                and not CartItem.objects.filter(product=product).exists()):
+            product.is_published = True
+            product.save()
+            messages.success(request, 'Товар восстановлён в каталоге')
+    except Exception:
+        pass
 
 
 def cart_update_quantity(request, item_id):
     cart = _get_cart(request)
-    item = CartItem.objects.filter(pk=item_id, cart=cart).first()
+    item = cart.find_item(item_id)
     if not item:
         return redirect('cart_view')
     try:
         qty = int(request.POST.get('quantity', item.quantity))
         if qty < 1:
             prod = item.product
-            item.delete()
-            try:
-                if prod and not CartItem.objects.filter(product=prod).exists():
-                    prod.is_published = True
-                    prod.save()
-                    messages.success(request, 'Товар восстановлён в каталоге')
-            except Exception:
-                pass
+            cart.remove_item(item)
+            _republish_if_free(request, prod)
         else:
-            item.quantity = qty
-            item.save()
+            cart.set_quantity(item, qty)
     except Exception:
         pass
     return redirect('cart_view')
@@ -293,17 +329,7 @@ def product_delete(request, pk):
         # soft-delete: mark product deleted and add a recovery item to the user's cart
         product.is_deleted = True
         product.save()
-        cart = _get_cart(request)
-        # add to cart as a deleted-backup item (quantity 1)
-        item_qs = CartItem.objects.filter(cart=cart, product=product)
-        if item_qs.exists():
-            item = item_qs.first()
-            item.is_deleted_backup = True
-            item.quantity = max(1, item.quantity)
-            item.price = product.price
-            item.save()
-        else:
-            CartItem.objects.create(cart=cart, product=product, quantity=1, price=product.price, is_deleted_backup=True)
+        _get_cart(request).add_deleted_backup(product)
         return redirect('product_list')
     return render(request, 'store/product_confirm_delete.html', {'product': product})
 
@@ -311,10 +337,12 @@ def product_delete(request, pk):
 def favorites_list(request):
     if not request.user.is_authenticated:
         return redirect('login')
-    favs = Favorite.objects.filter(user=request.user).select_related('product')
+    language = request.COOKIES.get('language', 'ru')
+    favs = Favorite.objects.filter(user=request.user).prefetch_related(
+        Prefetch('product', queryset=Product.objects.localized(language, description=False))
+    )
     # pass list of product objects to the favorites_list template
     products = [f.product for f in favs]
-    language = request.COOKIES.get('language', 'ru')
     return render(request, 'store/favorites_list.html', {'products': products, 'language': language})
 
 
@@ -353,7 +381,7 @@ from django.utils.dateparse import parse_datetime
 
 
 def reserve_view(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
+    product = get_object_or_404(Product, pk=product_id, moderation_status=moderation.APPROVED)
     if request.method == 'POST':
         frm = request.POST.get('from')
         to = request.POST.get('to')
@@ -373,10 +401,12 @@ def reserve_view(request, product_id):
 def reservations_list(request):
     if not request.user.is_authenticated:
         return redirect('login')
-    reservations = Reservation.objects.filter(user=request.user).select_related('product').order_by('-created_at')
+    language = request.COOKIES.get('language', 'ru')
+    reservations = Reservation.objects.filter(user=request.user).prefetch_related(
+        Prefetch('product', queryset=Product.objects.localized(language, description=False).select_related('category'))
+    ).order_by('-created_at')
     # Вычисляем итоговую сумму
     total_price = sum(r.product.price for r in reservations)
-    language = request.COOKIES.get('language', 'ru')
     return render(request, 'store/reservations.html', {
         'reservations': reservations,
         'total_price': total_price,
@@ -399,11 +429,33 @@ def cancel_reservation(request, res_id):
 
 def search_view(request):
     q = request.GET.get('q', '').strip()
-    qs = Product.objects.all()
-    if q:
-        qs = qs.filter(name__icontains=q)
     language = request.session.get('lang', 'ru')
-    return render(request, 'store/search_results.html', {'products': qs, 'query': q, 'language': language})
+    products = Product.objects.localized(language, description=False)
+    if q:
+        results = search_products(q, products)
+    else:
+        results = products.filter(is_deleted=False, is_published=True).order_by('-created_at')
+    paginator = Paginator(results, 15)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    return render(request, 'store/search_results.html', {
+        'products': page_obj.object_list,
+        'page_obj': page_obj,
+        'query': q,
+        'language': language
+    })
+
+
+@condition(etag_func=lambda request, name: name)
+def thumbnail(request, name):
+    # Thumbnail names are content-addressed (store/thumbnails.py): the bytes behind
+    # a URL never change, so browsers and proxies may cache them for a year.
+    # nginx serves /media/ itself in production; this covers runs without it.
+    path = f'{thumbnails.DIRECTORY}/{name}'
+    if not default_storage.exists(path):
+        raise Http404
+    response = FileResponse(default_storage.open(path, 'rb'))
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 def _ensure_session(request):
@@ -413,10 +465,13 @@ def _ensure_session(request):
 
 
 def _get_cart(request):
-    # Prefer cart for authenticated user, otherwise session-based cart
+    # Prefer cart for authenticated user; guests get a cache-backed cart
+    # (GUEST_CART_STORE = 'db' keeps the old session-based Cart rows)
     if request.user.is_authenticated:
         cart, _ = Cart.objects.get_or_create(user=request.user)
         return cart
+    if guest_cart.enabled():
+        return GuestCart.for_request(request)
     session_key = _ensure_session(request)
     cart, _ = Cart.objects.get_or_create(session_key=session_key)
     return cart
@@ -424,15 +479,15 @@ def _get_cart(request):
 
 def cart_view(request):
     cart = _get_cart(request)
-    items = cart.items.select_related('product').all()
-    total = cart.total()
+    items = cart.lines()
+    total = cart.total_amount
     # Есть ли товары, которые можно оформить (не резервные/удалённые)
     has_purchasable = any(not it.is_deleted_backup for it in items)
     return render(request, 'store/cart.html', {'cart': cart, 'items': items, 'total': total, 'has_purchasable': has_purchasable})
 
 
 def cart_add(request, product_id):
-    product = Product.objects.filter(pk=product_id, is_deleted=False).first()
+    product = Product.objects.filter(pk=product_id, is_deleted=False, moderation_status=moderation.APPROVED).first()
     if not product:
         return redirect('product_list')
     cart = _get_cart(request)
@@ -443,14 +498,7 @@ def cart_add(request, product_id):
             qty = 1
     except Exception:
         qty = 1
-    # either update existing CartItem or create new
-    item_qs = CartItem.objects.filter(cart=cart, product=product)
-    if item_qs.exists():
-        item = item_qs.first()
-        item.quantity += qty
-        item.save()
-    else:
-        CartItem.objects.create(cart=cart, product=product, quantity=qty, price=product.price)
+    cart.add_product(product, qty)
     # Hide product from catalog once added to cart (prevent others seeing it)
     try:
         product.is_published = False
@@ -463,57 +511,49 @@ def cart_add(request, product_id):
 
 def cart_remove(request, item_id):
     cart = _get_cart(request)
-    item = CartItem.objects.filter(pk=item_id, cart=cart).first()
+    item = cart.find_item(item_id)
     if item:
         prod = item.product
-        item.delete()
-        # restore product visibility if no other carts contain it
-        try:
-            if prod and not CartItem.objects.filter(product=prod).exists():
-                prod.is_published = True
-                prod.save()
-                messages.success(request, 'Товар восстановлён в каталоге')
-        except Exception:
-            pass
+        cart.remove_item(item)
+        _republish_if_free(request, prod)
     return redirect('cart_view')
 
 
 def cart_restore(request, item_id):
     # restore a previously deleted product from cart backup
     cart = _get_cart(request)
-    item = CartItem.objects.filter(pk=item_id, cart=cart, is_deleted_backup=True).first()
+    item = cart.find_item(item_id, backup_only=True)
     if not item:
         return redirect('cart_view')
     product = item.product
     product.is_deleted = False
     product.save()
     # remove the backup item from cart
-    item.delete()
+    cart.remove_item(item)
     return redirect('cart_view')
 
 
-def _merge_session_cart_to_user(request, user):
+def _guest_cart_key(request):
+    # key of the guest cart to merge after login. Must be read before login():
+    # login rotates the session key. A cache-backed guest cart is first written
+    # to the DB under its own key so both modes merge the same way
+    if request.user.is_authenticated:
+        return None
+    if guest_cart.enabled():
+        cart = GuestCart.for_request(request).materialize()
+        return cart.session_key if cart else None
+    return request.session.session_key
+
+
+def _merge_session_cart_to_user(session_key, user):
     # merge items from a session cart into the user's cart after login
-    session_key = request.session.session_key
     if not session_key:
         return
-    session_cart = Cart.objects.filter(session_key=session_key).first()
-    if not session_cart:
+    if getattr(settings, 'CART_MERGE_ASYNC', False):
+        from .tasks import merge_guest_cart
+        merge_guest_cart.delay(session_key, user.pk)
         return
-    user_cart, _ = Cart.objects.get_or_create(user=user)
-    for item in session_cart.items.all():
-        existing = CartItem.objects.filter(cart=user_cart, product=item.product).first()
-        if existing:
-            existing.quantity += item.quantity
-            existing.save()
-        else:
-            item.cart = user_cart
-            item.save()
-    # remove the old session cart
-    try:
-        session_cart.delete()
-    except Exception:
-        pass
+    merge_session_cart(session_key, user)
 
 
 def register_view(request):
@@ -526,8 +566,9 @@ def register_view(request):
             # auto-login after register
             user = authenticate(username=user.username, password=form.cleaned_data['password'])
             if user:
+                session_key = _guest_cart_key(request)
                 login(request, user)
-                _merge_session_cart_to_user(request, user)
+                _merge_session_cart_to_user(session_key, user)
                 return redirect('home')
     else:
         form = RegisterForm()
@@ -541,8 +582,9 @@ def login_view(request):
         password = request.POST.get('password')
         user = authenticate(username=username, password=password)
         if user:
+            session_key = _guest_cart_key(request)
             login(request, user)
-            _merge_session_cart_to_user(request, user)
+            _merge_session_cart_to_user(session_key, user)
             return redirect('home')
         else:
             error = 'Неверные учётные данные'
@@ -554,36 +596,28 @@ def logout_view(request):
     return redirect('home')
 
 
+def _report_failures(request, failures):
+    for failure in failures:
+        name = failure.line.product.name if failure.line.product else 'Товар'
+        messages.error(request, f'{name}: {failure.reason}')
+
+
 def checkout_view(request):
     cart = _get_cart(request)
-    items = cart.items.select_related('product').all()
-    total = cart.total()
+    items = cart.lines()
+    total = cart.total_amount
     # simple stubbed checkout page (payment is a placeholder)
     if request.method == 'POST':
-        # create Order from cart
-        order = Order.objects.create(
-            user=request.user if request.user.is_authenticated else None,
-            total_amount=total,
-        )
-        for it in items:
-            OrderItem.objects.create(
-                order=order,
-                product=it.product,
-                name=it.product.name if it.product else it.product_id,
-                price=it.price,
-                quantity=it.quantity,
-            )
-            # decrement stock when ordering
-            try:
-                if it.product and it.product.stock >= it.quantity:
-                    it.product.stock = max(0, it.product.stock - it.quantity)
-                    # if stock runs out, hide product; otherwise make it visible
-                    it.product.is_published = False if it.product.stock == 0 else True
-                    it.product.save()
-            except Exception:
-                pass
-        # clear cart
-        cart.items.all().delete()
+        # create Order from cart: stock is reserved for the whole cart in one transaction
+        user = request.user if request.user.is_authenticated else None
+        order, failures = place_order(lines_from_cart(items), user=user)
+        _report_failures(request, failures)
+        if order is None:
+            return redirect('cart_view')
+        if isinstance(cart, GuestCart):
+            # DB carts lose ordered items inside place_order; the guest cart lives in cache
+            failed = {f.line.product.pk for f in failures if f.line.product}
+            cart.remove_products([line.product.pk for line in lines_from_cart(items) if line.product.pk not in failed])
         messages.success(request, 'Заказ оформлен. Спасибо!')
         return redirect('order_confirm', order_id=order.id)
     return render(request, 'store/checkout.html', {'cart': cart, 'items': items, 'total': total})
@@ -597,7 +631,7 @@ def order_confirm(request, order_id):
 
 
 def buy_now(request, product_id):
-    product = Product.objects.filter(pk=product_id, is_deleted=False).first()
+    product = Product.objects.filter(pk=product_id, is_deleted=False, moderation_status=moderation.APPROVED).first()
     if not product:
         messages.error(request, 'Товар не найден')
         return redirect('product_list')
@@ -607,18 +641,11 @@ def buy_now(request, product_id):
         except Exception:
             qty = 1
         qty = max(1, qty)
-        total = product.price * qty
-        order = Order.objects.create(user=request.user if request.user.is_authenticated else None, total_amount=total)
-        OrderItem.objects.create(order=order, product=product, name=product.name, price=product.price, quantity=qty)
-        # decrement stock
-        try:
-            if product.stock >= qty:
-                product.stock = max(0, product.stock - qty)
-                # if stock == 0 hide product
-                product.is_published = False if product.stock == 0 else True
-                product.save()
-        except Exception:
-            pass
+        user = request.user if request.user.is_authenticated else None
+        order, failures = place_order([OrderLine(product, qty, product.price, None)], user=user)
+        _report_failures(request, failures)
+        if order is None:
+            return redirect('product_detail', slug=product.slug)
         messages.success(request, 'Заказ оформлен. Спасибо!')
         return redirect('order_confirm', order_id=order.id)
     return redirect('product_detail', slug=product.slug)
@@ -629,5 +656,17 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category')
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        # Быстрый путь: строки из .values() сериализуются без создания моделей
+        fields, lang = product_read_options(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*ProductRowSerializer.value_columns(fields, lang))
+        page = self.paginate_queryset(rows)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(ProductRowSerializer(page, many=True, context=context).data)
+        return Response(ProductRowSerializer(rows, many=True, context=context).data)